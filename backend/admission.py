@@ -0,0 +1,188 @@
+"""
+Admission control for the /predict path.
+
+Inference is CPU-bound; run inline in the event loop, a burst of requests
+blocks every other endpoint (including /health) and latency grows without
+limit. AdmissionController instead:
+
+  - runs at most MAX_IN_FLIGHT inferences at a time, in a small thread pool,
+    so the event loop stays free for health checks and metrics,
+  - lets up to QUEUE_SIZE further requests wait for a slot, each for at most
+    QUEUE_TIMEOUT_SECONDS after it arrived (its deadline),
+  - rejects immediately with 429 when the queue is full and with 503 when a
+    queued request reaches its deadline, both with a Retry-After estimated from
+    the current queue and the recent inference time.
+
+The deadline covers queue time only. Once a request has a slot its inference
+runs to completion (a worker thread cannot be interrupted), and the slot is
+held until the thread finishes, even if the client has gone away meanwhile.
+
+Slots are counted by hand with one future per queued request instead of an
+asyncio.Semaphore: asyncio.wait_for(semaphore.acquire(), ...) can drop a
+permit on Python 3.10 when the timeout or a cancellation lands just after the
+permit was granted. Here a permit granted to a waiter that no longer wants it
+is passed straight on.
+
+State lives in one event loop (one per worker), so the counters need no locks.
+"""
+
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+MAX_IN_FLIGHT = int(os.getenv("INFERENCE_CONCURRENCY", "2"))        # per worker
+QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1.0"))
+EWMA_ALPHA = 0.1                # smoothing of the service / wait time averages
+MAX_RETRY_AFTER_SECONDS = 30
+
+
+class Rejected(Exception):
+    """Request not admitted; status is 429 (queue full) or 503 (deadline passed)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, queue_size: int = QUEUE_SIZE,
+                 queue_timeout: float = QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+
+        # Created on first use, inside the worker (serve.py forks after import)
+        self._executor = None
+        self._free = max_in_flight
+        self._waiters = deque()        # futures of queued requests, oldest first
+
+        self.in_flight = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.admitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.avg_service_seconds = 0.0
+        self.avg_wait_seconds = 0.0
+        self.started = time.monotonic()
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="inference")
+
+    def _release(self) -> None:
+        """Hand the slot to the oldest waiter still waiting, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self._free += 1
+
+    async def _wait_for_slot(self) -> bool:
+        """Queue for a slot; True once granted, False if the deadline passed first."""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        timer = loop.call_later(self.queue_timeout, lambda: waiter.done() or waiter.set_result(False))
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # Cancelled after the slot was handed over: pass it on instead of losing it
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self._release()
+            raise
+        finally:
+            timer.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained."""
+        service = self.avg_service_seconds or 0.05
+        backlog = (self.queued + self.in_flight) * service / self.max_in_flight
+        return int(min(max(math.ceil(backlog), 1), MAX_RETRY_AFTER_SECONDS))
+
+    def saturated(self) -> bool:
+        return self.queued >= self.queue_size
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the inference pool once admitted, or raise Rejected."""
+        self._ensure_started()
+        arrived = time.monotonic()
+
+        if self._free == 0 or self._waiters:
+            if self.queued >= self.queue_size:
+                self.rejected_queue_full += 1
+                raise Rejected(429, "Inference queue is full, retry later", self.retry_after())
+
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            try:
+                granted = await self._wait_for_slot()
+            finally:
+                self.queued -= 1
+            if not granted:
+                self.rejected_deadline += 1
+                raise Rejected(503, "Request deadline passed while queued for inference", self.retry_after())
+        else:
+            self._free -= 1
+
+        wait = time.monotonic() - arrived
+        self.avg_wait_seconds += EWMA_ALPHA * (wait - self.avg_wait_seconds)
+        self.admitted += 1
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            job = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BaseException:
+            self._finished(start, None)
+            raise
+        # The slot is released when the thread finishes, not when this request is
+        # cancelled (shield keeps a client disconnect from detaching the two)
+        job.add_done_callback(lambda f: self._finished(start, f))
+        return await asyncio.shield(job)
+
+    def _finished(self, start: float, job) -> None:
+        if job is not None and not job.cancelled() and job.exception() is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+        service = time.monotonic() - start
+        self.avg_service_seconds += EWMA_ALPHA * (service - self.avg_service_seconds)
+        self.in_flight -= 1
+        self._release()
+
+    def metrics(self) -> dict:
+        rejected = self.rejected_queue_full + self.rejected_deadline
+        seen = self.admitted + rejected
+        return {
+            "max_in_flight": self.max_in_flight,
+            "queue_size": self.queue_size,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_queued,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "rejection_rate": round(rejected / seen, 4) if seen else 0.0,
+            "avg_queue_wait_ms": round(self.avg_wait_seconds * 1000, 2),
+            "avg_inference_ms": round(self.avg_service_seconds * 1000, 2),
+            "retry_after_seconds": self.retry_after(),
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+        }
@@ -1,17 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any
+from typing import Optional
 from pydantic import BaseModel
+import os
 import uvicorn
 import traceback
 
 # Import inference + FEATURES
-from inference import predict_risk, FEATURES
+from inference import predict_risk, FEATURES, drift_monitor
 
 # Firebase personalization imports
-from firebase_client import get_user_events
+from firebase_client import get_user_events, get_user_event_version
 from personalization import build_user_summary
 
+# ETag / Last-Modified + compression for the history endpoints
+from http_cache import version_headers, events_version, has_validators, is_current, not_modified, json_response
+
+# Bounded inference concurrency + queue for /predict
+from admission import AdmissionController, Rejected
+
+# Per-worker memory accounting (shared vs private model pages)
+from memory import process_memory
+
 
 app = FastAPI(
     title="Migraine Early Warning API",
@@ -19,6 +30,17 @@ app = FastAPI(
     version="1.0.0",
 )
 
+admission = AdmissionController()
+
+
+@app.exception_handler(Rejected)
+async def rejected_handler(request: Request, exc: Rejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # ==============================
 # CORS SETTINGS
 # ==============================
@@ -36,6 +58,7 @@ app.add_middleware(
 # ==============================
 class PredictionRequest(BaseModel):
     features: dict
+    user_id: Optional[str] = None  # enables the per-user model adjustment
 
 
 # ==============================
@@ -50,6 +73,28 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness():
+    # Answered by the event loop directly, never queued behind inference;
+    # not ready while this worker's inference queue is full
+    if admission.saturated():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "overloaded", **admission.metrics()},
+            headers={"Retry-After": str(admission.retry_after())},
+        )
+    return {"status": "ready", "queue_depth": admission.queued, "in_flight": admission.in_flight}
+
+
+@app.get("/health/memory")
+async def memory_usage():
+    # Memory of the worker that served this request; see serve.py for all workers
+    return {
+        "pid": os.getpid(),
+        **{f"{k}_mb": round(v / 1e6, 1) for k, v in process_memory().items()},
+    }
+
+
 # ==============================
 # MIGRAINE RISK PREDICTION
 # ==============================
@@ -66,52 +111,86 @@ async def predict(request: PredictionRequest):
                 detail=f"Missing required features: {missing}"
             )
 
-        # Run model inference
-        result = predict_risk(feature_dict)
+        # Run model inference (bounded pool; raises Rejected when overloaded)
+        result = await admission.run(predict_risk, feature_dict, request.user_id)
 
         return {
             "risk_score": round(result["risk_score"], 4),
             "risk_level": result["risk_level"],
             "top_factors": result["top_factors"],
             "model_version": result.get("model_version", "v1.0"),
+            "personalized": result.get("personalized", False),
         }
 
+    except (HTTPException, Rejected):
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ==============================
+# INPUT DRIFT MONITORING
+# ==============================
+@app.get("/monitoring/drift")
+async def drift_scores():
+    if drift_monitor is None:
+        raise HTTPException(status_code=404, detail="No drift reference for the served model (run train_models.py)")
+    # Sketches are per worker process; pid tells which worker answered
+    return {"pid": os.getpid(), **drift_monitor.report()}
+
+
+@app.get("/monitoring/admission")
+async def admission_metrics():
+    # Per worker process, like the drift sketches
+    return {"pid": os.getpid(), **admission.metrics()}
+
+
 # ==============================
 # GET USER EVENTS (Firebase)
 # ==============================
 @app.get("/users/{user_id}/events")
-def get_events(user_id: str) -> Dict[str, Any]:
+def get_events(user_id: str, request: Request) -> Response:
+    # Client sent its version: a keys-only read tells whether anything changed
+    if has_validators(request):
+        headers = version_headers("events", user_id, *get_user_event_version(user_id))
+        if is_current(request, headers):
+            return not_modified(headers)
+
     events = get_user_events(user_id)
+    headers = version_headers("events", user_id, *events_version(events))
 
-    return {
+    return json_response(request, {
         "user_id": user_id,
         "events_count": len(events),
         "events": events
-    }
+    }, headers)
 
 
 # ==============================
 # PERSONALIZED SUMMARY (Firebase)
 # ==============================
 @app.get("/users/{user_id}/summary")
-def get_user_summary(user_id: str) -> Dict[str, Any]:
+def get_user_summary(user_id: str, request: Request) -> Response:
+    # Unchanged events -> unchanged summary: skip the fetch and build_user_summary
+    if has_validators(request):
+        headers = version_headers("summary", user_id, *get_user_event_version(user_id))
+        if is_current(request, headers):
+            return not_modified(headers)
+
     events = get_user_events(user_id)
+    headers = version_headers("summary", user_id, *events_version(events))
 
     if not events:
-        return {
+        return json_response(request, {
             "user_id": user_id,
             "events_count": 0,
             "has_data": False,
             "message": "No data yet — keep using the app to build your personalized model."
-        }
+        }, headers)
 
     summary = build_user_summary(user_id, events)
-    return summary
+    return json_response(request, summary, headers)
 
 
 # ==============================
@@ -0,0 +1,339 @@
+"""
+Daily bulk risk scoring for every active user.
+
+Replaces the per-user, per-HTTP-call n8n schedule for the daily run:
+
+  1. lists the user ids under /events once per run (a shallow, keys-only read,
+     snapshotted next to the checkpoint) and pages through them BATCH_USERS at
+     a time; each user's last RECENT_EVENTS events are fetched with an
+     orderBy="timestamp" + limitToLast query, at most CONCURRENCY at once, and
+     ordered by their parsed timestamp. The next page is fetched while the
+     current one is scored, so full histories are never downloaded,
+  2. builds the FEATURES rows for the whole batch with numpy: the latest event's
+     values, deviations from the user's own history (mean of the earlier
+     events, DEFAULT_BASELINES when there is none) and 3-day averages,
+  3. scores the batch in one vectorized call (inference.predict_risk_batch),
+  4. writes all predictions back in one multi-path PATCH, to the same
+     users/predictions/<user_id>/<timestamp> nodes the n8n workflow uses.
+
+Users whose latest event is older than ACTIVE_DAYS, or is missing a feature,
+are skipped. After every written batch the run's checkpoint
+(data/batch_scoring/<run_id>.json) records the last user id, so an interrupted
+run resumes by paging on from it in the run's user list
+(<run_id>.users.json); nothing before it is read again. Predictions are keyed
+by the run's start time, so re-scoring a batch overwrites instead of duplicating.
+
+Run:
+  python batch_score.py                         # today's run (resumes if interrupted)
+  python batch_score.py --batch-users 2000 --concurrency 16
+  python batch_score.py --run-id 2026-10-19 --restart
+  python batch_score.py --dry-run --limit 500   # score without writing back
+"""
+
+import os
+import json
+import time
+import bisect
+import argparse
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from features import FEATURES
+from feature_store import DEVIATIONS, ROLLING_COLS, ROLLING_WINDOW
+from firebase_client import get_event_user_ids, get_recent_user_events, rtdb_key_order, write_bulk
+from inference import predict_risk_batch
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+RECENT_EVENTS = 14               # history per user for baselines and 3-day averages
+ACTIVE_DAYS = 7                  # latest event older than this -> user is not scored
+BATCH_USERS = 1_000              # users per page read, scoring call and write
+CONCURRENCY = 8                  # per-user event reads in flight
+FETCH_RETRIES = 3
+WRITE_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+CHECKPOINT_DIR = os.path.join("data", "batch_scoring")
+PREDICTIONS_PATH = "users/predictions"      # where n8n's "Store Predictions" writes
+
+# Population baselines (as in the n8n Build Features node) for users without history
+DEFAULT_BASELINES = {"sleep_hours": 7.0, "hrv": 55.0, "screen_time_total_hours": 3.5, "meeting_hours": 4.0}
+
+DERIVED = {name for name, _, _ in DEVIATIONS} | {f"{col}_3d_avg" for col in ROLLING_COLS}
+EVENT_FEATURES = [f for f in FEATURES if f not in DERIVED]   # stored on every event
+
+
+# ----------------------------
+# 1. FEATURES FROM EVENTS
+# ----------------------------
+
+def _float(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _parse_ts(ts):
+    try:
+        return datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def events_to_history(events_per_user, k: int = RECENT_EVENTS):
+    """
+    (n_users, k, len(EVENT_FEATURES)) array of the last k events per user,
+    oldest first and right-aligned (NaN padding on the left), plus each
+    user's latest event timestamp.
+    """
+    history = np.full((len(events_per_user), k, len(EVENT_FEATURES)), np.nan)
+    latest = []
+    for u, events in enumerate(events_per_user):
+        events = events[-k:]
+        if events:
+            history[u, k - len(events):] = [[_float(e.get(f)) for f in EVENT_FEATURES] for e in events]
+        latest.append(_parse_ts(events[-1].get("timestamp")) if events else None)
+    return history, latest
+
+
+def _nanmean(a: np.ndarray, axis: int) -> np.ndarray:
+    """np.nanmean without the all-NaN warning (NaN stays NaN)."""
+    count = (~np.isnan(a)).sum(axis=axis)
+    total = np.nansum(a, axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+
+def build_feature_rows(history: np.ndarray) -> np.ndarray:
+    """FEATURES matrix (one row per user) from events_to_history output."""
+    col = {f: i for i, f in enumerate(EVENT_FEATURES)}
+    latest = history[:, -1]
+    cols = {f: latest[:, col[f]] for f in EVENT_FEATURES}
+
+    for name, raw, _ in DEVIATIONS:
+        baseline = _nanmean(history[:, :-1, col[raw]], axis=1)
+        baseline = np.where(np.isnan(baseline), DEFAULT_BASELINES[raw], baseline)
+        cols[name] = latest[:, col[raw]] - baseline
+
+    # Trailing average of the last ROLLING_WINDOW events (fewer for new users)
+    for raw in ROLLING_COLS:
+        cols[f"{raw}_3d_avg"] = _nanmean(history[:, -ROLLING_WINDOW:, col[raw]], axis=1)
+
+    return np.column_stack([cols[f] for f in FEATURES])
+
+
+# ----------------------------
+# 2. CHECKPOINT
+# ----------------------------
+
+def _checkpoint_path(run_id: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{run_id}.json")
+
+
+def load_checkpoint(run_id: str):
+    path = _checkpoint_path(run_id)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(state: dict) -> None:
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(state["run_id"])
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _users_path(run_id: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{run_id}.users.json")
+
+
+def load_user_ids(run_id: str, refresh: bool, save: bool = True):
+    """
+    The run's user ids in key order: listed once per run and kept next to the
+    checkpoint, so a resumed run pages through the same list.
+    """
+    path = _users_path(run_id)
+    if not refresh and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    user_ids = _retry(get_event_user_ids, FETCH_RETRIES)
+    if save:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(user_ids, f)
+        os.replace(path + ".tmp", path)
+    return user_ids
+
+
+def new_state(run_id: str) -> dict:
+    return {
+        "run_id": run_id,
+        "started_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "completed_at": None,
+        "last_user_id": None,
+        "users_done": 0,
+        "counts": {"scored": 0, "inactive": 0, "incomplete": 0},
+        "elapsed_seconds": 0.0,
+    }
+
+
+# ----------------------------
+# 3. SCORING RUN
+# ----------------------------
+
+def _retry(fn, retries: int, *args):
+    for attempt in range(retries):
+        try:
+            return fn(*args)
+        except requests.RequestException:
+            if attempt == retries - 1:
+                raise
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+
+def fetch_page(user_ids, readers: ThreadPoolExecutor):
+    """(user_id, recent events) for one page of users, read concurrently; retried, then the run stops (resumable)."""
+    events = readers.map(lambda u: _retry(get_recent_user_events, FETCH_RETRIES, u, RECENT_EVENTS), user_ids)
+    return list(zip(user_ids, events))
+
+
+def score_batch(page, state: dict, now: datetime, dry_run: bool = False) -> dict:
+    """Featurize, score and write back one page of (user_id, events). Returns stage timings."""
+    timings = {}
+
+    t = time.perf_counter()
+    user_ids = np.array([u for u, _ in page], dtype=object)
+    history, latest = events_to_history([events for _, events in page])
+    X = build_feature_rows(history)
+
+    cutoff = now - timedelta(days=ACTIVE_DAYS)
+    active = np.array([ts is not None and ts >= cutoff for ts in latest], dtype=bool)
+    complete = np.isfinite(X).all(axis=1)
+    keep = active & complete
+    timings["features"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    scored_ids = user_ids[keep].astype(str)
+    result = predict_risk_batch(X[keep], scored_ids) if keep.any() else None
+    timings["score"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    if result is not None and not dry_run:
+        ts = state["started_at"]
+        key = ts.replace(":", "_").replace(".", "_")
+        updates = {}
+        for i, user_id in enumerate(scored_ids):
+            factors = result["top_factors"][i] + [None] * 3
+            updates[f"{PREDICTIONS_PATH}/{user_id}/{key}"] = {
+                "user_id": user_id,
+                "timestamp": ts,
+                "risk_score": round(float(result["risk_score"][i]), 4),
+                "risk_level": str(result["risk_level"][i]),
+                "top_factors": {"first": factors[0], "second": factors[1], "third": factors[2]},
+                "model_version": result["model_version"],
+                "personalized": bool(result["personalized"][i]),
+                "source": "batch",
+            }
+        _retry(write_bulk, WRITE_RETRIES, updates)
+    timings["write"] = time.perf_counter() - t
+
+    counts = state["counts"]
+    counts["scored"] += int(keep.sum())
+    counts["inactive"] += int((~active).sum())
+    counts["incomplete"] += int((active & ~complete).sum())
+    return timings
+
+
+def run(run_id: str = None, batch_users: int = BATCH_USERS, limit: int = None,
+        restart: bool = False, dry_run: bool = False, concurrency: int = CONCURRENCY) -> dict:
+    run_id = run_id or datetime.now(timezone.utc).date().isoformat()
+    state = None if restart else load_checkpoint(run_id)
+
+    if state and state["completed_at"]:
+        print(f"Run {run_id} already completed at {state['completed_at']} (use --restart to score again)")
+        return state
+    if state:
+        print(f"Resuming run {run_id} after user {state['last_user_id']} ({state['users_done']} users done so far)")
+    else:
+        state = new_state(run_id)
+
+    user_ids = load_user_ids(run_id, refresh=state["last_user_id"] is None, save=not dry_run)
+    first = 0
+    if state["last_user_id"] is not None:
+        first = bisect.bisect_right(user_ids, rtdb_key_order(state["last_user_id"]), key=rtdb_key_order)
+    todo = user_ids[first:]
+    if limit:
+        todo = todo[:max(0, limit - state["users_done"])]
+    pages = [todo[i:i + batch_users] for i in range(0, len(todo), batch_users)]
+
+    print(f"Scoring {len(todo)} of {len(user_ids)} users in {len(pages)} page(s) of {batch_users}, "
+          f"{concurrency} concurrent reads{', dry run' if dry_run else ''}...")
+
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    elapsed_before = state["elapsed_seconds"]
+    done_before = state["users_done"]
+    stage_totals = {}
+
+    # One page read ahead: the next page downloads while this one is scored and written
+    with ThreadPoolExecutor(max_workers=concurrency) as readers, ThreadPoolExecutor(max_workers=1) as prefetch:
+        next_page = prefetch.submit(fetch_page, pages[0], readers) if pages else None
+        for i in range(len(pages)):
+            t = time.perf_counter()
+            page = next_page.result()
+            fetch_wait = time.perf_counter() - t
+            if i + 1 < len(pages):
+                next_page = prefetch.submit(fetch_page, pages[i + 1], readers)
+
+            timings = {"fetch_wait": fetch_wait, **score_batch(page, state, now, dry_run)}
+
+            # Checkpoint only after the batch is written, so a crash re-scores it
+            state["users_done"] += len(page)
+            state["last_user_id"] = page[-1][0]
+            state["elapsed_seconds"] = elapsed_before + time.perf_counter() - start
+            if not dry_run:
+                save_checkpoint(state)
+
+            for k, v in timings.items():
+                stage_totals[k] = stage_totals.get(k, 0.0) + v
+            rate = (state["users_done"] - done_before) / max(time.perf_counter() - start, 1e-9)
+            stages = ", ".join(f"{k} {v:.2f}s" for k, v in timings.items())
+            print(f"  {state['users_done']}/{first + len(todo)} users, {rate:.0f} users/s | {stages}", flush=True)
+
+    state["completed_at"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    state["elapsed_seconds"] = elapsed_before + time.perf_counter() - start
+    if not dry_run:
+        save_checkpoint(state)
+        os.remove(_users_path(run_id))
+
+    c = state["counts"]
+    print("\n=========== Batch scoring ===========")
+    print(f"Run {run_id}: {state['users_done']} users, {c['scored']} scored, {c['inactive']} inactive, "
+          f"{c['incomplete']} incomplete")
+    print(f"Elapsed {state['elapsed_seconds']:.1f}s, "
+          f"{state['users_done'] / max(state['elapsed_seconds'], 1e-9):.0f} users/s overall")
+    if stage_totals:
+        print("Stage time: " + ", ".join(f"{k} {v:.1f}s" for k, v in stage_totals.items()))
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every active user and write predictions back in bulk.")
+    parser.add_argument("--run-id", help="checkpoint name (default: today's UTC date)")
+    parser.add_argument("--batch-users", type=int, default=BATCH_USERS, help="users per scoring / write batch")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="per-user event reads in flight")
+    parser.add_argument("--limit", type=int, help="only the first N users (testing)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint for this run id")
+    parser.add_argument("--dry-run", action="store_true", help="score without writing predictions or checkpoints")
+    args = parser.parse_args()
+
+    run(args.run_id, args.batch_users, args.limit, args.restart, args.dry_run, args.concurrency)
@@ -0,0 +1,292 @@
+"""
+Compact array-backed RandomForest for serving.
+
+Exports a fitted sklearn RandomForestClassifier (binary) to a directory of flat
+.npy arrays and evaluates it with vectorized numpy, as a drop-in for the sklearn
+object in the ensemble (same predict_proba interface).
+
+Layout of models/random_forest_compact/:
+  feature.npy    - int8/int16 split feature per node, -1 for leaves
+  threshold.npy  - float32 split threshold (rounded down, so x <= t is exact for float32 x)
+  right.npy      - uint16/uint32 index of the right child inside its tree
+                   (nodes are stored in pre-order, so the left child is always node + 1)
+  value.npy      - uint8/uint16 quantized P(class 1) for leaves
+  tree_offset.npy- int32 index of every tree's root
+  meta.json      - leaf quantization, max depth, node counts
+
+Subtrees whose leaves all quantize to the same value are pruned into a single
+leaf. Leaves use 8-bit probabilities unless that moves predictions by more than
+QUANTIZATION_TOLERANCE on the check rows, in which case 16 bits are used.
+
+Run (after train_models.py) for an export + size / RSS / load time / agreement report:
+  python compact_forest.py
+"""
+
+import io
+import os
+import json
+import time
+import shutil
+
+import numpy as np
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+COMPACT_RF_DIR = "random_forest_compact"   # inside the model directory
+QUANTIZATION_TOLERANCE = 0.005             # max |P(class 1)| change allowed for 8-bit leaves
+PREDICT_CHUNK_ROWS = 4096
+
+_ARRAYS = ["feature", "threshold", "right", "value", "tree_offset"]
+
+
+# ----------------------------
+# 1. EXPORT
+# ----------------------------
+
+def _float32_floor(t: np.ndarray) -> np.ndarray:
+    """Largest float32 <= t, so float32(x) <= result  <=>  float32(x) <= t."""
+    t32 = t.astype(np.float32)
+    too_big = t32.astype(np.float64) > t
+    t32[too_big] = np.nextafter(t32[too_big], np.float32(-np.inf))
+    return t32
+
+
+def _flatten_tree(tree, scale: int):
+    """Pruned pre-order node lists for one sklearn tree."""
+    children_left = tree.children_left
+    children_right = tree.children_right
+    value = tree.value[:, 0, :]
+    q = np.rint(value[:, 1] / value.sum(axis=1) * scale).astype(np.int64)
+
+    # Children always have larger ids than their parent, so one reverse pass is bottom-up
+    const = np.full(tree.node_count, -1, dtype=np.int64)
+    for node in range(tree.node_count - 1, -1, -1):
+        left, right = children_left[node], children_right[node]
+        if left == -1:
+            const[node] = q[node]
+        elif const[left] >= 0 and const[left] == const[right]:
+            const[node] = const[left]
+
+    feature, threshold, right_child, leaf_value = [], [], [], []
+    max_depth = 0
+
+    def emit(node: int, depth: int) -> None:
+        nonlocal max_depth
+        max_depth = max(max_depth, depth)
+        i = len(feature)
+        if const[node] >= 0:
+            feature.append(-1)
+            threshold.append(0.0)
+            right_child.append(0)
+            leaf_value.append(const[node])
+            return
+        feature.append(tree.feature[node])
+        threshold.append(tree.threshold[node])
+        right_child.append(0)
+        leaf_value.append(0)
+        emit(children_left[node], depth + 1)
+        right_child[i] = len(feature)
+        emit(children_right[node], depth + 1)
+
+    emit(0, 0)
+    return feature, threshold, right_child, leaf_value, max_depth
+
+
+def _build_arrays(rf, leaf_bits: int) -> dict:
+    scale = 2 ** leaf_bits - 1
+    parts = [_flatten_tree(est.tree_, scale) for est in rf.estimators_]
+
+    sizes = np.array([len(p[0]) for p in parts])
+    n_features = rf.n_features_in_
+
+    return {
+        "feature": np.concatenate([p[0] for p in parts]).astype(np.int8 if n_features < 128 else np.int16),
+        "threshold": _float32_floor(np.concatenate([p[1] for p in parts]).astype(np.float64)),
+        "right": np.concatenate([p[2] for p in parts]).astype(np.uint16 if sizes.max() < 2 ** 16 else np.uint32),
+        "value": np.concatenate([p[3] for p in parts]).astype(np.uint8 if leaf_bits <= 8 else np.uint16),
+        "tree_offset": np.r_[0, np.cumsum(sizes)[:-1]].astype(np.int32),
+        "_meta": {
+            "leaf_scale": scale,
+            "leaf_bits": leaf_bits,
+            "max_depth": int(max(p[4] for p in parts)),
+            "n_trees": len(parts),
+            "n_nodes": int(sizes.sum()),
+            "n_nodes_sklearn": int(sum(est.tree_.node_count for est in rf.estimators_)),
+            "n_features": int(n_features),
+        },
+    }
+
+
+def export_compact_forest(rf, path: str, X_check: np.ndarray = None) -> dict:
+    """
+    Write rf to `path` in the compact format. With X_check, 8-bit leaves are only
+    kept if they stay within QUANTIZATION_TOLERANCE of the sklearn probabilities.
+    Returns the export meta.
+    """
+    if getattr(rf, "n_classes_", 2) != 2:
+        raise ValueError("Compact export supports binary classifiers only")
+
+    arrays = _build_arrays(rf, leaf_bits=8)
+    if X_check is not None:
+        diff = np.abs(CompactForest(arrays).predict_proba(X_check)[:, 1] - rf.predict_proba(X_check)[:, 1]).max()
+        if diff > QUANTIZATION_TOLERANCE:
+            print(f"8-bit leaves move predictions by {diff:.4f}; using 16-bit leaves")
+            arrays = _build_arrays(rf, leaf_bits=16)
+
+    meta = arrays.pop("_meta")
+
+    # Serving workers may have the current files memory-mapped (MODEL_MMAP=1):
+    # overwriting them in place would truncate pages under a live worker, so the
+    # export is written next to `path` and swapped in as a whole
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in _ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), arrays[name])
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    replace_dir(tmp, path)
+    return meta
+
+
+def replace_dir(tmp: str, path: str) -> None:
+    """
+    Move directory `tmp` to `path`. The old directory is renamed away before it
+    is deleted, so processes that have its files open or mapped keep reading the
+    old data; only later loads see the new files. (A load landing between the two
+    renames finds no export and falls back to the sklearn pickle, see ensemble.py.)
+    """
+    old = f"{path}.old-{os.getpid()}"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+# ----------------------------
+# 2. LOAD + EVALUATE
+# ----------------------------
+
+class CompactForest:
+    """Vectorized evaluator with the sklearn predict_proba interface."""
+
+    def __init__(self, arrays: dict, meta: dict = None):
+        meta = meta or arrays["_meta"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.tree_offset = arrays["tree_offset"]
+        self.leaf_scale = float(meta["leaf_scale"])
+        self.max_depth = int(meta["max_depth"])
+        self.classes_ = np.array([0, 1])
+
+    def _leaf_probabilities(self, X: np.ndarray) -> np.ndarray:
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.tree_offset, (len(X), len(self.tree_offset))).copy()
+
+        for _ in range(self.max_depth):
+            feat = self.feature[node]
+            internal = feat >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, feat, 0)]
+            right = self.tree_offset + self.right[node].astype(np.int32)
+            step = np.where(x <= self.threshold[node], node + 1, right)
+            node = np.where(internal, step, node)
+
+        return self.value[node].mean(axis=1) / self.leaf_scale
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        p1 = np.concatenate([
+            self._leaf_probabilities(X[i:i + PREDICT_CHUNK_ROWS])
+            for i in range(0, len(X), PREDICT_CHUNK_ROWS)
+        ]) if len(X) else np.empty(0)
+        return np.column_stack([1 - p1, p1])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+
+def load_compact_forest(path: str, mmap: bool = False) -> CompactForest:
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _ARRAYS}
+    return CompactForest(arrays, meta)
+
+
+# ----------------------------
+# 3. REPORT
+# ----------------------------
+
+def _rss_bytes() -> int:
+    """Current resident set size (Linux); 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+if __name__ == "__main__":
+    import joblib
+    from sklearn.model_selection import train_test_split
+
+    from ensemble import MODEL_DIR, MODEL_FILES, load_models, ensemble_scores, scores_to_risk_levels
+    from feature_store import load_feature_matrix
+
+    X, y = load_feature_matrix()
+    _, X_valid = train_test_split(np.asarray(X), test_size=0.2, random_state=42, stratify=np.asarray(y))
+    X_valid = X_valid[:100_000]
+
+    rf_path = os.path.join(MODEL_DIR, MODEL_FILES["rf"])
+    compact_path = os.path.join(MODEL_DIR, COMPACT_RF_DIR)
+
+    # RSS is measured as the growth caused by each load
+    rss0 = _rss_bytes()
+    t0 = time.perf_counter()
+    rf = joblib.load(rf_path)
+    sk_load_s = time.perf_counter() - t0
+    sk_rss = _rss_bytes() - rss0
+
+    meta = export_compact_forest(rf, compact_path, X_check=X_valid[:20_000])
+
+    rss0 = _rss_bytes()
+    t0 = time.perf_counter()
+    compact = load_compact_forest(compact_path)
+    c_load_s = time.perf_counter() - t0
+    c_rss = _rss_bytes() - rss0
+
+    p_sk = rf.predict_proba(X_valid)[:, 1]
+    p_c = compact.predict_proba(X_valid)[:, 1]
+
+    models = load_models(MODEL_DIR)
+    levels_sk = scores_to_risk_levels(ensemble_scores(models, X_valid))
+    models["rf"] = compact
+    levels_c = scores_to_risk_levels(ensemble_scores(models, X_valid))
+
+    buf = io.BytesIO()
+    joblib.dump(rf, buf)
+
+    print("\n=========== Compact Random Forest ===========")
+    print(f"Nodes: {meta['n_nodes_sklearn']} -> {meta['n_nodes']} after pruning, {meta['leaf_bits']}-bit leaves")
+    print(f"Size on disk: {os.path.getsize(rf_path) / 1e6:.1f} MB -> {_dir_bytes(compact_path) / 1e6:.1f} MB")
+    print(f"Pickled size: {buf.getbuffer().nbytes / 1e6:.1f} MB, compact arrays: {compact.nbytes / 1e6:.1f} MB")
+    print(f"RSS growth on load: {sk_rss / 1e6:.1f} MB -> {c_rss / 1e6:.1f} MB")
+    print(f"Load time: {sk_load_s * 1000:.0f} ms -> {c_load_s * 1000:.0f} ms")
+    print(f"Max |P(class 1)| difference: {np.abs(p_sk - p_c).max():.5f}")
+    print(f"RF class agreement: {((p_sk > 0.5) == (p_c > 0.5)).mean():.5f}")
+    print(f"Ensemble risk level agreement: {(levels_sk == levels_c).mean():.5f}")
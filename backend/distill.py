@@ -0,0 +1,162 @@
+"""
+Distill the four-model ensemble into a single compact LightGBM model.
+
+The student is trained on the blended ensemble score (soft labels, cross-entropy
+objective) over the training distribution, on raw (unscaled) features, so serving
+it needs neither the scaler nor the other four models. A slice of the training
+rows is held back for early stopping; agreement with the ensemble and risk-level
+accuracy are reported on a separate holdout of real (non-SMOTE) labeled rows.
+
+Called at the end of train_models.py (and by incremental_train.py for new
+versions); can also be run on its own against the current models/:
+  python distill.py
+
+Serve it with:
+  SERVING_MODE=distilled uvicorn app:app ...
+"""
+
+import io
+import os
+import time
+
+import numpy as np
+import joblib
+import lightgbm as lgb
+
+from ensemble import (
+    MODEL_DIR, DISTILLED_FILE,
+    load_models, load_model_meta, save_model_meta,
+    ensemble_scores, scores_to_risk_levels,
+)
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+MAX_DISTILL_ROWS = 500_000     # teacher scoring of the RandomForest dominates distill time
+LATENCY_REPEATS = 200
+
+STUDENT_PARAMS = {
+    "objective": "cross_entropy",   # accepts soft labels in [0, 1]
+    "metric": "cross_entropy",
+    "learning_rate": 0.2,
+    "num_leaves": 31,
+    "min_data_in_leaf": 50,
+    "feature_fraction": 0.9,
+    "num_threads": 1,               # single-row serving is faster without a thread pool
+    "verbose": -1,
+}
+STUDENT_ROUNDS = 2_000          # upper bound only; early stopping ends training (~400 rounds)
+EARLY_STOPPING_ROUNDS = 30
+EARLY_STOPPING_MIN_DELTA = 1e-5  # cross-entropy has a floor (teacher entropy); stop on tiny gains
+STOPPING_FRACTION = 0.1         # training rows held back for early stopping
+
+
+def _pickled_size(obj) -> int:
+    buf = io.BytesIO()
+    joblib.dump(obj, buf)
+    return buf.getbuffer().nbytes
+
+
+def _latency_ms(fn, x: np.ndarray, repeats: int = LATENCY_REPEATS) -> float:
+    fn(x)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(x)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def distill_ensemble(models: dict, X_train: np.ndarray, X_valid: np.ndarray, y_valid: np.ndarray = None):
+    """
+    Fit the student on the teacher's scores over X_train and compare the two on
+    X_valid, which should be real rows (no SMOTE samples) neither was trained on.
+    Returns (student Booster, report dict).
+    """
+    rng = np.random.default_rng(42)
+    if len(X_train) > MAX_DISTILL_ROWS:
+        X_train = X_train[np.sort(rng.choice(len(X_train), MAX_DISTILL_ROWS, replace=False))]
+    X_train = np.asarray(X_train, dtype=float)
+    X_valid = np.asarray(X_valid, dtype=float)
+
+    print(f"Scoring teacher ensemble on {len(X_train)} rows...")
+    t_train = ensemble_scores(models, X_train)
+    t_valid = ensemble_scores(models, X_valid)
+
+    # Early stopping on held-back training rows, so X_valid stays an unbiased report set
+    stop = rng.random(len(X_train)) < STOPPING_FRACTION
+
+    print("Training distilled student model...")
+    student = lgb.train(
+        params=STUDENT_PARAMS,
+        train_set=lgb.Dataset(X_train[~stop], t_train[~stop]),
+        valid_sets=[lgb.Dataset(X_train[stop], t_train[stop])],
+        num_boost_round=STUDENT_ROUNDS,
+        callbacks=[
+            lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False, min_delta=EARLY_STOPPING_MIN_DELTA),
+            lgb.log_evaluation(period=100),
+        ],
+    )
+
+    s_valid = student.predict(X_valid)
+    teacher_levels = scores_to_risk_levels(t_valid)
+    student_levels = scores_to_risk_levels(s_valid)
+
+    teacher_size = sum(_pickled_size(m) for m in models.values())
+    student_size = _pickled_size(student)
+
+    x1 = X_valid[:1]
+    teacher_ms = _latency_ms(lambda x: ensemble_scores(models, x), x1)
+    student_ms = _latency_ms(student.predict, x1)
+
+    report = {
+        "rounds": int(student.best_iteration or student.num_trees()),
+        "max_rounds": STUDENT_ROUNDS,
+        "holdout_rows": int(len(X_valid)),
+        "risk_level_agreement": round(float((teacher_levels == student_levels).mean()), 4),
+        "score_mae": round(float(np.abs(t_valid - s_valid).mean()), 4),
+        "teacher_bytes": int(teacher_size),
+        "student_bytes": int(student_size),
+        "teacher_latency_ms": round(teacher_ms, 3),
+        "student_latency_ms": round(student_ms, 3),
+    }
+
+    if y_valid is not None:
+        # LOW/MEDIUM/HIGH vs the true label: HIGH and MEDIUM count as a positive call
+        y_valid = np.asarray(y_valid)
+        report["teacher_level_accuracy"] = round(float(((teacher_levels != "LOW") == y_valid).mean()), 4)
+        report["student_level_accuracy"] = round(float(((student_levels != "LOW") == y_valid).mean()), 4)
+
+    return student, report
+
+
+def print_report(report: dict) -> None:
+    print("\n=========== Distilled model ===========")
+    print(f"Boosting rounds: {report['rounds']} (early stopping, cap {report.get('max_rounds', STUDENT_ROUNDS)})")
+    print(f"Risk level agreement with ensemble (holdout, n={report.get('holdout_rows', '?')}):",
+          report["risk_level_agreement"])
+    print("Mean |score difference|:", report["score_mae"])
+    if "teacher_level_accuracy" in report:
+        print("Level accuracy (ensemble / distilled):",
+              report["teacher_level_accuracy"], "/", report["student_level_accuracy"])
+    print(f"Size: {report['teacher_bytes'] / 1e6:.1f} MB -> {report['student_bytes'] / 1e6:.2f} MB")
+    print(f"Single-row latency: {report['teacher_latency_ms']:.2f} ms -> {report['student_latency_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    from sklearn.model_selection import train_test_split
+    from feature_store import load_feature_matrix
+
+    # Real rows only; the teacher may have seen some of X_valid (train_models.py
+    # reports on a proper holdout)
+    models = load_models(MODEL_DIR)
+    X, y = load_feature_matrix()
+    X_train, X_valid, _, y_valid = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    student, report = distill_ensemble(models, X_train, X_valid, y_valid)
+    print_report(report)
+
+    joblib.dump(student, os.path.join(MODEL_DIR, DISTILLED_FILE))
+    meta = load_model_meta(MODEL_DIR)
+    meta["distillation"] = report
+    save_model_meta(meta, MODEL_DIR)
+    print(f"Saved distilled model to {MODEL_DIR}/{DISTILLED_FILE}")
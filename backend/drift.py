@@ -0,0 +1,284 @@
+"""
+Streaming drift monitor for live /predict inputs.
+
+At training time a reference snapshot of the feature distribution is stored
+with the model (models/drift_reference.json):
+  edges        - per feature, inner bin edges at the training quantiles
+                 (DRIFT_BINS equal-mass bins; fewer for discrete features)
+  proportions  - share of training rows in every bin
+  quantiles    - training quantiles (QUANTILES), mean / std / min / max
+  risk_mix     - share of LOW / MEDIUM / HIGH risk levels per serving mode
+                 ("ensemble", "distilled"), scored by the same function that
+                 serves them (ensemble.serving_scores)
+
+At serving time DriftMonitor keeps fixed-size sketches for the current window:
+per feature a histogram over the reference bins (which also gives approximate
+quantiles) plus running sums, and the risk-level counts of the served model's
+score before the per-user adjustment (the reference cannot know which users
+will send a user_id). NaN / inf inputs are counted per feature and left out of
+the histograms and means. Memory does not grow with traffic and observing one
+request is a single vectorized comparison.
+Windows close after WINDOW_REQUESTS requests or WINDOW_SECONDS; the report
+compares the live and the last closed window to the reference:
+  psi          - population stability index over the reference bins
+                 (< 0.1 stable, 0.1-0.25 moderate, > 0.25 drift)
+  ks           - max distance between the binned CDFs
+  mean_shift   - (live mean - reference mean) in reference standard deviations
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+DRIFT_REFERENCE_FILE = "drift_reference.json"
+DRIFT_BINS = 20
+REFERENCE_ROWS = 200_000          # rows sampled from the training matrix for the snapshot
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+WINDOW_REQUESTS = 5_000
+WINDOW_SECONDS = 3600.0
+MIN_WINDOW_REQUESTS = 100         # below this the window status is "insufficient_data"
+
+PSI_MODERATE = 0.1
+PSI_DRIFT = 0.25
+_EPS = 1e-4                       # proportion floor for PSI on empty bins
+
+
+def _psi(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """PSI along the last axis between proportions p (live) and q (reference)."""
+    p = np.clip(p, _EPS, None)
+    q = np.clip(q, _EPS, None)
+    return ((p - q) * np.log(p / q)).sum(axis=-1)
+
+
+def _status(psi: float) -> str:
+    if psi >= PSI_DRIFT:
+        return "drift"
+    if psi >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+# ----------------------------
+# 1. REFERENCE SNAPSHOT (training time)
+# ----------------------------
+
+def reference_rows(n_rows: int, max_rows: int = REFERENCE_ROWS) -> np.ndarray:
+    """Sorted sample of row indices for the snapshot (all rows when there are few)."""
+    if n_rows <= max_rows:
+        return np.arange(n_rows)
+    return np.sort(np.random.default_rng(42).choice(n_rows, max_rows, replace=False))
+
+
+def build_reference(X: np.ndarray, risk_levels: dict, features, risk_level_names,
+                    n_bins: int = DRIFT_BINS) -> dict:
+    """
+    Reference distribution of training features X (raw, unbalanced) and of the
+    risk levels each serving mode gives the same rows ({mode: levels}).
+    """
+    X = np.asarray(X, dtype=float)
+
+    edges, proportions = [], []
+    for j in range(X.shape[1]):
+        e = np.unique(np.quantile(X[:, j], np.linspace(0, 1, n_bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(e, X[:, j], side="left"), minlength=len(e) + 1)
+        edges.append(e.tolist())
+        proportions.append((counts / len(X)).tolist())
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "n_rows": int(len(X)),
+        "features": list(features),
+        "edges": edges,
+        "proportions": proportions,
+        "quantile_levels": QUANTILES,
+        "quantiles": np.quantile(X, QUANTILES, axis=0).T.tolist(),
+        "mean": X.mean(axis=0).tolist(),
+        "std": X.std(axis=0).tolist(),
+        "min": X.min(axis=0).tolist(),
+        "max": X.max(axis=0).tolist(),
+        "risk_levels": list(risk_level_names),
+        "risk_mix": {
+            mode: [float((np.asarray(levels) == level).mean()) for level in risk_level_names]
+            for mode, levels in risk_levels.items()
+        },
+    }
+
+
+def save_drift_reference(reference: dict, model_dir: str) -> None:
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, DRIFT_REFERENCE_FILE), "w") as f:
+        json.dump(reference, f)
+
+
+def load_drift_reference(model_dir: str = "models"):
+    """Returns the reference snapshot, or None when the model has none."""
+    path = os.path.join(model_dir, DRIFT_REFERENCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# ----------------------------
+# 2. STREAMING MONITOR (serving time)
+# ----------------------------
+
+class DriftMonitor:
+    """Constant-memory per-feature histograms + risk-level counts, compared to a reference."""
+
+    def __init__(self, reference: dict, serving_mode: str = "ensemble",
+                 window_requests: int = WINDOW_REQUESTS, window_seconds: float = WINDOW_SECONDS):
+        self.reference = reference
+        self.serving_mode = serving_mode
+        self.features = reference["features"]
+        self.risk_levels = reference["risk_levels"]
+        self.window_requests = window_requests
+        self.window_seconds = window_seconds
+
+        n_features = len(self.features)
+        self.n_bins = max(len(e) for e in reference["edges"]) + 1
+
+        # Edges padded with +inf so every feature uses the same (n_features, n_bins - 1) array;
+        # bin = number of edges strictly below x, as np.searchsorted(side="left") in the reference
+        self.edges = np.full((n_features, self.n_bins - 1), np.inf)
+        self.ref_props = np.zeros((n_features, self.n_bins))
+        for j, (e, p) in enumerate(zip(reference["edges"], reference["proportions"])):
+            self.edges[j, :len(e)] = e
+            self.ref_props[j, :len(p)] = p
+
+        self.ref_cdf = np.cumsum(self.ref_props, axis=1)
+        self.ref_mean = np.asarray(reference["mean"])
+        self.ref_std = np.where(np.asarray(reference["std"]) > 0, reference["std"], 1.0)
+        # Older snapshots hold a single (ensemble) mix; None: no mix for this mode
+        risk_mix = reference["risk_mix"]
+        if isinstance(risk_mix, dict):
+            risk_mix = risk_mix.get(serving_mode)
+        elif serving_mode != "ensemble":
+            risk_mix = None
+        self.ref_risk = np.asarray(risk_mix) if risk_mix is not None else None
+        self._rows = np.arange(n_features)
+        self._risk_index = {level: i for i, level in enumerate(self.risk_levels)}
+
+        self.lock = threading.Lock()
+        self.last_window = None
+        self.windows_closed = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.counts = np.zeros((len(self.features), self.n_bins), dtype=np.int64)
+        self.sums = np.zeros(len(self.features))
+        self.finite = np.zeros(len(self.features), dtype=np.int64)
+        self.risk_counts = np.zeros(len(self.risk_levels), dtype=np.int64)
+        self.n = 0
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+
+    def observe(self, x: np.ndarray, risk_level: str) -> None:
+        """Add one feature vector (FEATURES order) and its risk level."""
+        x = np.asarray(x, dtype=float).reshape(-1)
+        ok = np.isfinite(x)
+        bins = (x[:, None] > self.edges).sum(axis=1)
+
+        with self.lock:
+            # Non-finite values are counted (n - finite), not binned or summed
+            self.counts[self._rows[ok], bins[ok]] += 1
+            self.sums += np.where(ok, x, 0.0)
+            self.finite += ok
+            i = self._risk_index.get(risk_level)
+            if i is not None:
+                self.risk_counts[i] += 1
+            self.n += 1
+
+            if self.n >= self.window_requests or time.monotonic() - self.started >= self.window_seconds:
+                self.last_window = self._window_report()
+                self.windows_closed += 1
+                self._reset()
+
+    def _quantiles(self, props: np.ndarray) -> np.ndarray:
+        """Approximate quantiles from the histograms (linear inside each bin)."""
+        lo = np.asarray(self.reference["min"])[:, None]
+        hi = np.asarray(self.reference["max"])[:, None]
+        # Bin boundaries: [min, edges..., max]; padded (+inf) edges become max
+        bounds = np.concatenate([lo, np.minimum(self.edges, hi), hi], axis=1)
+        bounds = np.maximum.accumulate(bounds, axis=1)
+        cdf = np.concatenate([np.zeros((len(props), 1)), np.cumsum(props, axis=1)], axis=1)
+
+        out = np.empty((len(props), len(QUANTILES)))
+        for j in range(len(props)):
+            out[j] = np.interp(QUANTILES, cdf[j], bounds[j])
+        return out
+
+    def _window_report(self) -> dict:
+        n = self.n
+        report = {
+            "started_at": self.started_at,
+            "requests": int(n),
+            "age_seconds": round(time.monotonic() - self.started, 1),
+        }
+        if n < MIN_WINDOW_REQUESTS:
+            report["status"] = "insufficient_data"
+            return report
+
+        finite = np.maximum(self.finite, 1)
+        props = self.counts / finite[:, None]
+        psi = _psi(props, self.ref_props)
+        ks = np.abs(np.cumsum(props, axis=1) - self.ref_cdf).max(axis=1)
+        mean_shift = (self.sums / finite - self.ref_mean) / self.ref_std
+        quantiles = self._quantiles(props)
+        non_finite = n - self.finite
+
+        risk_props = self.risk_counts / n
+        risk_psi = float(_psi(risk_props, self.ref_risk)) if self.ref_risk is not None else 0.0
+
+        features = {
+            name: {
+                "psi": round(float(psi[j]), 4),
+                "ks": round(float(ks[j]), 4),
+                "mean_shift": round(float(mean_shift[j]), 3),
+                "quantiles": [round(float(q), 3) for q in quantiles[j]],
+                "reference_quantiles": [round(float(q), 3) for q in self.reference["quantiles"][j]],
+                "non_finite": int(non_finite[j]),
+                "status": _status(psi[j]),
+            }
+            for j, name in enumerate(self.features)
+        }
+
+        worst = int(np.argmax(psi))
+        report.update({
+            "status": _status(max(float(psi.max()), risk_psi)),
+            "max_psi": round(float(psi[worst]), 4),
+            "max_psi_feature": self.features[worst],
+            "drifted_features": [f for f, v in features.items() if v["status"] == "drift"],
+            "non_finite_values": int(non_finite.sum()),
+            "serving_mode": self.serving_mode,
+            "risk_mix": {level: round(float(p), 4) for level, p in zip(self.risk_levels, risk_props)},
+            "reference_risk_mix": (
+                {level: round(float(p), 4) for level, p in zip(self.risk_levels, self.ref_risk)}
+                if self.ref_risk is not None else None
+            ),
+            "risk_mix_psi": round(risk_psi, 4) if self.ref_risk is not None else None,
+            "features": features,
+        })
+        return report
+
+    def report(self) -> dict:
+        with self.lock:
+            current = self._window_report()
+            last = self.last_window
+            closed = self.windows_closed
+        return {
+            "reference": {"created_at": self.reference["created_at"], "n_rows": self.reference["n_rows"]},
+            "window": {"requests": self.window_requests, "seconds": self.window_seconds},
+            "windows_closed": closed,
+            "current_window": current,
+            "last_window": last,
+        }
@@ -0,0 +1,142 @@
+"""
+Shared ensemble definition: which model files make up a model version,
+how their probabilities are blended, and how scores map to risk levels.
+
+Used by inference.py for serving and by the training scripts for evaluation,
+so the blend is defined in exactly one place. Importing this module does not
+load any models.
+"""
+
+import os
+import json
+
+import numpy as np
+import joblib
+
+from compact_forest import COMPACT_RF_DIR, load_compact_forest
+
+
+MODEL_DIR = "models"
+DEFAULT_MODEL_VERSION = "v1.0"
+
+MODEL_FILES = {
+    "scaler": "scaler.pkl",
+    "logreg": "logreg.pkl",
+    "rf": "random_forest.pkl",
+    "xgb": "xgboost.pkl",
+    "lgb": "lightgbm.pkl",  # Booster
+}
+DISTILLED_FILE = "distilled.pkl"  # LightGBM Booster, see distill.py
+META_FILE = "model_meta.json"
+TRAINED_KEYS_FILE = "trained_keys.npy"
+
+# "ensemble": the four models + scaler; "distilled": one compact student model
+SERVING_MODES = ("ensemble", "distilled")
+
+# Weighted ensemble (favor LightGBM & XGBoost)
+WEIGHTS = {
+    "lgb": 0.45,
+    "xgb": 0.30,
+    "rf": 0.15,
+    "logreg": 0.10,
+}
+
+# Softer thresholds to get more MEDIUM / HIGH
+LOW_THRESHOLD = 0.35
+HIGH_THRESHOLD = 0.65
+RISK_LEVELS = np.array(["LOW", "MEDIUM", "HIGH"])
+
+
+def load_models(model_dir: str = MODEL_DIR, rf_format: str = "sklearn", mmap: bool = False) -> dict:
+    """
+    rf_format="compact" swaps the RandomForest pickle for the array-backed export
+    (compact_forest.py) when one exists next to it; training code keeps "sklearn".
+    mmap=True memory-maps numpy arrays read-only (page-cache pages shared by all
+    processes serving the same files) instead of copying them onto the heap.
+    In practice this matters for the compact RandomForest arrays; the pickled
+    LightGBM / XGBoost boosters are not numpy arrays and load onto the heap either way.
+    """
+    compact_path = os.path.join(model_dir, COMPACT_RF_DIR)
+    use_compact = rf_format == "compact" and os.path.isdir(compact_path)
+    mmap_mode = "r" if mmap else None
+
+    models = {
+        name: joblib.load(os.path.join(model_dir, fname), mmap_mode=mmap_mode)
+        for name, fname in MODEL_FILES.items()
+        if not (name == "rf" and use_compact)
+    }
+    if use_compact:
+        models["rf"] = load_compact_forest(compact_path, mmap=mmap)
+    return models
+
+
+def load_serving_models(mode: str = "ensemble", model_dir: str = MODEL_DIR, rf_format: str = "compact",
+                        mmap: bool = False) -> dict:
+    if mode not in SERVING_MODES:
+        raise ValueError(f"Unknown serving mode {mode!r}, expected one of {SERVING_MODES}")
+    if mode == "distilled":
+        return {"distilled": joblib.load(os.path.join(model_dir, DISTILLED_FILE))}
+    return load_models(model_dir, rf_format=rf_format, mmap=mmap)
+
+
+def save_models(models: dict, model_dir: str) -> None:
+    os.makedirs(model_dir, exist_ok=True)
+    for name, fname in MODEL_FILES.items():
+        joblib.dump(models[name], os.path.join(model_dir, fname))
+
+
+def load_model_meta(model_dir: str = MODEL_DIR) -> dict:
+    try:
+        with open(os.path.join(model_dir, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"version": DEFAULT_MODEL_VERSION}
+
+
+def save_model_meta(meta: dict, model_dir: str = MODEL_DIR) -> None:
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def model_probabilities(models: dict, X: np.ndarray) -> dict:
+    """Per-model positive-class probabilities for a batch of raw (unscaled) rows."""
+    X = np.asarray(X, dtype=float)
+    X_scaled = models["scaler"].transform(X)
+
+    return {
+        "logreg": models["logreg"].predict_proba(X_scaled)[:, 1],
+        "rf": models["rf"].predict_proba(X)[:, 1],
+        "xgb": models["xgb"].predict_proba(X_scaled)[:, 1],
+        "lgb": np.asarray(models["lgb"].predict(X_scaled), dtype=float),  # LightGBM Booster
+    }
+
+
+def blend(probs: dict) -> np.ndarray:
+    return sum(WEIGHTS[name] * probs[name] for name in WEIGHTS)
+
+
+def ensemble_scores(models: dict, X: np.ndarray) -> np.ndarray:
+    """Blended risk score for a batch of raw (unscaled) rows."""
+    return blend(model_probabilities(models, X))
+
+
+def serving_scores(models: dict, X: np.ndarray) -> np.ndarray:
+    """Risk scores from whatever load_serving_models() returned."""
+    if "distilled" in models:
+        return np.asarray(models["distilled"].predict(np.asarray(X, dtype=float)), dtype=float)
+    return ensemble_scores(models, X)
+
+
+def scores_to_risk_levels(scores: np.ndarray) -> np.ndarray:
+    """Vectorized LOW / MEDIUM / HIGH mapping."""
+    idx = (np.asarray(scores) >= LOW_THRESHOLD).astype(int) + (np.asarray(scores) >= HIGH_THRESHOLD)
+    return RISK_LEVELS[idx]
+
+
+def score_to_risk_level(score: float) -> str:
+    if score < LOW_THRESHOLD:
+        return "LOW"
+    elif score < HIGH_THRESHOLD:
+        return "MEDIUM"
+    return "HIGH"
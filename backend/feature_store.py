@@ -0,0 +1,501 @@
+"""
+Cached feature engineering for training.
+
+Turns the raw synthetic dataset (data/synthetic_migraine_data.csv + data/users.csv)
+into the final FEATURES matrix and migraine_next_24h labels, and keeps the result
+on disk as plain .npy files that can be memory-mapped.
+
+Cache layout (one directory per feature definition):
+  data/feature_cache/<definition_hash>/
+    meta.json          - source hash, row counts, feature list
+    X.npy / y.npy      - training-ready matrix (NaN rows dropped), mmap-able
+    keys.npy           - (user_id, date) hash of every X row, for incremental training
+    user_idx.npy       - index into user_ids.npy for every X row
+    user_ids.npy       - sorted unique user ids
+    full_X.npy         - engineered features for every source row (incl. NaN rows)
+    full_y.npy         - labels for every source row
+    key_hash.npy       - per-row hash of (user_id, date)
+    row_hash.npy       - per-row hash of the raw source columns
+    group_start.npy    - True where a new user starts (rows sorted by user_id, date)
+
+When the source data changes (e.g. new days appended), only rows whose raw values
+changed plus the tail of each affected user are recomputed; everything else is
+reused from the previous cache.
+
+Sharded datasets (generate_synthetic_data.py --shards) are read lazily: pass the
+manifest (data/shards/manifest.json) as data_path and every shard is engineered
+and cached on its own, then copied into one memory-mapped matrix under
+data/feature_cache/sharded-<hash>/, so no more than one shard is held in memory.
+
+Usage:
+  from feature_store import load_feature_matrix
+  X, y = load_feature_matrix()
+  X, y = load_feature_matrix("data/shards/manifest.json")
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from features import FEATURES
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+# TRAIN_DATA may point at a CSV or at a shard manifest (.json)
+DATA_PATH = os.getenv("TRAIN_DATA", "data/synthetic_migraine_data.csv")
+USERS_PATH = "data/users.csv"
+FEATURE_CACHE_DIR = "data/feature_cache"
+TARGET = "migraine_next_24h"
+
+# Bump when the engineering below (or the cache layout) changes in a way FEATURES does not capture
+FEATURE_VERSION = "2"
+
+ROLLING_WINDOW = 3
+ROLLING_COLS = ["sleep_hours", "hrv", "screen_time_total_hours", "meeting_hours"]
+
+# (feature, raw column, baseline column)
+DEVIATIONS = [
+    ("sleep_deviation", "sleep_hours", "baseline_sleep"),
+    ("hrv_deviation", "hrv", "baseline_hrv"),
+    ("screen_deviation", "screen_time_total_hours", "baseline_screen"),
+    ("meeting_deviation", "meeting_hours", "baseline_meeting_hours"),
+]
+
+DERIVED_FEATURES = (
+    [name for name, _, _ in DEVIATIONS]
+    + ["pressure_change_abs"]
+    + [f"{col}_3d_avg" for col in ROLLING_COLS]
+)
+RAW_FEATURES = [f for f in FEATURES if f not in DERIVED_FEATURES]
+
+# Raw daily columns the engineered features depend on
+SOURCE_COLS = sorted(
+    set(RAW_FEATURES)
+    | set(ROLLING_COLS)
+    | {raw for _, raw, _ in DEVIATIONS}
+    | {"pressure_change", TARGET}
+)
+
+_STATE_FILES = ["full_X", "full_y", "key_hash", "row_hash", "group_start"]
+_MATRIX_FILES = ["X", "y", "keys", "user_idx", "user_ids"]
+
+
+# ----------------------------
+# 1. HASHING
+# ----------------------------
+
+def _file_hash(path: str, h=None):
+    h = h or hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h
+
+
+def source_hash(data_path: str = DATA_PATH) -> str:
+    """Hash of the raw daily data file (users are part of the definition hash)."""
+    return _file_hash(data_path).hexdigest()
+
+
+def _definition() -> bytes:
+    return json.dumps({
+        "version": FEATURE_VERSION,
+        "features": FEATURES,
+        "rolling_window": ROLLING_WINDOW,
+        "rolling_cols": ROLLING_COLS,
+        "deviations": DEVIATIONS,
+        "target": TARGET,
+    }, sort_keys=True).encode()
+
+
+def definition_hash(users_path: str = USERS_PATH) -> str:
+    """
+    Hash of everything that changes how a given raw row is engineered:
+    feature list, rolling window, deviation pairs and the user baselines.
+    """
+    h = hashlib.sha1(_definition())
+    return _file_hash(users_path, h).hexdigest()[:16]
+
+
+def is_manifest(data_path: str) -> bool:
+    return data_path.endswith(".json")
+
+
+def verify_shard(shard: dict) -> None:
+    """
+    Check a shard file against its manifest entry before it is used: same size
+    and mtime as when the generator wrote it, otherwise the content hash must
+    still match (e.g. after a copy). Raises ValueError on a changed or
+    incomplete shard.
+    """
+    path = shard["data_path"]
+    if not os.path.exists(path):
+        raise ValueError(f"Shard {path} listed in the manifest is missing")
+    st = os.stat(path)
+    if "bytes" in shard and st.st_size != shard["bytes"]:
+        raise ValueError(f"Shard {path} is {st.st_size} bytes, manifest says {shard['bytes']} — regenerate the shards")
+    if st.st_mtime_ns != shard.get("mtime_ns") and _file_hash(path).hexdigest() != shard["sha1"]:
+        raise ValueError(f"Shard {path} does not match its manifest sha1 — regenerate the shards")
+
+
+def read_manifest(manifest_path: str) -> dict:
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    base = os.path.dirname(manifest_path)
+    for shard in manifest["shards"]:
+        shard["data_path"] = os.path.join(base, shard["data"])
+        shard["users_path"] = os.path.join(base, shard["users"])
+        verify_shard(shard)
+    return manifest
+
+
+def sharded_hash(manifest: dict) -> str:
+    """Feature definition + every shard's content hash (recorded by the generator) + its users file."""
+    h = hashlib.sha1(_definition())
+    for shard in manifest["shards"]:
+        h.update(shard["sha1"].encode())
+        _file_hash(shard["users_path"], h)
+    return h.hexdigest()[:16]
+
+
+# ----------------------------
+# 2. VECTORIZED KERNELS
+# ----------------------------
+
+def group_starts(codes: np.ndarray) -> np.ndarray:
+    """Boolean mask marking the first row of each contiguous group."""
+    starts = np.ones(len(codes), dtype=bool)
+    if len(codes) > 1:
+        starts[1:] = codes[1:] != codes[:-1]
+    return starts
+
+
+def position_in_group(starts: np.ndarray) -> np.ndarray:
+    """0-based position of every row inside its contiguous group."""
+    idx = np.arange(len(starts))
+    first = np.maximum.accumulate(np.where(starts, idx, 0))
+    return idx - first
+
+
+def grouped_rolling_mean(values: np.ndarray, starts: np.ndarray, window: int = ROLLING_WINDOW) -> np.ndarray:
+    """
+    Trailing rolling mean that restarts at every group boundary.
+
+    Equivalent to df.groupby(key)[col].rolling(window).mean() on data sorted by key:
+    the first window-1 rows of each group (and any window touching a NaN) are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    out = values.copy()
+    for k in range(1, window):
+        out[k:] += values[:-k]
+        out[:k] = np.nan
+    out /= window
+    out[position_in_group(starts) < window - 1] = np.nan
+    return out
+
+
+def engineer_rows(rows: pd.DataFrame, baselines: pd.DataFrame, starts: np.ndarray) -> np.ndarray:
+    """
+    Build the FEATURES matrix for a contiguous, (user_id, date)-sorted block of raw rows.
+    `baselines` is users.csv indexed by user_id.
+    """
+    base = baselines.reindex(rows["user_id"].values)
+    cols = {}
+
+    for name, raw, baseline in DEVIATIONS:
+        cols[name] = rows[raw].values - base[baseline].values
+
+    cols["pressure_change_abs"] = np.abs(rows["pressure_change"].values)
+
+    for col in ROLLING_COLS:
+        cols[f"{col}_3d_avg"] = grouped_rolling_mean(rows[col].values, starts)
+
+    return np.column_stack([
+        cols[f] if f in cols else rows[f].values.astype(float)
+        for f in FEATURES
+    ])
+
+
+# ----------------------------
+# 3. CACHE
+# ----------------------------
+
+def _cache_path(cache_dir: str, def_hash: str) -> str:
+    return os.path.join(cache_dir, def_hash)
+
+
+def _matrix_path(data_path: str, users_path: str, cache_dir: str) -> str:
+    """Cache directory holding X/y/keys/user index for a CSV or a shard manifest."""
+    if is_manifest(data_path):
+        return _cache_path(cache_dir, "sharded-" + sharded_hash(read_manifest(data_path)))
+    return _cache_path(cache_dir, definition_hash(users_path))
+
+
+def _load_matrix(path: str, mmap: bool, return_keys: bool):
+    mode = "r" if mmap else None
+    X = np.load(os.path.join(path, "X.npy"), mmap_mode=mode)
+    y = np.load(os.path.join(path, "y.npy"), mmap_mode=mode)
+    if not return_keys:
+        return X, y
+    keys = np.load(os.path.join(path, "keys.npy"), mmap_mode=mode)
+    return X, y, keys
+
+
+def _read_meta(path: str):
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_state(path: str):
+    try:
+        return {name: np.load(os.path.join(path, f"{name}.npy")) for name in _STATE_FILES}
+    except (OSError, ValueError):
+        return None
+
+
+def _save(path: str, arrays: dict, meta: dict) -> None:
+    """Write arrays then meta.json; meta last so a half-written cache is never a hit."""
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    for name, arr in arrays.items():
+        tmp = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp, arr)
+        os.replace(tmp, os.path.join(path, f"{name}.npy"))
+
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def _dirty_tail(key_hash: np.ndarray, row_hash: np.ndarray, starts: np.ndarray, state: dict):
+    """
+    Mark rows that must be recomputed: new or changed rows, rows whose predecessor
+    in the same user changed position, and every later row of an affected user.
+    Returns (dirty mask, index into the old state for reusable rows).
+    """
+    old_pos = pd.Index(state["key_hash"]).get_indexer(key_hash)
+    found = old_pos >= 0
+    safe_pos = np.where(found, old_pos, 0)
+
+    reusable = found & (state["row_hash"][safe_pos] == row_hash)
+
+    # Within a user the old rows must stay contiguous, and a user must start where it started
+    contiguous = np.ones(len(key_hash), dtype=bool)
+    contiguous[1:] = safe_pos[1:] == safe_pos[:-1] + 1
+    contiguous = np.where(starts, state["group_start"][safe_pos], contiguous)
+    reusable &= contiguous
+
+    dirty = pd.Series(~reusable).groupby(np.cumsum(starts)).cummax().values
+    return dirty, safe_pos
+
+
+def build_feature_matrix(data_path: str = DATA_PATH,
+                         users_path: str = USERS_PATH,
+                         cache_dir: str = FEATURE_CACHE_DIR,
+                         src_hash: str = None,
+                         return_keys: bool = False):
+    """
+    (Re)build the cache for the current source data, reusing the previous
+    cache for the same feature definition where rows are unchanged.
+    Returns (X, y) in memory, plus the per-row keys if return_keys is set.
+    """
+    def_hash = definition_hash(users_path)
+    path = _cache_path(cache_dir, def_hash)
+    src_hash = src_hash or source_hash(data_path)
+
+    print("Loading data...")
+    df = pd.read_csv(data_path, usecols=lambda c: c in set(SOURCE_COLS) | {"user_id", "date"})
+    baselines = pd.read_csv(users_path).set_index("user_id")
+
+    df["date"] = pd.to_datetime(df["date"])
+    df = df.sort_values(["user_id", "date"]).reset_index(drop=True)
+
+    starts = group_starts(df["user_id"].values)
+    key_hash = pd.util.hash_pandas_object(df[["user_id", "date"]], index=False).values
+    row_hash = pd.util.hash_pandas_object(df[SOURCE_COLS], index=False).values
+
+    full_y = df[TARGET].values.astype(float)
+    state = _load_state(path)
+
+    if state is None:
+        print("Feature engineering (full)...")
+        full_X = engineer_rows(df, baselines, starts)
+        n_recomputed = len(df)
+    else:
+        dirty, old_pos = _dirty_tail(key_hash, row_hash, starts, state)
+        full_X = state["full_X"][old_pos]
+
+        # Recompute the dirty tail plus window-1 rows of context in front of it
+        pos = position_in_group(starts)
+        context = dirty.copy()
+        for k in range(1, ROLLING_WINDOW):
+            context[:-k] |= dirty[k:] & (pos[k:] >= k)
+        idx = np.flatnonzero(context)
+
+        n_recomputed = int(dirty.sum())
+        print(f"Feature engineering (incremental): {n_recomputed} of {len(df)} rows")
+
+        if len(idx):
+            block = df.iloc[idx]
+            block_starts = group_starts(block["user_id"].values) | np.r_[True, np.diff(idx) > 1]
+            block_X = engineer_rows(block, baselines, block_starts)
+            write = dirty[idx]
+            full_X[idx[write]] = block_X[write]
+
+    valid = ~np.isnan(full_X).any(axis=1) & ~np.isnan(full_y)
+    X = np.ascontiguousarray(full_X[valid])
+    y = full_y[valid].astype(int)
+    keys = key_hash[valid]
+
+    # Rows are sorted by user_id, so group starts give the sorted unique ids
+    user_ids = df["user_id"].to_numpy(dtype=str)[starts]
+    user_idx = (np.cumsum(starts) - 1)[valid].astype(np.int32)
+
+    meta = {
+        "source_hash": src_hash,
+        "definition_hash": def_hash,
+        "features": FEATURES,
+        "target": TARGET,
+        "n_source_rows": int(len(df)),
+        "n_rows": int(len(X)),
+        "n_recomputed": n_recomputed,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    _save(path, {
+        "X": X,
+        "y": y,
+        "keys": keys,
+        "user_idx": user_idx,
+        "user_ids": user_ids,
+        "full_X": full_X,
+        "full_y": full_y,
+        "key_hash": key_hash,
+        "row_hash": row_hash,
+        "group_start": starts,
+    }, meta)
+    print(f"Cached feature matrix ({len(X)} rows) to {path}")
+
+    return (X, y, keys) if return_keys else (X, y)
+
+
+def load_feature_matrix(data_path: str = DATA_PATH,
+                        users_path: str = USERS_PATH,
+                        cache_dir: str = FEATURE_CACHE_DIR,
+                        mmap: bool = True,
+                        return_keys: bool = False):
+    """
+    Return (X, y) for training. On a cache hit the arrays are memory-mapped
+    (read-only) straight from disk without parsing any CSV.
+
+    With return_keys=True also returns the (user_id, date) hash of every row,
+    which incremental training uses to tell new rows from already-trained ones.
+    """
+    if is_manifest(data_path):
+        return load_sharded_feature_matrix(data_path, cache_dir, mmap=mmap, return_keys=return_keys)
+
+    path = _cache_path(cache_dir, definition_hash(users_path))
+    src_hash = source_hash(data_path)
+    meta = _read_meta(path)
+
+    if meta and meta.get("source_hash") == src_hash:
+        print(f"Feature cache hit: {path} ({meta['n_rows']} rows)")
+        return _load_matrix(path, mmap, return_keys)
+
+    return build_feature_matrix(data_path, users_path, cache_dir, src_hash=src_hash, return_keys=return_keys)
+
+
+def load_sharded_feature_matrix(manifest_path: str,
+                                cache_dir: str = FEATURE_CACHE_DIR,
+                                mmap: bool = True,
+                                return_keys: bool = False):
+    """
+    Feature matrix for a sharded dataset. Shards are engineered one at a time
+    (each with its own incremental cache) and streamed into one .npy set on disk;
+    users never span shards, so per-shard rolling features are exact.
+    """
+    manifest = read_manifest(manifest_path)
+    path = _cache_path(cache_dir, "sharded-" + sharded_hash(manifest))
+    meta = _read_meta(path)
+
+    if meta is None:
+        # Pass 1: make sure every shard is cached, collect sizes
+        sizes = []
+        for shard in manifest["shards"]:
+            print(f"Shard {shard['index']:05d}: {shard['data_path']}")
+            load_feature_matrix(shard["data_path"], shard["users_path"], cache_dir)
+            shard_meta = _read_meta(_cache_path(cache_dir, definition_hash(shard["users_path"])))
+            sizes.append(shard_meta["n_rows"])
+
+        # Pass 2: copy shard matrices into one memory-mapped set, shard by shard
+        os.makedirs(path, exist_ok=True)
+        n_rows = int(sum(sizes))
+        out = {
+            "X": np.lib.format.open_memmap(os.path.join(path, "X.npy"), "w+", np.float64, (n_rows, len(FEATURES))),
+            "y": np.lib.format.open_memmap(os.path.join(path, "y.npy"), "w+", np.int64, (n_rows,)),
+            "keys": np.lib.format.open_memmap(os.path.join(path, "keys.npy"), "w+", np.uint64, (n_rows,)),
+            "user_idx": np.lib.format.open_memmap(os.path.join(path, "user_idx.npy"), "w+", np.int32, (n_rows,)),
+        }
+        user_ids = []
+        row, n_users = 0, 0
+        for shard, size in zip(manifest["shards"], sizes):
+            shard_path = _cache_path(cache_dir, definition_hash(shard["users_path"]))
+            X_s, y_s, keys_s = _load_matrix(shard_path, mmap=True, return_keys=True)
+            out["X"][row:row + size] = X_s
+            out["y"][row:row + size] = y_s
+            out["keys"][row:row + size] = keys_s
+            out["user_idx"][row:row + size] = np.load(os.path.join(shard_path, "user_idx.npy")) + n_users
+
+            shard_users = np.load(os.path.join(shard_path, "user_ids.npy"))
+            user_ids.append(shard_users)
+            n_users += len(shard_users)
+            row += size
+
+        for arr in out.values():
+            arr.flush()
+        del out
+        np.save(os.path.join(path, "user_ids.npy"), np.concatenate(user_ids))
+
+        meta = {
+            "manifest": os.path.abspath(manifest_path),
+            "features": FEATURES,
+            "target": TARGET,
+            "n_shards": len(sizes),
+            "n_rows": n_rows,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        print(f"Cached sharded feature matrix ({n_rows} rows) to {path}")
+    else:
+        print(f"Feature cache hit: {path} ({meta['n_rows']} rows, {meta['n_shards']} shards)")
+
+    return _load_matrix(path, mmap, return_keys)
+
+
+def load_user_index(data_path: str = DATA_PATH, users_path: str = USERS_PATH,
+                    cache_dir: str = FEATURE_CACHE_DIR):
+    """
+    (user_idx, user_ids) for the rows returned by the last load_feature_matrix():
+    user_ids[user_idx[i]] is the user of row i.
+    """
+    path = _matrix_path(data_path, users_path, cache_dir)
+    user_idx = np.load(os.path.join(path, "user_idx.npy"), mmap_mode="r")
+    user_ids = np.load(os.path.join(path, "user_ids.npy"))
+    return user_idx, user_ids
+
+
+if __name__ == "__main__":
+    X, y = load_feature_matrix() if is_manifest(DATA_PATH) else build_feature_matrix()
+    print(f"X: {X.shape}, positives: {int(y.sum())}")
@@ -1,8 +1,15 @@
 # firebase_client.py
+import os
+import json
 import requests
-from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
 
-FIREBASE_DB_URL = "https://migraine-personal-predict-default-rtdb.europe-west1.firebasedatabase.app"
+# Override to point at another database, e.g. local_firebase.py for load tests
+FIREBASE_DB_URL = os.getenv(
+    "FIREBASE_DB_URL",
+    "https://migraine-personal-predict-default-rtdb.europe-west1.firebasedatabase.app",
+)
 
 def get_user_events(user_id: str) -> List[Dict[str, Any]]:
     url = f"{FIREBASE_DB_URL}/events/{user_id}.json"
@@ -17,6 +24,14 @@ def get_user_events(user_id: str) -> List[Dict[str, Any]]:
     events.sort(key=lambda e: e.get("timestamp", ""))
     return events
 
+def get_user_event_version(user_id: str) -> Tuple[int, Optional[str]]:
+    """(event count, latest event key) from a shallow read: keys only, no event data."""
+    url = f"{FIREBASE_DB_URL}/events/{user_id}.json"
+    r = requests.get(url, params={"shallow": "true"}, timeout=5)
+    r.raise_for_status()
+    keys = (r.json() or {}).keys()
+    return len(keys), max(keys, default=None)
+
 def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
     url = f"{FIREBASE_DB_URL}/users/{user_id}.json"
     r = requests.get(url, timeout=5)
@@ -29,3 +44,64 @@ def upsert_user_profile(user_id: str, payload: Dict[str, Any]) -> Dict[str, Any]
     r = requests.put(url, json=payload, timeout=5)
     r.raise_for_status()
     return r.json()
+
+
+# ----------------------------
+# Bulk access (batch_score.py)
+# ----------------------------
+
+# One keep-alive session for the batch job (user list, event reads, bulk writes),
+# with enough pooled connections for its concurrent per-user reads
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=32))
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=32))
+
+
+def rtdb_key_order(key: str):
+    """RTDB's orderBy="$key" order: 32-bit integer keys first (numerically), then strings."""
+    if key.lstrip("-").isdigit() and -2**31 <= int(key) < 2**31:
+        return (0, int(key), "")
+    return (1, 0, key)
+
+
+def _event_time(event: Dict[str, Any]) -> datetime:
+    """Parsed event timestamp (UTC); unparseable or missing ones sort first."""
+    try:
+        ts = datetime.fromisoformat(str(event.get("timestamp")).replace("Z", "+00:00"))
+    except ValueError:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def get_event_user_ids() -> List[str]:
+    """
+    Every user id under /events, in key order, from one shallow read: keys only,
+    no events. (RTDB does not allow shallow=true together with orderBy / limit
+    parameters, so the keys cannot be paged server-side.)
+    """
+    r = _session.get(f"{FIREBASE_DB_URL}/events.json", params={"shallow": "true"}, timeout=120)
+    r.raise_for_status()
+    return sorted(r.json() or {}, key=rtdb_key_order)
+
+
+def get_recent_user_events(user_id: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    A user's last `limit` events by their timestamp field (orderBy="timestamp",
+    limitToLast; RTDB needs ".indexOn": "timestamp" on events/$user_id), sorted
+    oldest first by the parsed timestamp rather than the key.
+    """
+    params = {"orderBy": json.dumps("timestamp"), "limitToLast": str(limit)}
+    r = _session.get(f"{FIREBASE_DB_URL}/events/{user_id}.json", params=params, timeout=30)
+    r.raise_for_status()
+    events = []
+    for k, v in (r.json() or {}).items():
+        v["id"] = k
+        events.append(v)
+    events.sort(key=_event_time)
+    return events
+
+
+def write_bulk(updates: Dict[str, Any]) -> None:
+    """Multi-path update: {"path/to/node": value, ...} in one atomic PATCH at the root."""
+    r = _session.patch(f"{FIREBASE_DB_URL}/.json", json=updates, timeout=60)
+    r.raise_for_status()
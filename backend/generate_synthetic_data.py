@@ -1,24 +1,43 @@
 """
 Generate synthetic migraine prediction dataset (~1,000,000 rows)
 using real daily weather from FMI (Finland) + synthetic user behavior.
+Weather is fetched and cached per place by weather.py; every user lives in one
+of PLACES (--places) and gets that place's weather.
 
 Outputs:
   data/users.csv                   - user-level baselines (for personalization)
   data/synthetic_migraine_data.csv - daily-level features + labels
 
+Generation is vectorized over a users x days grid (one broadcast draw per
+variable), so the row count is bounded by memory rather than Python loops.
+Runs are seed-controlled: the same seeds give the same dataset.
+
+For datasets larger than memory, --shards splits users into shards that are
+generated by separate worker processes (deterministic per-shard seeds) and
+streamed in bounded user chunks to partitioned files:
+  data/shards/part-00000.csv, users-00000.csv, ...
+  data/shards/manifest.json   - shard list, row counts, seeds, content hashes
+feature_store.py reads the manifest lazily, shard by shard.
+
 Run:
   python generate_synthetic_data.py
+  python generate_synthetic_data.py --rows 10000000
+  python generate_synthetic_data.py --rows 100000000 --shards 64 --workers 8
+  python generate_synthetic_data.py --places Helsinki,Tampere,Oulu --weather-mode offline
 """
 
 import os
+import json
 import math
-from datetime import datetime
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
-import requests
-from io import StringIO
-from tqdm import tqdm
+
+from weather import WEATHER_MODE, WEATHER_MODES, get_daily_weather_many
 
 # ----------------------------
 # CONFIG
@@ -26,200 +45,93 @@ from tqdm import tqdm
 
 TARGET_ROWS = 1_000_000          # target number of daily records
 PLACE = "Helsinki"               # FMI place
+PLACES = [PLACE]                 # users are spread uniformly over these places (--places)
 START_DATE = datetime(2023, 1, 1)
 END_DATE = datetime(2024, 12, 31)  # 2 years of daily weather
 DATA_DIR = "data"
 
-os.makedirs(DATA_DIR, exist_ok=True)
+USERS_SEED = 123
+DAILY_SEED = 999
+
+SHARD_DIR = os.path.join(DATA_DIR, "shards")
+SHARD_CHUNK_USERS = 2_000        # users generated at once inside a shard (bounds worker memory)
 
 
 # ----------------------------
-# 1. FETCH FMI WEATHER (DAILY)
+# 1. WEATHER (FMI, CACHED)
 # ----------------------------
 
-FMI_URL = "https://opendata.fmi.fi/wfs"
-
-
-def fetch_fmi_weather_daily(start_date: datetime, end_date: datetime, place: str = PLACE) -> pd.DataFrame:
-    """
-    Fetch daily weather from FMI Open Data (temperature, pressure, humidity, etc.)
-    using the 'weather::daily::multipointcoverage' stored query.
-
-    Returns a DataFrame with columns:
-      date, temperature, dew_point, pressure, humidity, precipitation, snow_depth
-    """
-    params = {
-        "service": "WFS",
-        "version": "2.0.0",
-        "request": "getFeature",
-        "storedquery_id": "fmi::observations::weather::daily::multipointcoverage",
-        "place": place,
-        "starttime": start_date.isoformat() + "Z",
-        "endtime": end_date.isoformat() + "Z",
-    }
+def load_weather(start_date: datetime = START_DATE, end_date: datetime = END_DATE,
+                 places=PLACES, mode: str = WEATHER_MODE) -> pd.DataFrame:
+    """Daily weather per place (long format, `place` column) with pressure_change; see weather.py."""
+    weather_df = get_daily_weather_many(places, start_date, end_date, mode=mode)
 
-    print(f"Fetching FMI weather data for {place} from {start_date.date()} to {end_date.date()}...")
-    resp = requests.get(FMI_URL, params=params)
-    resp.raise_for_status()
-    text = resp.text
-
-    # Extract the numeric data embedded in <gml:doubleOrNilReasonTupleList>...</gml:...>
-    start_tag = "<gml:doubleOrNilReasonTupleList>"
-    end_tag = "</gml:doubleOrNilReasonTupleList>"
-
-    start_idx = text.find(start_tag)
-    end_idx = text.find(end_tag)
-
-    if start_idx == -1 or end_idx == -1:
-        raise RuntimeError("Could not find FMI numeric data in the response. Check the storedquery_id / parameters.")
-
-    raw_block = text[start_idx + len(start_tag): end_idx].strip()
-
-    # Numbers are space-separated tuples, one row per day
-    df_vals = pd.read_csv(StringIO(raw_block), sep=" ", header=None)
-
-    # Depending on FMI config, the columns are typically:
-    # tday, tmin, tmax, dewpoint, pressure, rh, precip, snow_depth, ...
-    # We'll label a few of them we care about.
-    # Adjust if needed based on your inspection.
-    col_map = {
-        0: "tday",
-        1: "tmin",
-        2: "tmax",
-        3: "dew_point",
-        4: "pressure",
-        5: "humidity",
-        6: "precipitation",
-        7: "snow_depth",
-    }
-    df_vals = df_vals.rename(columns=col_map)
+    print(f"Weather days available: {weather_df['date'].nunique()} x {len(places)} place(s)")
+    print(weather_df.head())
+    return weather_df
 
-    # Keep only the columns we need
-    keep_cols = [c for c in ["tday", "tmin", "tmax", "dew_point", "pressure", "humidity", "precipitation", "snow_depth"]
-                 if c in df_vals.columns]
-    df_vals = df_vals[keep_cols]
 
-    # Add date index
-    df_vals["date"] = pd.date_range(start_date, periods=len(df_vals), freq="D")
+# ----------------------------
+# 2. GENERATE USERS (BASELINES)
+# ----------------------------
 
-    # For simplicity, define a single "temperature" as daily mean if available
-    if "tday" in df_vals.columns:
-        df_vals["temperature"] = df_vals["tday"]
-    elif "tmin" in df_vals.columns and "tmax" in df_vals.columns:
-        df_vals["temperature"] = (df_vals["tmin"] + df_vals["tmax"]) / 2.0
-    else:
-        df_vals["temperature"] = np.nan
-
-    return df_vals
-
-
-try:
-    weather_df = fetch_fmi_weather_daily(START_DATE, END_DATE, PLACE)
-except Exception as e:
-    # If FMI call fails (network or API), you can either bail or fallback to synthetic weather.
-    print("Failed to fetch FMI data:", e)
-    print("Falling back to simple synthetic weather (you can remove this fallback if FMI is mandatory).")
-
-    dates = pd.date_range(START_DATE, END_DATE, freq="D")
-    n_days = len(dates)
-
-    # Very simple synthetic weather for Finland-like conditions
-    rng = np.random.default_rng(42)
-    base_temp = 5 + 15 * np.sin(2 * np.pi * np.arange(n_days) / 365.0)  # seasonal sinus
-    temp = base_temp + rng.normal(0, 3, size=n_days)
-    pressure = 1013 + rng.normal(0, 8, size=n_days)
-    humidity = 70 + rng.normal(0, 10, size=n_days)
-    precip = np.maximum(0, rng.normal(1, 3, size=n_days))
-
-    weather_df = pd.DataFrame({
-        "date": dates,
-        "temperature": temp,
-        "pressure": pressure,
-        "humidity": humidity,
-        "precipitation": precip,
-        "snow_depth": rng.normal(0, 2, size=n_days),
+def generate_users(n_users: int, seed: int = USERS_SEED, first_id: int = 1, places=PLACES) -> pd.DataFrame:
+    """Users user_{first_id} .. user_{first_id + n_users - 1} with personal baselines and sensitivities."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(first_id, first_id + n_users)
+
+    users_df = pd.DataFrame({
+        "user_id": np.char.add("user_", ids.astype(str)),
+
+        # Personal baselines
+        "baseline_sleep": rng.normal(7.0, 0.7, n_users),        # hours
+        "baseline_hrv": rng.normal(55, 8, n_users),            # ms
+        "baseline_rhr": rng.normal(65, 5, n_users),            # bpm
+        "baseline_screen": rng.normal(3.5, 1.0, n_users),      # hours/day
+        "baseline_meeting_hours": rng.normal(4.0, 1.5, n_users),
+
+        # Sensitivities (0–1 scale)
+        "sleep_sensitivity": rng.uniform(0.3, 1.0, n_users),
+        "stress_sensitivity": rng.uniform(0.2, 1.0, n_users),
+        "screen_sensitivity": rng.uniform(0.1, 0.8, n_users),
+        "weather_sensitivity": rng.uniform(0.2, 1.0, n_users),
+
+        # Base migraine rate (daily probability if everything is normal)
+        "base_migraine_rate": rng.uniform(0.01, 0.08, n_users),  # 1–8% per day
     })
 
-# Ensure sorted by date
-weather_df = weather_df.sort_values("date").reset_index(drop=True)
-
-# Compute pressure_change (day-to-day difference)
-weather_df["pressure_change"] = weather_df["pressure"].diff().fillna(0.0)
+    # Home location (drawn last so the columns above do not depend on the place list)
+    users_df["place"] = np.asarray(places)[rng.integers(0, len(places), n_users)]
+    return users_df
 
-print(f"Weather days available: {len(weather_df)}")
-print(weather_df.head())
 
-
-# ----------------------------
-# 2. GENERATE USERS (BASELINES)
-# ----------------------------
-
-def generate_users_for_target_rows(target_rows: int, n_days: int) -> pd.DataFrame:
+def generate_users_for_target_rows(target_rows: int, n_days: int, places=PLACES) -> pd.DataFrame:
     """
     Compute how many users we need to reach at least target_rows = n_users * n_days,
     then generate those users with personal baselines and sensitivities.
     """
     n_users = math.ceil(target_rows / n_days)
     print(f"Generating {n_users} users to reach at least {target_rows} rows (n_days={n_days})")
-
-    rng = np.random.default_rng(123)
-    users = []
-
-    for user_id in range(1, n_users + 1):
-        u = {
-            "user_id": f"user_{user_id}",
-
-            # Personal baselines
-            "baseline_sleep": rng.normal(7.0, 0.7),        # hours
-            "baseline_hrv": rng.normal(55, 8),            # ms
-            "baseline_rhr": rng.normal(65, 5),            # bpm
-            "baseline_screen": rng.normal(3.5, 1.0),      # hours/day
-            "baseline_meeting_hours": rng.normal(4.0, 1.5),
-
-            # Sensitivities (0–1 scale)
-            "sleep_sensitivity": rng.uniform(0.3, 1.0),
-            "stress_sensitivity": rng.uniform(0.2, 1.0),
-            "screen_sensitivity": rng.uniform(0.1, 0.8),
-            "weather_sensitivity": rng.uniform(0.2, 1.0),
-
-            # Base migraine rate (daily probability if everything is normal)
-            "base_migraine_rate": rng.uniform(0.01, 0.08),  # 1–8% per day
-        }
-        users.append(u)
-
-    return pd.DataFrame(users)
-
-
-n_days = len(weather_df)
-users_df = generate_users_for_target_rows(TARGET_ROWS, n_days)
-
-# Save users (for personalisation later)
-users_path = os.path.join(DATA_DIR, "users.csv")
-users_df.to_csv(users_path, index=False)
-print(f"Saved users to {users_path}")
+    return generate_users(n_users, places=places)
 
 
 # ----------------------------
 # 3. CALENDAR / WORKLOAD MODEL
 # ----------------------------
 
-def generate_calendar_for_date(date: pd.Timestamp, rng: np.random.Generator):
+def generate_calendar(weekdays: np.ndarray, n_users: int, rng: np.random.Generator):
     """
-    Simple synthetic calendar load:
+    Simple synthetic calendar load for a users x days grid:
     - Weekdays: higher meeting load
     - Weekends: minimal load
-    Returns: meeting_hours, meeting_count, evening_meetings (0/1)
+    Returns (n_users, n_days) arrays: meeting_hours, meeting_count, evening_meetings (0/1)
     """
-    weekday = date.weekday()  # 0=Mon ... 6=Sun
+    shape = (n_users, len(weekdays))
+    workday = np.broadcast_to(weekdays < 5, shape)  # Mon–Fri
 
-    if weekday < 5:  # Mon–Fri
-        meeting_hours = max(0.0, rng.normal(4.0, 1.5))
-        meeting_count = max(0, int(rng.normal(5, 2)))
-        evening_meetings = rng.choice([0, 1], p=[0.7, 0.3])
-    else:
-        meeting_hours = max(0.0, rng.normal(0.5, 0.4))
-        meeting_count = max(0, int(rng.normal(1, 1)))
-        evening_meetings = 0
+    meeting_hours = np.maximum(0.0, np.where(workday, 4.0, 0.5) + np.where(workday, 1.5, 0.4) * rng.standard_normal(shape))
+    meeting_count = np.maximum(0, np.trunc(np.where(workday, 5, 1) + np.where(workday, 2, 1) * rng.standard_normal(shape))).astype(int)
+    evening_meetings = (workday & (rng.random(shape) < 0.3)).astype(int)
 
     return meeting_hours, meeting_count, evening_meetings
 
@@ -228,121 +140,307 @@ def generate_calendar_for_date(date: pd.Timestamp, rng: np.random.Generator):
 # 4. GENERATE DAILY DATA
 # ----------------------------
 
+def _user_col(users_df: pd.DataFrame, col: str) -> np.ndarray:
+    """User-level column as an (n_users, 1) array for broadcasting over days."""
+    return users_df[col].to_numpy(dtype=float)[:, None]
+
+
 def generate_daily_data(users_df: pd.DataFrame,
                         weather_df: pd.DataFrame,
-                        target_rows: int) -> pd.DataFrame:
+                        target_rows: int = None,
+                        seed: int = DAILY_SEED) -> pd.DataFrame:
     """
     Cross product: users × days, then slice to target_rows.
-    For each (user, day) we simulate sleep, HRV, screen time, workload, and migraine risk.
+    For each (user, day) we simulate sleep, HRV, screen time, workload, and migraine risk,
+    all as (n_users, n_days) arrays.
     """
-    rng = np.random.default_rng(999)
-    dates = weather_df["date"].tolist()
-    records = []
-
-    print("Generating daily synthetic data...")
-
-    for _, user in tqdm(users_df.iterrows(), total=len(users_df)):
-        for idx, date in enumerate(dates):
-            w = weather_df.iloc[idx]
-
-            # Calendar / workload
-            meeting_hours, meeting_count, evening_meet = generate_calendar_for_date(date, rng)
-
-            # Physiological + behavior values around personal baseline
-            sleep_hours = rng.normal(user.baseline_sleep, 0.8)
-            hrv = rng.normal(user.baseline_hrv, 6.0)
-            resting_hr = rng.normal(user.baseline_rhr, 4.0)
-            screen_total = max(0.1, rng.normal(user.baseline_screen, 1.0))
-
-            # Derived features
-            screen_after_22 = max(0.0, rng.normal(0.6 * screen_total, 0.5))
-            sedentary_minutes = max(0.0, rng.normal(600, 120))
-
-            # Weather
-            pressure_change = w["pressure_change"]
-            temperature = w["temperature"]
-            humidity = w.get("humidity", np.nan)
-            precipitation = w.get("precipitation", np.nan)
-
-            # Risk model (simple but realistic-ish)
-            # Start from base migraine rate and add contributions:
-            # - worse sleep (below 7h)
-            # - high meeting load
-            # - extra screen time
-            # - big pressure changes
-            sleep_deficit = max(0.0, 7.0 - sleep_hours)
-            extra_screen = max(0.0, screen_total - user.baseline_screen)
-            extra_meetings = max(0.0, meeting_hours - user.baseline_meeting_hours)
-
-            risk = (
-                user.base_migraine_rate +
-                user.sleep_sensitivity * sleep_deficit * 0.04 +
-                user.stress_sensitivity * extra_meetings * 0.03 +
-                user.screen_sensitivity * extra_screen * 0.03 +
-                user.weather_sensitivity * abs(pressure_change) * 0.01
-            )
-
-            # Clamp between 0 and 0.9 for realism
-            risk = float(min(max(risk, 0.0), 0.9))
-
-            migraine_today = rng.binomial(1, risk)
-
-            record = {
-                "user_id": user.user_id,
-                "date": date,
-
-                # physiology / behavior
-                "sleep_hours": sleep_hours,
-                "hrv": hrv,
-                "resting_hr": resting_hr,
-                "screen_time_total_hours": screen_total,
-                "screen_time_after_22_hours": screen_after_22,
-                "sedentary_minutes": sedentary_minutes,
-
-                # calendar
-                "meeting_hours": meeting_hours,
-                "meeting_count": meeting_count,
-                "evening_meetings": evening_meet,
-
-                # weather
-                "temperature": temperature,
-                "pressure": w["pressure"],
-                "pressure_change": pressure_change,
-                "humidity": humidity,
-                "precipitation": precipitation,
-                "snow_depth": w.get("snow_depth", np.nan),
-
-                # target
-                "migraine_today": migraine_today,
-            }
-
-            records.append(record)
-
-    df = pd.DataFrame(records)
-    print(f"Generated {len(df)} rows before slicing to target {target_rows}.")
-
-    # Sort for consistent grouping
-    df = df.sort_values(["user_id", "date"]).reset_index(drop=True)
-
-    # Label: migraine_next_24h = next day's migraine_today per user
-    df["migraine_next_24h"] = df.groupby("user_id")["migraine_today"].shift(-1).fillna(0).astype(int)
-
-    # Slice down to target_rows (if we generated more)
-    if len(df) > target_rows:
-        df = df.iloc[:target_rows].copy()
-        print(f"Sliced to {target_rows} rows.")
+    rng = np.random.default_rng(seed)
+
+    # Rows come out sorted by (user_id, date), the order training groups by
+    users_df = users_df.sort_values("user_id").reset_index(drop=True)
+
+    # Weather as (n_places, n_days); every user reads the row of their home place
+    if "place" not in weather_df:
+        weather_df = weather_df.assign(place=PLACE)
+    places = list(dict.fromkeys(weather_df["place"]))
+    dates = pd.DatetimeIndex(weather_df.loc[weather_df["place"] == places[0], "date"]).sort_values()
+    if "place" in users_df and len(places) > 1:
+        user_place = pd.Categorical(users_df["place"], categories=places).codes
+        if (user_place < 0).any():
+            missing = sorted(set(users_df["place"]) - set(places))
+            raise ValueError(f"No weather for user places: {missing}")
+    else:
+        user_place = None
+
+    n_users, n_days = len(users_df), len(dates)
+    shape = (n_users, n_days)
+
+    print(f"Generating daily synthetic data ({n_users} users x {n_days} days, {len(places)} place(s))...")
+
+    def normal(mean, sd):
+        return mean + sd * rng.standard_normal(shape)
+
+    def weather(col):
+        if col not in weather_df:
+            return np.broadcast_to(np.nan, shape)
+        grid = weather_df.pivot(index="place", columns="date", values=col).loc[places, dates].to_numpy(dtype=float)
+        return np.broadcast_to(grid[0], shape) if user_place is None else grid[user_place]
+
+    # Calendar / workload
+    meeting_hours, meeting_count, evening_meet = generate_calendar(dates.weekday.to_numpy(), n_users, rng)
+
+    # Physiological + behavior values around personal baseline
+    sleep_hours = normal(_user_col(users_df, "baseline_sleep"), 0.8)
+    hrv = normal(_user_col(users_df, "baseline_hrv"), 6.0)
+    resting_hr = normal(_user_col(users_df, "baseline_rhr"), 4.0)
+    screen_total = np.maximum(0.1, normal(_user_col(users_df, "baseline_screen"), 1.0))
+
+    # Derived features
+    screen_after_22 = np.maximum(0.0, normal(0.6 * screen_total, 0.5))
+    sedentary_minutes = np.maximum(0.0, normal(600, 120))
+
+    # Weather
+    pressure_change = weather("pressure_change")
+
+    # Risk model (simple but realistic-ish)
+    # Start from base migraine rate and add contributions:
+    # - worse sleep (below 7h)
+    # - high meeting load
+    # - extra screen time
+    # - big pressure changes
+    sleep_deficit = np.maximum(0.0, 7.0 - sleep_hours)
+    extra_screen = np.maximum(0.0, screen_total - _user_col(users_df, "baseline_screen"))
+    extra_meetings = np.maximum(0.0, meeting_hours - _user_col(users_df, "baseline_meeting_hours"))
+
+    risk = (
+        _user_col(users_df, "base_migraine_rate") +
+        _user_col(users_df, "sleep_sensitivity") * sleep_deficit * 0.04 +
+        _user_col(users_df, "stress_sensitivity") * extra_meetings * 0.03 +
+        _user_col(users_df, "screen_sensitivity") * extra_screen * 0.03 +
+        _user_col(users_df, "weather_sensitivity") * np.abs(pressure_change) * 0.01
+    )
+
+    # Clamp between 0 and 0.9 for realism
+    risk = np.clip(risk, 0.0, 0.9)
+
+    migraine_today = (rng.random(shape) < risk).astype(int)
+
+    # Label: migraine_next_24h = next day's migraine_today per user (last day -> 0)
+    migraine_next_24h = np.zeros(shape, dtype=int)
+    migraine_next_24h[:, :-1] = migraine_today[:, 1:]
+
+    # Flattened (user-major) columns are views; slice them before building the frame
+    n_rows = n_users * n_days if target_rows is None else min(target_rows, n_users * n_days)
+    if target_rows is not None:
+        print(f"Generated {n_users * n_days} rows before slicing to target {target_rows}.")
+
+    def col(values):
+        return np.ascontiguousarray(values).reshape(-1)[:n_rows]
+
+    columns = {
+        # user_id as a categorical: small integer codes instead of one string per row
+        "user_id": pd.Categorical.from_codes(
+            np.repeat(np.arange(n_users, dtype=np.int32), n_days)[:n_rows],
+            categories=users_df["user_id"].to_numpy(dtype=str),
+        ),
+        "date": np.tile(dates.to_numpy(), n_users)[:n_rows],
+
+        # physiology / behavior
+        "sleep_hours": col(sleep_hours),
+        "hrv": col(hrv),
+        "resting_hr": col(resting_hr),
+        "screen_time_total_hours": col(screen_total),
+        "screen_time_after_22_hours": col(screen_after_22),
+        "sedentary_minutes": col(sedentary_minutes),
+
+        # calendar
+        "meeting_hours": col(meeting_hours),
+        "meeting_count": col(meeting_count),
+        "evening_meetings": col(evening_meet),
+
+        # weather
+        "temperature": col(weather("temperature")),
+        "pressure": col(weather("pressure")),
+        "pressure_change": col(pressure_change),
+        "humidity": col(weather("humidity")),
+        "precipitation": col(weather("precipitation")),
+        "snow_depth": col(weather("snow_depth")),
+
+        # target
+        "migraine_today": col(migraine_today),
+        "migraine_next_24h": col(migraine_next_24h),
+    }
+    df = pd.DataFrame(columns, copy=False)
+
+    if n_rows < n_users * n_days:
+        print(f"Sliced to {n_rows} rows.")
 
     return df
 
 
-daily_df = generate_daily_data(users_df, weather_df, TARGET_ROWS)
+# ----------------------------
+# 5. SHARDED GENERATION
+# ----------------------------
+
+class _HashingWriter:
+    """File wrapper that hashes everything written, so shards are hashed without a re-read."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha1 = hashlib.sha1()
+
+    def write(self, s: str) -> int:
+        self.sha1.update(s.encode("utf-8"))
+        return self.f.write(s)
+
+
+def _shard_seed(base: int, *key: int) -> int:
+    """Independent, reproducible seed for one shard / chunk."""
+    return int(np.random.SeedSequence(base, spawn_key=key).generate_state(1, np.uint64)[0])
+
+
+def _replace(tmp_path: str, path: str) -> dict:
+    """Move a finished file into place; returns the size / mtime recorded in the manifest."""
+    os.replace(tmp_path, path)
+    st = os.stat(path)
+    return {"bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def generate_shard(shard: dict, weather_df: pd.DataFrame, out_dir: str,
+                   chunk_users: int = SHARD_CHUNK_USERS) -> dict:
+    """
+    Generate one shard of users and stream its daily rows to out_dir in chunks
+    of chunk_users users. Runs in a worker process; returns the manifest entry.
+    """
+    index = shard["index"]
+    places = list(dict.fromkeys(weather_df["place"]))
+    users_df = generate_users(shard["n_users"], seed=_shard_seed(USERS_SEED, index),
+                              first_id=shard["first_id"], places=places)
+    users_df = users_df.sort_values("user_id").reset_index(drop=True)
+
+    # Written under .tmp names and renamed when complete, so an interrupted run
+    # never leaves a truncated shard under its final name
+    users_file = f"users-{index:05d}.csv"
+    data_file = f"part-{index:05d}.csv"
+    users_path = os.path.join(out_dir, users_file)
+    data_path = os.path.join(out_dir, data_file)
+    users_df.to_csv(users_path + ".tmp", index=False)
+
+    n_rows = 0
+    with open(data_path + ".tmp", "w", newline="") as f:
+        writer = _HashingWriter(f)
+        for c, start in enumerate(range(0, len(users_df), chunk_users)):
+            chunk = users_df.iloc[start:start + chunk_users]
+            daily_df = generate_daily_data(chunk, weather_df, seed=_shard_seed(DAILY_SEED, index, c))
+            daily_df.to_csv(writer, index=False, header=(c == 0))
+            n_rows += len(daily_df)
+
+    _replace(users_path + ".tmp", users_path)
+    return {
+        **shard,
+        "data": data_file,
+        "users": users_file,
+        "n_rows": n_rows,
+        "sha1": writer.sha1.hexdigest(),
+        **_replace(data_path + ".tmp", data_path),
+    }
+
+
+def generate_sharded(target_rows: int, n_shards: int, workers: int = None,
+                     out_dir: str = SHARD_DIR, chunk_users: int = SHARD_CHUNK_USERS,
+                     places=PLACES, weather_mode: str = WEATHER_MODE) -> dict:
+    """
+    Generate at least target_rows rows as n_shards user shards on `workers`
+    processes and write out_dir/manifest.json. Returns the manifest.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+
+    # Shards are rewritten below: drop the old manifest first so an interrupted
+    # run cannot leave it describing files that have since changed
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    weather_df = load_weather(START_DATE, END_DATE, places, weather_mode)
+
+    n_days = weather_df["date"].nunique()
+    n_users = math.ceil(target_rows / n_days)
+    bounds = np.linspace(0, n_users, n_shards + 1).astype(int)
+    shards = [
+        {"index": i, "first_id": int(lo) + 1, "n_users": int(hi - lo)}
+        for i, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))
+        if hi > lo
+    ]
+    print(f"Generating {n_users} users x {n_days} days in {len(shards)} shards on {workers or os.cpu_count()} workers")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(generate_shard, shard, weather_df, out_dir, chunk_users) for shard in shards]
+        entries = []
+        for future in futures:
+            entry = future.result()
+            entries.append(entry)
+            print(f"  shard {entry['index']:05d}: {entry['n_users']} users, {entry['n_rows']} rows")
+
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "places": list(places),
+        "weather_mode": weather_mode,
+        "start_date": START_DATE.date().isoformat(),
+        "end_date": END_DATE.date().isoformat(),
+        "seeds": {"users": USERS_SEED, "daily": DAILY_SEED},
+        "chunk_users": chunk_users,
+        "n_users": n_users,
+        "n_rows": sum(e["n_rows"] for e in entries),
+        "shards": entries,
+    }
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    print(f"Saved {manifest['n_rows']} rows in {len(entries)} shards; manifest: {manifest_path}")
+    return manifest
+
 
 # ----------------------------
-# 5. SAVE DAILY DATA
+# 6. SAVE DAILY DATA
 # ----------------------------
 
-daily_path = os.path.join(DATA_DIR, "synthetic_migraine_data.csv")
-daily_df.to_csv(daily_path, index=False)
-print(f"Saved daily synthetic dataset to {daily_path}")
-print(daily_df.head())
-print(daily_df.describe(include="all").transpose().head(20))
+def main(target_rows: int = TARGET_ROWS, places=PLACES, weather_mode: str = WEATHER_MODE) -> None:
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    weather_df = load_weather(START_DATE, END_DATE, places, weather_mode)
+
+    n_days = weather_df["date"].nunique()
+    users_df = generate_users_for_target_rows(target_rows, n_days, places)
+
+    # Save users (for personalisation later)
+    users_path = os.path.join(DATA_DIR, "users.csv")
+    users_df.to_csv(users_path, index=False)
+    print(f"Saved users to {users_path}")
+
+    daily_df = generate_daily_data(users_df, weather_df, target_rows)
+
+    daily_path = os.path.join(DATA_DIR, "synthetic_migraine_data.csv")
+    daily_df.to_csv(daily_path, index=False)
+    print(f"Saved daily synthetic dataset to {daily_path}")
+    print(daily_df.head())
+    print(daily_df.describe(include="all").transpose().head(20))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the synthetic migraine dataset.")
+    parser.add_argument("--rows", type=int, default=TARGET_ROWS, help="target number of daily rows")
+    parser.add_argument("--shards", type=int, default=0, help="split users into this many shard files")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for --shards (default: all cores)")
+    parser.add_argument("--chunk-users", type=int, default=SHARD_CHUNK_USERS, help="users per in-memory chunk")
+    parser.add_argument("--out", default=SHARD_DIR, help="output directory for --shards")
+    parser.add_argument("--places", default=",".join(PLACES), help="comma-separated FMI places for user locations")
+    parser.add_argument("--weather-mode", choices=WEATHER_MODES, default=WEATHER_MODE,
+                        help="auto: cache + FMI with offline fill, online: cache + FMI, offline: no network")
+    args = parser.parse_args()
+    places = [p.strip() for p in args.places.split(",") if p.strip()]
+
+    if args.shards > 0:
+        generate_sharded(args.rows, args.shards, args.workers, args.out, args.chunk_users,
+                         places, args.weather_mode)
+    else:
+        main(args.rows, places, args.weather_mode)
@@ -0,0 +1,155 @@
+"""
+Conditional GET and compression for the per-user history endpoints.
+
+A user's events only change when a new event is written, and event keys are
+the event timestamps: n8n's "Store Personal Data" node PUTs each event to
+users/<user_id>/events/<timestamp>, keyed by the raw ISO timestamp
+(new Date().toISOString(), e.g. 2025-11-16T02:48:23.811Z). Keys in the
+Firebase-safe [:.] -> _ form n8n uses for prediction keys are read too. So
+(event count, latest event key) identifies the version of everything derived
+from them: /users/{id}/events and /users/{id}/summary send it as a weak ETag
+plus Last-Modified (the latest event time). When the client already has that
+version (If-None-Match, or If-Modified-Since without If-None-Match) the
+endpoint answers 304 after a shallow, keys-only Firebase read: the events are
+not downloaded and the summary is not rebuilt.
+
+Bodies above COMPRESS_MIN_BYTES are sent brotli- (if the brotli package is
+installed) or gzip-compressed, following the client's Accept-Encoding.
+"""
+
+import gzip
+import json
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+COMPRESS_MIN_BYTES = 1_024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHE_CONTROL = "private, no-cache"     # clients may store, but must revalidate
+
+
+# ----------------------------
+# 1. VERSION (ETag / Last-Modified)
+# ----------------------------
+
+def key_timestamp(key: str):
+    """
+    Event key back to its timestamp, or None for keys that are not timestamps
+    (e.g. push ids). Accepts the raw ISO key ("2025-11-16T02:48:23.811Z") and
+    the [:.] -> _ form ("2025-11-16T02_48_23_811Z").
+    """
+    if not key or len(key) < 19 or key[10] != "T":
+        return None
+    ts = key
+    if key[13] == "_" and key[16] == "_":
+        ts = key[:13] + ":" + key[14:16] + ":" + key[17:]
+        if len(ts) > 19 and ts[19] == "_":
+            ts = ts[:19] + "." + ts[20:]
+        if len(ts) > 25 and ts[-3] == "_":       # +01_00 offsets
+            ts = ts[:-3] + ":" + ts[-2:]
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def version_headers(kind: str, user_id: str, count: int, latest_key) -> dict:
+    """ETag / Last-Modified for one user's `kind` ("events" or "summary") resource."""
+    digest = hashlib.sha1(f"{kind}|{user_id}|{count}|{latest_key or ''}".encode()).hexdigest()[:20]
+    headers = {
+        "ETag": f'W/"{count}-{digest}"',
+        "Cache-Control": CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+    }
+    modified = key_timestamp(latest_key)
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def events_version(events) -> tuple:
+    """(count, latest key) of a fetched event list, as get_user_event_version returns it."""
+    return len(events), max((e["id"] for e in events), default=None)
+
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_current(request: Request, headers: dict) -> bool:
+    """True when the client's cached copy matches (If-None-Match wins over If-Modified-Since)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = _opaque(headers["ETag"])
+        return any(t.strip() == "*" or _opaque(t) == etag for t in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+# ----------------------------
+# 2. COMPRESSED JSON RESPONSE
+# ----------------------------
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def json_response(request: Request, payload, headers: dict) -> Response:
+    """JSON body, compressed when large and the client accepts br / gzip."""
+    # Same serialization as FastAPI's default JSONResponse
+    body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+    headers = dict(headers)
+
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,381 @@
+"""
+Incremental (warm-start) retraining from newly arrived labeled rows.
+
+Instead of re-running the whole train_models.py pipeline (SMOTE over the full
+dataset + training every model from scratch), this:
+
+  1. picks the rows in the feature cache that the current models have not seen
+     (models/trained_keys.npy, written by train_models.py),
+  2. holds out a slice of them for a before/after evaluation,
+  3. keeps the StandardScaler frozen: the existing LightGBM / XGBoost trees were
+     split on its scaling, so changing it would shift every input they see,
+  4. continues boosting LightGBM and XGBoost at a reduced learning rate on the
+     new rows plus a replay sample of already-trained rows (SMOTE-balanced),
+     adds a few warm-started trees to the RandomForest,
+  5. continues the LogisticRegression from its current coefficients on the same
+     SMOTE-balanced new + replay rows,
+  6. re-distills the compact serving model (distill.py) from the updated ensemble
+     and the compact RandomForest export, updates the personal models of the
+     users that have new rows (on the new rows only), and refreshes the drift
+     reference snapshot (drift.py),
+  7. writes the result as a new model version under models/versions/<version>/
+     and optionally promotes it to models/ (what inference.py serves).
+
+Nothing is fit on the full dataset, so a run costs roughly the size of the new
+batch (times REPLAY_RATIO) rather than a full retrain.
+
+Promotion is refused when the ensemble ROC-AUC on either holdout (new rows, or
+the sample of previously trained rows) dropped by more than AUC_TOLERANCE and
+a paired bootstrap over that holdout puts the whole 95% interval of the change
+below zero, i.e. the drop is larger than the holdout's own noise; --force
+overrides. When the feature distribution has moved enough that the
+frozen scaler no longer fits, run train_models.py for a full refresh.
+
+Run:
+  python incremental_train.py            # train + report, keep serving models
+  python incremental_train.py --promote  # also replace models/ with the new version (if not worse)
+  python incremental_train.py --promote --force
+"""
+
+import os
+import copy
+import shutil
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import joblib
+
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+
+import xgboost as xgb
+import lightgbm as lgb
+
+from imblearn.over_sampling import SMOTE
+
+from features import FEATURES
+from feature_store import load_feature_matrix, load_user_index, DATA_PATH, USERS_PATH
+from personal_models import (
+    PERSONAL_FEATURES, PERSONAL_MODELS_FILE,
+    fit_personal_models, personal_coefficients, merge_personal_models, load_personal_models,
+    save_personal_models,
+)
+from distill import distill_ensemble, print_report
+from compact_forest import COMPACT_RF_DIR, export_compact_forest, replace_dir
+from ensemble import (
+    MODEL_DIR, MODEL_FILES, DISTILLED_FILE, META_FILE, TRAINED_KEYS_FILE,
+    load_models, save_models, load_model_meta, save_model_meta,
+    model_probabilities, blend, ensemble_scores, scores_to_risk_levels, serving_scores, RISK_LEVELS,
+)
+from drift import DRIFT_REFERENCE_FILE, reference_rows, build_reference, save_drift_reference
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+MIN_NEW_ROWS = 500            # below this, wait for more data
+HOLDOUT_FRACTION = 0.2        # share of new rows kept for before/after evaluation
+OLD_EVAL_ROWS = 50_000        # sample of already-trained rows, to catch forgetting
+REPLAY_RATIO = 4             # already-trained rows replayed per new row when boosting on
+MAX_REPLAY_ROWS = 200_000
+LGB_EXTRA_ROUNDS = 50
+XGB_EXTRA_ROUNDS = 40
+EXTRA_LEARNING_RATE = 0.01    # full training uses 0.05; small steps keep the old trees' fit
+RF_EXTRA_TREES = 20
+AUC_TOLERANCE = 0.005         # ROC-AUC drops up to this size never block promotion
+AUC_BOOTSTRAP = 200           # paired bootstrap resamples of the before/after AUC change
+
+# Training-time bookkeeping LightGBM stores in Booster.params; dropped so
+# num_boost_round below decides how many trees are added.
+_LGB_ROUND_PARAMS = {"num_iterations", "num_iteration", "n_iter", "num_tree", "num_trees",
+                     "num_round", "num_rounds", "num_boost_round", "n_estimators"}
+
+
+# ----------------------------
+# 1. HELPERS
+# ----------------------------
+
+def bump_version(version: str) -> str:
+    """v1.0 -> v1.1, v1.9 -> v1.10; anything unparsable gets a timestamp suffix."""
+    try:
+        major, minor = version.lstrip("v").split(".")[:2]
+        return f"v{int(major)}.{int(minor) + 1}"
+    except ValueError:
+        return f"{version}+{datetime.now(timezone.utc):%Y%m%d%H%M}"
+
+
+def evaluate_ensemble(models: dict, X: np.ndarray, y: np.ndarray) -> dict:
+    probs = model_probabilities(models, X)
+    probs["ensemble"] = blend(probs)
+
+    report = {}
+    for name, p in probs.items():
+        preds = (p > 0.5).astype(int)
+        report[name] = {
+            "accuracy": round(accuracy_score(y, preds), 4),
+            "f1": round(f1_score(y, preds, zero_division=0), 4),
+            "roc_auc": round(roc_auc_score(y, p), 4) if len(np.unique(y)) > 1 else None,
+        }
+
+    levels, counts = np.unique(scores_to_risk_levels(probs["ensemble"]), return_counts=True)
+    report["risk_level_mix"] = {str(lvl): round(float(c) / len(y), 4) for lvl, c in zip(levels, counts)}
+    return report
+
+
+def auc_change(y: np.ndarray, before: np.ndarray, after: np.ndarray,
+               n_boot: int = AUC_BOOTSTRAP, seed: int = 0) -> dict:
+    """
+    ROC-AUC change (after - before) of two scorings of the same rows, with a
+    95% interval from a paired bootstrap over the rows. None if y has one class.
+    """
+    if len(np.unique(y)) < 2:
+        return None
+    rng = np.random.default_rng(seed)
+    deltas = []
+    for _ in range(n_boot):
+        idx = rng.integers(0, len(y), len(y))
+        if y[idx].min() == y[idx].max():
+            continue
+        deltas.append(roc_auc_score(y[idx], after[idx]) - roc_auc_score(y[idx], before[idx]))
+    low, high = np.percentile(deltas, [2.5, 97.5]) if deltas else (np.nan, np.nan)
+    return {
+        "delta": round(float(roc_auc_score(y, after) - roc_auc_score(y, before)), 4),
+        "ci_low": round(float(low), 4),
+        "ci_high": round(float(high), 4),
+    }
+
+
+def print_comparison(title: str, before: dict, after: dict) -> None:
+    print(f"\n=========== {title} ===========")
+    print(f"{'model':<10} {'metric':<9} {'before':>8} {'after':>8}")
+    for name in ["ensemble", "lgb", "xgb", "rf", "logreg"]:
+        for metric in ["roc_auc", "f1", "accuracy"]:
+            b, a = before[name][metric], after[name][metric]
+            print(f"{name:<10} {metric:<9} {str(b):>8} {str(a):>8}")
+    print("risk mix before:", before["risk_level_mix"])
+    print("risk mix after: ", after["risk_level_mix"])
+
+
+def balance(X: np.ndarray, y: np.ndarray):
+    """SMOTE as in train_models.py; skipped when the minority class is too small."""
+    minority = np.bincount(y.astype(int), minlength=2).min()
+    if minority < 6:
+        return X, y
+    return SMOTE(random_state=42).fit_resample(X, y)
+
+
+# ----------------------------
+# 2. INCREMENTAL UPDATE
+# ----------------------------
+
+def update_models(models: dict, X_new: np.ndarray, y_new: np.ndarray) -> dict:
+    """
+    X_new / y_new: the rows to continue training on (new rows + replayed old rows).
+    The scaler is reused unchanged, see the module docstring.
+    """
+    updated = {}
+    scaler = models["scaler"]
+    updated["scaler"] = scaler
+
+    X_bal, y_bal = balance(X_new, y_new)
+    X_bal_scaled = scaler.transform(X_bal)
+
+    print(f"Continuing LightGBM (+{LGB_EXTRA_ROUNDS} rounds, learning rate {EXTRA_LEARNING_RATE})...")
+    lgb_params = {k: v for k, v in models["lgb"].params.items() if k not in _LGB_ROUND_PARAMS}
+    lgb_params["learning_rate"] = EXTRA_LEARNING_RATE
+    updated["lgb"] = lgb.train(
+        params=lgb_params,
+        train_set=lgb.Dataset(X_bal_scaled, y_bal),
+        num_boost_round=LGB_EXTRA_ROUNDS,
+        init_model=models["lgb"],
+        keep_training_booster=True,
+    )
+
+    print(f"Continuing XGBoost (+{XGB_EXTRA_ROUNDS} rounds, learning rate {EXTRA_LEARNING_RATE})...")
+    xgb_model = xgb.XGBClassifier(**{
+        **models["xgb"].get_params(),
+        "n_estimators": XGB_EXTRA_ROUNDS,
+        "learning_rate": EXTRA_LEARNING_RATE,
+    })
+    xgb_model.fit(X_bal_scaled, y_bal, xgb_model=models["xgb"].get_booster())
+    updated["xgb"] = xgb_model
+
+    print(f"Growing Random Forest (+{RF_EXTRA_TREES} trees)...")
+    rf = copy.deepcopy(models["rf"])
+    rf.set_params(warm_start=True, n_estimators=rf.n_estimators + RF_EXTRA_TREES)
+    rf.fit(X_bal, y_bal)
+    rf.set_params(warm_start=False)
+    updated["rf"] = rf
+
+    # Warm start from the serving coefficients, on the same balanced subset
+    print("Continuing Logistic Regression (warm start, new + replay rows)...")
+    logreg = copy.deepcopy(models["logreg"])
+    logreg.set_params(warm_start=True, max_iter=500)
+    logreg.fit(X_bal_scaled, y_bal)
+    logreg.set_params(warm_start=False)
+    updated["logreg"] = logreg
+
+    return updated
+
+
+def auc_regressions(evaluation: dict, tolerance: float = AUC_TOLERANCE) -> list:
+    """
+    Holdouts on which the new version's ensemble ROC-AUC dropped by more than
+    `tolerance` and by more than the bootstrap noise (interval entirely below 0).
+    """
+    problems = []
+    for rows, result in evaluation.items():
+        before, after = result["before"]["ensemble"]["roc_auc"], result["after"]["ensemble"]["roc_auc"]
+        if before is None or after is None or after >= before - tolerance:
+            continue
+        change = result.get("auc_change")
+        if change is not None and change["ci_high"] >= 0:
+            continue
+        detail = f" (95% interval of the change {change['ci_low']}..{change['ci_high']})" if change else ""
+        problems.append(f"{rows}: ensemble ROC-AUC {before} -> {after}{detail}")
+    return problems
+
+
+def promote(version_dir: str, model_dir: str = MODEL_DIR, force: bool = False) -> bool:
+    """Copy a version into model_dir; refuses (returns False) if it scored worse than its parent."""
+    evaluation = load_model_meta(version_dir).get("evaluation")
+    problems = auc_regressions(evaluation) if evaluation else []
+    if problems and not force:
+        print(f"Not promoting {version_dir}, it is worse than the serving version:")
+        for p in problems:
+            print("  " + p)
+        print("Run train_models.py for a full retrain, or pass --force.")
+        return False
+
+    optional = [DISTILLED_FILE, PERSONAL_MODELS_FILE, DRIFT_REFERENCE_FILE]
+    for fname in list(MODEL_FILES.values()) + optional + [META_FILE, TRAINED_KEYS_FILE]:
+        if fname in optional and not os.path.exists(os.path.join(version_dir, fname)):
+            continue
+        tmp = os.path.join(model_dir, fname + ".tmp")
+        shutil.copyfile(os.path.join(version_dir, fname), tmp)
+        os.replace(tmp, os.path.join(model_dir, fname))
+
+    # Compact RandomForest export: a directory, swapped in as a whole
+    src = os.path.join(version_dir, COMPACT_RF_DIR)
+    dst = os.path.join(model_dir, COMPACT_RF_DIR)
+    shutil.rmtree(dst + ".tmp", ignore_errors=True)
+    shutil.copytree(src, dst + ".tmp")
+    replace_dir(dst + ".tmp", dst)
+
+    print(f"Promoted {version_dir} -> {model_dir}/")
+    return True
+
+
+def main(promote_version: bool = False, force: bool = False) -> None:
+    keys_path = os.path.join(MODEL_DIR, TRAINED_KEYS_FILE)
+    if not os.path.exists(keys_path):
+        raise SystemExit(f"{keys_path} not found — run train_models.py once first.")
+
+    models = load_models(MODEL_DIR)
+    meta = load_model_meta(MODEL_DIR)
+    trained_keys = np.load(keys_path)
+
+    X_all, y_all, keys = load_feature_matrix(DATA_PATH, USERS_PATH, return_keys=True)
+    is_new = ~np.isin(keys, trained_keys)
+    n_new = int(is_new.sum())
+    print(f"Current version {meta['version']}: {n_new} new labeled rows of {len(keys)}")
+
+    if n_new < MIN_NEW_ROWS:
+        print(f"Fewer than {MIN_NEW_ROWS} new rows, nothing to do.")
+        return
+
+    new_idx = np.flatnonzero(is_new)
+    y_new = np.asarray(y_all[new_idx])
+    stratify = y_new if np.bincount(y_new, minlength=2).min() >= 2 else None
+    fit_idx, hold_idx = train_test_split(new_idx, test_size=HOLDOUT_FRACTION, random_state=42, stratify=stratify)
+
+    # Disjoint samples of already-trained rows: one to evaluate forgetting on,
+    # one replayed with the new rows so boosting does not fit the new batch alone
+    rng = np.random.default_rng(42)
+    old_idx = rng.permutation(np.flatnonzero(~is_new))
+    n_eval = min(OLD_EVAL_ROWS, len(old_idx) // 2)
+    n_replay = min(REPLAY_RATIO * len(fit_idx), MAX_REPLAY_ROWS, len(old_idx) - n_eval)
+    replay_idx = np.sort(old_idx[n_eval:n_eval + n_replay])
+    old_idx = np.sort(old_idx[:n_eval])
+
+    train_idx = np.concatenate([fit_idx, replay_idx])
+    X_fit, y_fit = np.asarray(X_all[train_idx]), np.asarray(y_all[train_idx])
+    X_hold, y_hold = np.asarray(X_all[hold_idx]), np.asarray(y_all[hold_idx])
+    X_old, y_old = np.asarray(X_all[old_idx]), np.asarray(y_all[old_idx])
+
+    before_new = evaluate_ensemble(models, X_hold, y_hold)
+    before_old = evaluate_ensemble(models, X_old, y_old)
+
+    updated = update_models(models, X_fit, y_fit)
+
+    after_new = evaluate_ensemble(updated, X_hold, y_hold)
+    after_old = evaluate_ensemble(updated, X_old, y_old)
+    change_new = auc_change(y_hold, ensemble_scores(models, X_hold), ensemble_scores(updated, X_hold))
+    change_old = auc_change(y_old, ensemble_scores(models, X_old), ensemble_scores(updated, X_old))
+
+    print_comparison(f"New rows (holdout, n={len(y_hold)})", before_new, after_new)
+    print_comparison(f"Previously trained rows (sample, n={len(y_old)})", before_old, after_old)
+
+    # Keep the distilled serving model in step with the updated ensemble
+    student, distill_report = distill_ensemble(updated, np.vstack([X_fit, X_old]), X_hold, y_hold)
+    print_report(distill_report)
+
+    # Per-user models: users with new rows take one more solve on those rows only
+    # (holdout excluded), shrunk toward their current coefficients; others are kept
+    personal = load_personal_models(MODEL_DIR)
+    if personal is not None:
+        user_idx, user_ids = load_user_index(DATA_PATH, USERS_PATH)
+        rows = np.sort(fit_idx)
+        affected = np.unique(user_idx[rows])
+        cols = [FEATURES.index(f) for f in PERSONAL_FEATURES]
+        print(f"Updating personal models for {len(affected)} users ({len(rows)} new rows)...")
+        update = fit_personal_models(np.asarray(X_all[rows])[:, cols], np.asarray(y_all[rows]),
+                                     np.searchsorted(affected, user_idx[rows]), user_ids[affected],
+                                     personal["global"],
+                                     user_prior=personal_coefficients(personal, user_ids[affected].astype(str)))
+        personal = merge_personal_models(personal, update)
+
+    # Holdout rows stay "new" so the next run absorbs them
+    version = bump_version(meta["version"])
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    save_models(updated, version_dir)
+    export_compact_forest(updated["rf"], os.path.join(version_dir, COMPACT_RF_DIR), X_check=X_hold)
+    joblib.dump(student, os.path.join(version_dir, DISTILLED_FILE))
+    if personal is not None:
+        save_personal_models(personal, version_dir)
+
+    # Drift reference over all rows the new version has seen
+    X_ref = np.asarray(X_all[reference_rows(len(X_all))])
+    ref_levels = {
+        "ensemble": scores_to_risk_levels(serving_scores(updated, X_ref)),
+        "distilled": scores_to_risk_levels(serving_scores({"distilled": student}, X_ref)),
+    }
+    save_drift_reference(build_reference(X_ref, ref_levels, FEATURES, RISK_LEVELS), version_dir)
+    np.save(os.path.join(version_dir, TRAINED_KEYS_FILE), np.union1d(trained_keys, keys[fit_idx]))
+    save_model_meta({
+        "version": version,
+        "mode": "incremental",
+        "parent_version": meta["version"],
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "n_new_rows": int(len(fit_idx)),
+        "n_replay_rows": int(len(replay_idx)),
+        "evaluation": {
+            "new_rows": {"before": before_new, "after": after_new, "auc_change": change_new},
+            "old_rows": {"before": before_old, "after": after_old, "auc_change": change_old},
+        },
+        "distillation": distill_report,
+    }, version_dir)
+    print(f"\nSaved model version {version} to {version_dir}")
+
+    if promote_version:
+        promote(version_dir, force=force)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm-start retraining from new labeled rows.")
+    parser.add_argument("--promote", action="store_true", help="serve the new version (copy into models/)")
+    parser.add_argument("--force", action="store_true", help="promote even if holdout ROC-AUC got worse")
+    args = parser.parse_args()
+    main(promote_version=args.promote, force=args.force)
@@ -1,13 +1,33 @@
+import os
+
 import numpy as np
-import joblib
+
+from ensemble import (
+    MODEL_DIR, load_serving_models, load_model_meta, serving_scores, score_to_risk_level, scores_to_risk_levels,
+)
+from personal_models import PERSONAL_FEATURES, load_personal_models, adjust_score, adjust_scores
+from drift import DriftMonitor, load_drift_reference
 
 
 # Load models
-scaler = joblib.load("models/scaler.pkl")
-logreg = joblib.load("models/logreg.pkl")
-rf = joblib.load("models/random_forest.pkl")
-xgb_model = joblib.load("models/xgboost.pkl")
-lgb_model = joblib.load("models/lightgbm.pkl")  # Booster
+# SERVING_MODE=ensemble (default): scaler + LogReg + RF + XGBoost + LightGBM
+# SERVING_MODE=distilled: single compact LightGBM trained to mimic the ensemble
+# RF_FORMAT=compact (default): array-backed RandomForest export if present, else the pickle
+# MODEL_MMAP=1 (default): memory-map the compact RandomForest arrays so worker processes
+#   share their pages; LightGBM / XGBoost boosters are unaffected
+SERVING_MODE = os.getenv("SERVING_MODE", "ensemble")
+RF_FORMAT = os.getenv("RF_FORMAT", "compact")
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+models = load_serving_models(SERVING_MODE, rf_format=RF_FORMAT, mmap=MODEL_MMAP)
+MODEL_VERSION = load_model_meta()["version"]
+personal = load_personal_models(MODEL_DIR)  # per-user adjustments (None if not trained)
+
+# Live input drift vs the training snapshot (DRIFT_MONITOR=0 disables)
+drift_reference = load_drift_reference(MODEL_DIR)
+drift_monitor = (
+    DriftMonitor(drift_reference, SERVING_MODE)
+    if drift_reference and os.getenv("DRIFT_MONITOR", "1") == "1" else None
+)
 
 FEATURES = [
     "sleep_hours",
@@ -35,49 +55,71 @@ FEATURES = [
 
 
 
-def predict_risk(feature_dict):
+def predict_risk(feature_dict, user_id=None):
     # 1) Build feature vector in correct order
     x = np.array([[feature_dict[f] for f in FEATURES]], dtype=float)
 
-    x_scaled = scaler.transform(x)
-
-    # 2) Get probabilities
-    p_log = logreg.predict_proba(x_scaled)[0, 1]
-    p_rf = rf.predict_proba(x)[0, 1]
-    p_xgb = xgb_model.predict_proba(x_scaled)[0, 1]
-    p_lgb = float(lgb_model.predict(x_scaled)[0])  # LightGBM Booster
+    # 2-3) Weighted ensemble of model probabilities (favor LightGBM & XGBoost),
+    #      or the distilled model's approximation of it
+    model_score = float(serving_scores(models, x)[0])
 
-    # 3) Weighted ensemble (favor LightGBM & XGBoost)
-    risk_score = (
-        0.45 * p_lgb +
-        0.30 * p_xgb +
-        0.15 * p_rf +
-        0.10 * p_log
-    )
+    # 3b) Per-user adjustment: one dot product against the user's coefficient row
+    risk_score, personalized = adjust_score(personal, user_id, feature_dict, model_score)
 
     # 4) Softer thresholds to get more MEDIUM / HIGH
-    if risk_score < 0.35:
-        risk_level = "LOW"
-    elif risk_score < 0.65:
-        risk_level = "MEDIUM"
-    else:
-        risk_level = "HIGH"
+    risk_level = score_to_risk_level(risk_score)
+
+    # 4b) Constant-memory drift sketches (histogram update, no request logging);
+    #     the level of the served model's own score, as in the reference snapshot
+    if drift_monitor is not None:
+        drift_monitor.observe(x[0], score_to_risk_level(model_score))
 
     # 5) Dummy top_factors for now (for UI)
-    top_factors = sorted(
-        [
-            ("sleep_hours", -feature_dict["sleep_deviation"]),
-            ("hrv", -feature_dict["hrv_deviation"]),
-            ("screen_time_total_hours", feature_dict["screen_deviation"]),
-            ("meeting_hours", feature_dict["meeting_deviation"]),
-            ("pressure_change_abs", feature_dict["pressure_change_abs"]),
-        ],
-        key=lambda x: abs(x[1]),
-        reverse=True
-    )[:3]
+    top_factors = top_factors_batch(x)[0]
 
     return {
         "risk_score": float(risk_score),
         "risk_level": risk_level,
-        "top_factors": [f for f, _ in top_factors],
+        "top_factors": top_factors,
+        "model_version": MODEL_VERSION,
+        "personalized": personalized,
+    }
+
+
+# (factor name, feature, sign): the largest |sign * value| are reported first
+TOP_FACTORS = [
+    ("sleep_hours", "sleep_deviation", -1.0),
+    ("hrv", "hrv_deviation", -1.0),
+    ("screen_time_total_hours", "screen_deviation", 1.0),
+    ("meeting_hours", "meeting_deviation", 1.0),
+    ("pressure_change_abs", "pressure_change_abs", 1.0),
+]
+_FACTOR_NAMES = np.array([name for name, _, _ in TOP_FACTORS])
+_FACTOR_COLS = [FEATURES.index(f) for _, f, _ in TOP_FACTORS]
+_FACTOR_SIGNS = np.array([sign for _, _, sign in TOP_FACTORS])
+
+
+def top_factors_batch(X: np.ndarray, k: int = 3):
+    """Top-k factor names per row (stable order on ties, like sorted())."""
+    contrib = np.abs(X[:, _FACTOR_COLS] * _FACTOR_SIGNS)
+    order = np.argsort(-contrib, axis=1, kind="stable")[:, :k]
+    return _FACTOR_NAMES[order].tolist()
+
+
+def predict_risk_batch(X: np.ndarray, user_ids=None) -> dict:
+    """
+    Vectorized predict_risk for many rows (FEATURES order), e.g. for batch_score.py.
+    Does not feed the live drift monitor.
+    """
+    X = np.asarray(X, dtype=float)
+    scores = serving_scores(models, X)
+    personal_cols = [FEATURES.index(f) for f in PERSONAL_FEATURES]
+    scores, personalized = adjust_scores(personal, user_ids, X[:, personal_cols], scores)
+
+    return {
+        "risk_score": scores,
+        "risk_level": scores_to_risk_levels(scores),
+        "top_factors": top_factors_batch(X),
+        "personalized": personalized,
+        "model_version": MODEL_VERSION,
     }
@@ -0,0 +1,447 @@
+"""
+End-to-end load test for the API with realistic feature replay.
+
+Traffic:
+  POST /predict              - feature vectors from the n8n "Build Features"
+                               LOW / MEDIUM / HIGH profiles and/or from the
+                               synthetic data generator's distributions
+  GET  /users/{id}/summary   - users seeded into a local Firebase stand-in
+  GET  /users/{id}/events      (local_firebase.py) with profile-based event histories
+
+For every worker count the harness starts the stand-in and app.py locally
+(serve.py, or plain uvicorn with --launcher uvicorn), then runs closed-loop
+steps at rising concurrency and reports throughput, latency percentiles and
+error rates per step, plus the saturation point (the lowest concurrency
+reaching ~max throughput).
+
+Run (from backend/, after train_models.py):
+  python load_test.py
+  python load_test.py --workers 1,2,4 --concurrency 1,4,16,64 --duration 20
+  python load_test.py --url http://127.0.0.1:8080   # existing server, no local start
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import requests
+
+from features import FEATURES
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+APP_PORT = 8181
+FIREBASE_PORT = 9100
+WORKER_COUNTS = [1, 2]
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+STEP_SECONDS = 10.0
+WARMUP_SECONDS = 2.0
+REQUEST_TIMEOUT = 30
+STARTUP_TIMEOUT = 120
+LAUNCHER = "serve"                  # serve (serve.py, shared models) | uvicorn (uvicorn --workers)
+
+TRAFFIC_MIX = {"predict": 0.7, "summary": 0.2, "events": 0.1}
+FEATURE_POOL_SIZE = 5_000
+FEATURE_SOURCE = "mixed"            # profiles | generator | mixed
+N_USERS = 200
+EVENTS_PER_USER = 90
+
+SATURATION_FRACTION = 0.95          # saturation = lowest concurrency reaching 95% of max throughput
+LATENCY_SLO_MS = 500.0              # p99 target, flagged in the report
+
+# n8n "Build Features" profiles: mode mix and (mean, sd) per raw feature
+PROFILE_MIX = {"LOW": 0.30, "MEDIUM": 0.35, "HIGH": 0.35}
+PROFILES = {
+    "LOW": {
+        "sleep_hours": (7.5, 0.4), "hrv": (60, 4), "resting_hr": (60, 3),
+        "screen_time_total_hours": (3, 0.5), "screen_time_after_22_hours": (0.3, 0.1),
+        "meeting_hours": (3, 0.8), "pressure_change": (1, 0.5),
+    },
+    "MEDIUM": {
+        "sleep_hours": (6, 0.6), "hrv": (48, 4), "resting_hr": (70, 3),
+        "screen_time_total_hours": (5, 0.8), "screen_time_after_22_hours": (1.2, 0.4),
+        "meeting_hours": (6, 1), "pressure_change": (4, 1.2),
+    },
+    "HIGH": {
+        "sleep_hours": (4.5, 0.7), "hrv": (38, 6), "resting_hr": (80, 4),
+        "screen_time_total_hours": (7, 1.2), "screen_time_after_22_hours": (3, 0.6),
+        "meeting_hours": (10, 1.5), "pressure_change": (8, 2),
+    },
+}
+PROFILE_BASELINES = {"sleep_hours": 7, "hrv": 55, "screen_time_total_hours": 3.5, "meeting_hours": 4}
+PROFILE_RISK = {"LOW": (0.2, 0.08), "MEDIUM": (0.5, 0.08), "HIGH": (0.8, 0.08)}
+
+
+# ----------------------------
+# 1. FEATURE REPLAY
+# ----------------------------
+
+def sample_profile_features(n: int, rng: np.random.Generator):
+    """n feature dicts drawn like the n8n Build Features node. Returns (features, modes)."""
+    modes = rng.choice(list(PROFILE_MIX), size=n, p=list(PROFILE_MIX.values()))
+    rows = []
+    for mode in modes:
+        p = PROFILES[mode]
+
+        def draw(name):
+            mean, sd = p[name]
+            return mean + sd * rng.standard_normal()
+
+        f = {name: draw(name) for name in p}
+        f["screen_time_after_22_hours"] = max(0.0, f["screen_time_after_22_hours"])
+        f["pressure_change_abs"] = abs(f.pop("pressure_change"))
+        f["meeting_count"] = round(f["meeting_hours"])
+        f["temperature"] = 10 + 5 * rng.standard_normal()
+        f["humidity"] = float(np.clip(70 + 10 * rng.standard_normal(), 40, 100))
+        f["precipitation"] = max(0.0, 1 + rng.standard_normal())
+
+        f["sleep_deviation"] = f["sleep_hours"] - PROFILE_BASELINES["sleep_hours"]
+        f["hrv_deviation"] = f["hrv"] - PROFILE_BASELINES["hrv"]
+        f["screen_deviation"] = f["screen_time_total_hours"] - PROFILE_BASELINES["screen_time_total_hours"]
+        f["meeting_deviation"] = f["meeting_hours"] - PROFILE_BASELINES["meeting_hours"]
+
+        f["sleep_hours_3d_avg"] = f["sleep_hours"] - (0.3 + 0.3 * rng.standard_normal())
+        f["hrv_3d_avg"] = f["hrv"] - (3 + 3 * rng.standard_normal())
+        f["screen_time_total_hours_3d_avg"] = f["screen_time_total_hours"] - (0.5 + 0.4 * rng.standard_normal())
+        f["meeting_hours_3d_avg"] = f["meeting_hours"] - (0.5 + 0.4 * rng.standard_normal())
+
+        rows.append({name: float(f[name]) for name in FEATURES})
+    return rows, modes
+
+
+def sample_generator_features(n: int, rng: np.random.Generator, n_users: int = N_USERS):
+    """n feature dicts sampled from rows of the synthetic data generator (offline weather)."""
+    from generate_synthetic_data import START_DATE, END_DATE, generate_users, generate_daily_data
+    from feature_store import engineer_rows, group_starts
+    from weather import get_daily_weather_many
+
+    seed = int(rng.integers(2 ** 31))
+    users_df = generate_users(n_users, seed=seed)
+    weather_df = get_daily_weather_many(sorted(set(users_df["place"])), START_DATE, END_DATE, mode="offline")
+    daily_df = generate_daily_data(users_df, weather_df, seed=seed)
+
+    starts = group_starts(daily_df["user_id"].cat.codes.to_numpy())
+    X = engineer_rows(daily_df, users_df.set_index("user_id"), starts)
+    X = X[np.isfinite(X).all(axis=1)]   # rows the training pipeline would drop too (e.g. rolling warm-up)
+    X = X[rng.choice(len(X), size=n, replace=len(X) < n)]
+    return [dict(zip(FEATURES, map(float, row))) for row in X]
+
+
+def build_feature_pool(n: int = FEATURE_POOL_SIZE, source: str = FEATURE_SOURCE, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    if source == "profiles":
+        return sample_profile_features(n, rng)[0]
+    if source == "generator":
+        return sample_generator_features(n, rng)
+    if source == "mixed":
+        pool = sample_profile_features(n // 2, rng)[0] + sample_generator_features(n - n // 2, rng)
+        return [pool[i] for i in rng.permutation(len(pool))]
+    raise ValueError(f"Unknown feature source {source!r}")
+
+
+def build_event_store(n_users: int = N_USERS, n_events: int = EVENTS_PER_USER, seed: int = 0) -> dict:
+    """Firebase tree {"events": {user_id: {key: event}}} with one profile-based event per day."""
+    rng = np.random.default_rng(seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    events = {}
+
+    for u in range(n_users):
+        user_id = f"loadtest_user_{u}"
+        features, modes = sample_profile_features(n_events, rng)
+        user_events = {}
+        for day, (f, mode) in enumerate(zip(features, modes)):
+            ts = (now - timedelta(days=n_events - 1 - day)).isoformat().replace("+00:00", "Z")
+            mean, sd = PROFILE_RISK[mode]
+            user_events[ts.replace(":", "_").replace(".", "_")] = {
+                "user_id": user_id,
+                "timestamp": ts,
+                **{k: round(v, 3) for k, v in f.items() if k in FEATURES[:11]},
+                "risk_score": round(float(np.clip(mean + sd * rng.standard_normal(), 0, 1)), 4),
+                "risk_level": mode,
+                "top_factors": ["sleep_deviation", "hrv_deviation", "meeting_deviation"],
+                "model_version": "v1.0",
+            }
+        events[user_id] = user_events
+
+    return {"events": events}
+
+
+# ----------------------------
+# 2. LOCAL SERVICES
+# ----------------------------
+
+def _spawn(cmd, env=None, log_path=None):
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(cmd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url: str, proc=None, timeout: float = STARTUP_TIMEOUT) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{url} exited during startup (code {proc.returncode})")
+        try:
+            if requests.get(url, timeout=2).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def start_firebase(store: dict, port: int = FIREBASE_PORT, workdir: str = None):
+    path = os.path.join(workdir or tempfile.gettempdir(), "loadtest_firebase.json")
+    with open(path, "w") as f:
+        json.dump(store, f)
+    proc = _spawn([sys.executable, "local_firebase.py", "--port", str(port), "--data", path])
+    wait_ready(f"http://127.0.0.1:{port}/.json?shallow=true", proc)
+    return proc
+
+
+def start_app(workers: int, port: int = APP_PORT, firebase_url: str = None, log_path: str = None,
+              launcher: str = LAUNCHER):
+    env = dict(os.environ)
+    if firebase_url:
+        env["FIREBASE_DB_URL"] = firebase_url
+    if launcher == "serve":
+        cmd = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--memory-report", "0"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    proc = _spawn(cmd, env=env, log_path=log_path)
+    wait_ready(f"http://127.0.0.1:{port}/health", proc)
+    return proc
+
+
+def stop(proc) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# ----------------------------
+# 3. LOAD
+# ----------------------------
+
+def run_step(base_url: str, concurrency: int, duration: float, pool, user_ids, mix: dict = TRAFFIC_MIX,
+             warmup: float = WARMUP_SECONDS, seed: int = 0) -> dict:
+    """
+    Closed loop: `concurrency` threads send requests back to back for
+    warmup + duration seconds; only requests finished after the warm-up count.
+    """
+    endpoints = list(mix)
+    weights = np.array(list(mix.values()), dtype=float)
+    weights /= weights.sum()
+
+    samples = []                    # (endpoint, status, latency_s); list.append is thread-safe
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(i: int) -> None:
+        rng = np.random.default_rng([seed, i])
+        session = requests.Session()
+        while True:
+            endpoint = endpoints[rng.choice(len(endpoints), p=weights)]
+            if endpoint == "predict":
+                method, url = "POST", f"{base_url}/predict"
+                body = {"features": pool[rng.integers(len(pool))]}
+                if user_ids and rng.random() < 0.5:
+                    body["user_id"] = user_ids[rng.integers(len(user_ids))]
+            else:
+                method, url, body = "GET", f"{base_url}/users/{user_ids[rng.integers(len(user_ids))]}/{endpoint}", None
+
+            t0 = time.perf_counter()
+            if t0 >= stop_at:
+                break
+            try:
+                status = session.request(method, url, json=body, timeout=REQUEST_TIMEOUT).status_code
+            except requests.RequestException:
+                status = 0
+            t1 = time.perf_counter()
+            if t1 >= measure_from and t1 <= stop_at:
+                samples.append((endpoint, status, t1 - t0))
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return summarize(samples, duration, concurrency)
+
+
+def _percentiles(latencies: np.ndarray) -> dict:
+    if len(latencies) == 0:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    return {
+        "p50_ms": round(float(p50), 2),
+        "p90_ms": round(float(p90), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max() * 1000), 2),
+    }
+
+
+def summarize(samples, duration: float, concurrency: int) -> dict:
+    endpoint = np.array([s[0] for s in samples])
+    status = np.array([s[1] for s in samples], dtype=int)
+    latency = np.array([s[2] for s in samples], dtype=float)
+    ok = (status >= 200) & (status < 400)
+    good = (status >= 200) & (status < 300)
+
+    # goodput counts only 2xx answers: fast 429/503 rejections and errors would
+    # otherwise inflate throughput exactly when the server is shedding load
+    result = {
+        "concurrency": concurrency,
+        "requests": int(len(samples)),
+        "throughput_rps": round(len(samples) / duration, 2),
+        "goodput_rps": round(int(good.sum()) / duration, 2),
+        "error_rate": round(float((~ok).mean()), 4) if len(samples) else 0.0,
+        "shed_rate": round(float(np.isin(status, [429, 503]).mean()), 4) if len(samples) else 0.0,
+        **_percentiles(latency[ok]),                     # successful (2xx / 3xx) responses only
+        "failed": _percentiles(latency[~ok]),            # errors, timeouts and shed (429 / 503) responses
+        "endpoints": {},
+    }
+    for name in dict.fromkeys(endpoint.tolist()):
+        sel = endpoint == name
+        result["endpoints"][name] = {
+            "requests": int(sel.sum()),
+            "goodput_rps": round(int((sel & good).sum()) / duration, 2),
+            "error_rate": round(float((~ok[sel]).mean()), 4),
+            **_percentiles(latency[sel & ok]),
+            "failed": _percentiles(latency[sel & ~ok]),
+        }
+    return result
+
+
+def saturation_point(steps) -> dict:
+    """Lowest-concurrency step reaching SATURATION_FRACTION of the best goodput (2xx/s)."""
+    best = max(s["goodput_rps"] for s in steps)
+    return next(s for s in steps if s["goodput_rps"] >= SATURATION_FRACTION * best)
+
+
+# ----------------------------
+# 4. REPORT
+# ----------------------------
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_steps(label: str, steps) -> None:
+    print(f"\n=========== {label} ===========")
+    print("p50 / p90 / p99 / max: successful responses only; fail p50 / p99: errors, timeouts and shed requests")
+    print(f"{'conc':>5} {'2xx/s':>9} {'req/s':>9} {'err%':>6} {'shed%':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'fail p50':>9} {'fail p99':>9}   per endpoint p99 ms")
+    for s in steps:
+        per_endpoint = ", ".join(f"{k} {v['p99_ms']}" for k, v in s["endpoints"].items())
+        slo = " !" if (s["p99_ms"] or 0) > LATENCY_SLO_MS else ""
+        failed = s["failed"]
+        print(f"{s['concurrency']:>5} {s['goodput_rps']:>9.1f} {s['throughput_rps']:>9.1f} "
+              f"{s['error_rate'] * 100:>6.2f} {s['shed_rate'] * 100:>6.2f} "
+              f"{s['p50_ms'] or 0:>8.1f} {s['p90_ms'] or 0:>8.1f} {s['p99_ms'] or 0:>8.1f}{slo:2} "
+              f"{s['max_ms'] or 0:>6.1f} {_ms(failed['p50_ms']):>9} {_ms(failed['p99_ms']):>9}   {per_endpoint}")
+
+    sat = saturation_point(steps)
+    print(f"Saturation: ~{sat['goodput_rps']:.1f} successful req/s at concurrency {sat['concurrency']} "
+          f"(p99 {sat['p99_ms']} ms; '!' marks p99 > {LATENCY_SLO_MS:.0f} ms)")
+
+
+def run(workers_list, concurrency_levels, duration: float, mix: dict, source: str,
+        n_users: int, n_events: int, url: str = None, seed: int = 0, launcher: str = LAUNCHER) -> dict:
+    print(f"Building feature pool ({FEATURE_POOL_SIZE} vectors, source={source})...")
+    pool = build_feature_pool(FEATURE_POOL_SIZE, source, seed)
+    user_ids = [f"loadtest_user_{u}" for u in range(n_users)]
+    results = {"created_at": datetime.now(timezone.utc).isoformat(), "mix": mix, "source": source, "runs": []}
+
+    firebase = None
+    try:
+        if url is None:
+            print(f"Starting local Firebase stand-in ({n_users} users x {n_events} events)...")
+            firebase = start_firebase(build_event_store(n_users, n_events, seed))
+
+        for workers in ([None] if url else workers_list):
+            app = None
+            base_url = url
+            try:
+                if url is None:
+                    print(f"\nStarting app.py with {workers} worker(s) ({launcher})...")
+                    app = start_app(workers, firebase_url=f"http://127.0.0.1:{FIREBASE_PORT}",
+                                    log_path=os.path.join(tempfile.gettempdir(), f"loadtest_app_{workers}w.log"),
+                                    launcher=launcher)
+                    base_url = f"http://127.0.0.1:{APP_PORT}"
+
+                steps = []
+                for concurrency in concurrency_levels:
+                    step = run_step(base_url, concurrency, duration, pool, user_ids, mix, seed=seed)
+                    steps.append(step)
+                    print(f"  concurrency {concurrency:>3}: {step['goodput_rps']:.1f} successful req/s "
+                          f"({step['throughput_rps']:.1f} total), "
+                          f"p99 {step['p99_ms']} ms, errors {step['error_rate'] * 100:.2f}% "
+                          f"(failed p99 {step['failed']['p99_ms']} ms)")
+
+                label = f"{workers} worker(s)" if workers else base_url
+                print_steps(label, steps)
+                results["runs"].append({"workers": workers, "steps": steps, "saturation": saturation_point(steps)})
+            finally:
+                stop(app)
+    finally:
+        stop(firebase)
+
+    if len(results["runs"]) > 1:
+        print("\n=========== Saturation per worker count ===========")
+        for r in results["runs"]:
+            s = r["saturation"]
+            print(f"{r['workers']} worker(s): ~{s['goodput_rps']:.1f} successful req/s at concurrency {s['concurrency']}, "
+                  f"p99 {s['p99_ms']} ms")
+
+    return results
+
+
+def _int_list(s: str):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def _mix(s: str) -> dict:
+    return {k.strip(): float(v) for k, v in (part.split("=") for part in s.split(","))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /predict, /users/{id}/summary and /users/{id}/events.")
+    parser.add_argument("--workers", type=_int_list, default=WORKER_COUNTS, help="uvicorn worker counts, e.g. 1,2,4")
+    parser.add_argument("--concurrency", type=_int_list, default=CONCURRENCY_LEVELS, help="e.g. 1,2,4,8,16")
+    parser.add_argument("--duration", type=float, default=STEP_SECONDS, help="measured seconds per step")
+    parser.add_argument("--mix", type=_mix, default=TRAFFIC_MIX, help="e.g. predict=0.7,summary=0.2,events=0.1")
+    parser.add_argument("--source", choices=["profiles", "generator", "mixed"], default=FEATURE_SOURCE)
+    parser.add_argument("--users", type=int, default=N_USERS, help="users seeded into the Firebase stand-in")
+    parser.add_argument("--events", type=int, default=EVENTS_PER_USER, help="events per seeded user")
+    parser.add_argument("--launcher", choices=["serve", "uvicorn"], default=LAUNCHER,
+                        help="serve.py (shared preloaded models) or plain uvicorn --workers")
+    parser.add_argument("--url", help="test an already running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.workers, args.concurrency, args.duration, args.mix, args.source,
+                  args.users, args.events, args.url, args.seed, args.launcher)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.out}")
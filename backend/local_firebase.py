@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Firebase Realtime Database REST API.
+
+Keeps one in-memory JSON tree and serves it the way RTDB does:
+  GET    /<path>.json                -> value at path (null if missing)
+  GET    /<path>.json?shallow=true   -> {child_key: true, ...} (no other query parameters)
+  GET    /<path>.json?orderBy="$key"&startAt=..&endAt=..&limitToFirst=N / limitToLast=N
+  GET    /<path>.json?orderBy="<child>"&...     -> same filters on a child value
+  PUT    /<path>.json                -> replace value
+  PATCH  /<path>.json                -> update children ("a/b" keys write nested paths)
+  POST   /<path>.json                -> append under a generated key, returns {"name": key}
+  DELETE /<path>.json                -> remove value
+
+Used for load tests and local development without touching the real database:
+  python local_firebase.py --port 9100 --data seed.json
+  FIREBASE_DB_URL=http://127.0.0.1:9100 uvicorn app:app --port 8080
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+DEFAULT_PORT = 9100
+
+
+# ----------------------------
+# 1. JSON TREE
+# ----------------------------
+
+class JsonTree:
+    """Thread-safe nested-dict store addressed by slash-separated paths."""
+
+    def __init__(self, data: dict = None):
+        self.root = data or {}
+        self.lock = threading.Lock()
+        self._push_counter = 0
+
+    @staticmethod
+    def _parts(path: str):
+        return [p for p in path.strip("/").split("/") if p]
+
+    def get(self, path: str):
+        node = self.root
+        for part in self._parts(path):
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value) -> None:
+        if not parts:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node = self.root
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = node[part] = {}
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    def put(self, path: str, value):
+        with self.lock:
+            self._set(self._parts(path), value)
+        return value
+
+    def patch(self, path: str, updates: dict):
+        with self.lock:
+            base = self._parts(path)
+            for key, value in updates.items():
+                self._set(base + self._parts(key), value)
+        return updates
+
+    def push(self, path: str, value) -> str:
+        with self.lock:
+            # Time-ordered keys, like Firebase push ids
+            self._push_counter += 1
+            key = f"-{time.time_ns():020d}{self._push_counter:06d}"
+            self._set(self._parts(path) + [key], value)
+        return key
+
+
+# ----------------------------
+# 2. HTTP SERVER
+# ----------------------------
+
+def _order_value(value):
+    """RTDB's orderBy="<child>" order: null, false, true, numbers, strings, objects."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+def _ordered_query(value: dict, query: dict) -> dict:
+    """
+    orderBy="$key" or orderBy="<child>" filters: startAt / endAt (inclusive),
+    then limitToFirst / limitToLast. Child ties are broken by key, as in RTDB.
+    """
+    order_by = json.loads(query["orderBy"])
+    if order_by == "$key":
+        order = {k: (3, k) for k in value}
+    else:
+        order = {k: _order_value(v.get(order_by) if isinstance(v, dict) else None) for k, v in value.items()}
+    keys = sorted(value, key=lambda k: (order[k], k))
+    if "startAt" in query:
+        keys = [k for k in keys if order[k] >= _order_value(json.loads(query["startAt"]))]
+    if "endAt" in query:
+        keys = [k for k in keys if order[k] <= _order_value(json.loads(query["endAt"]))]
+    if "limitToFirst" in query:
+        keys = keys[:int(query["limitToFirst"])]
+    if "limitToLast" in query:
+        keys = keys[-int(query["limitToLast"]):]
+    return {k: value[k] for k in keys}
+
+
+def make_handler(tree: JsonTree):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Buffer headers + body into one write (flushed once per request) and send
+        # it right away; separate small writes on a kept-alive connection otherwise
+        # wait ~40 ms on Nagle + the client's delayed ACK
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def _path(self) -> str:
+            path = urlsplit(self.path).path
+            return path[:-len(".json")] if path.endswith(".json") else path
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def _send(self, value, status: int = 200, body: bytes = None) -> None:
+            body = json.dumps(value).encode() if body is None else body
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            if query.get("shallow") == "true" and len(query) > 1:
+                self._send({"error": "shallow cannot be combined with other query parameters"}, status=400)
+                return
+
+            # Serialize under the lock so concurrent writes cannot change the tree mid-dump
+            with tree.lock:
+                value = tree.get(self._path())
+                if isinstance(value, dict):
+                    if "orderBy" in query:
+                        value = _ordered_query(value, query)
+                    if query.get("shallow") == "true":
+                        value = {k: True for k in value}
+                body = json.dumps(value).encode()
+            self._send(None, body=body)
+
+        def do_PUT(self):
+            self._send(tree.put(self._path(), self._body()))
+
+        def do_PATCH(self):
+            body = self._body()
+            if not isinstance(body, dict):
+                self._send({"error": "PATCH body must be an object"}, status=400)
+                return
+            self._send(tree.patch(self._path(), body))
+
+        def do_POST(self):
+            self._send({"name": tree.push(self._path(), self._body())})
+
+        def do_DELETE(self):
+            tree.put(self._path(), None)
+            self._send(None)
+
+        def log_message(self, format, *args):
+            pass  # keep load tests quiet
+
+    return Handler
+
+
+def serve(port: int = DEFAULT_PORT, data: dict = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Create the server (call serve_forever() on it, or run it in a thread)."""
+    server = ThreadingHTTPServer((host, port), make_handler(JsonTree(data)))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Firebase RTDB stand-in.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--data", help="JSON file with the initial database tree")
+    args = parser.parse_args()
+
+    data = None
+    if args.data:
+        with open(args.data) as f:
+            data = json.load(f)
+
+    server = serve(args.port, data, args.host)
+    print(f"Local Firebase stand-in on http://{args.host}:{args.port}")
+    server.serve_forever()
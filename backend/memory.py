@@ -0,0 +1,27 @@
+"""
+Process memory accounting, shared by the API (GET /health/memory) and the
+multi-worker launcher (serve.py), so the app does not import the launcher.
+"""
+
+
+def process_memory(pid="self") -> dict:
+    """
+    Memory of one process in bytes (Linux /proc/<pid>/smaps_rollup).
+    pss splits shared pages between the processes mapping them, so summing pss
+    over workers gives their real combined footprint.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[-1] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
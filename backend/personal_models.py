@@ -0,0 +1,231 @@
+"""
+Per-user personalized risk models, trained for all users at once.
+
+Every user gets a small logistic regression on the baseline-deviation features,
+shrunk toward the global (population) logistic regression with an L2 penalty,
+so users with little data stay close to the global model. All users are solved
+together with a batched Newton method: per-user gradients and Hessians are
+accumulated with np.bincount and solved with one batched np.linalg.solve.
+
+The result is stored as one compact array, models/personal_models.npz:
+  user_ids  - sorted user ids (row i of deltas belongs to user_ids[i])
+  deltas    - float32 (n_users, 1 + n_features): personal minus global
+              coefficients, intercept first
+  global    - global coefficients, intercept first
+
+At serving time the user's adjustment is one dot product, added to the
+ensemble score in logit space (see adjust_score).
+"""
+
+import os
+
+import numpy as np
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+PERSONAL_FEATURES = [
+    "sleep_deviation",
+    "hrv_deviation",
+    "screen_deviation",
+    "meeting_deviation",
+]
+PERSONAL_MODELS_FILE = "personal_models.npz"
+
+PERSONAL_L2 = 20.0        # shrinkage toward the global model (standardized feature units)
+NEWTON_ITERATIONS = 15
+NEWTON_TOL = 1e-6
+_EPS = 1e-6
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -35, 35)))
+
+
+def _logit(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, _EPS, 1 - _EPS)
+    return np.log(p / (1 - p))
+
+
+# ----------------------------
+# 1. TRAINING
+# ----------------------------
+
+def global_coefficients(model) -> np.ndarray:
+    """Intercept + coefficients of a fitted sklearn LogisticRegression."""
+    return np.r_[model.intercept_[0], model.coef_[0]]
+
+
+def fit_personal_models(X: np.ndarray, y: np.ndarray, user_idx: np.ndarray, user_ids: np.ndarray,
+                        prior: np.ndarray, l2: float = PERSONAL_L2, user_prior: np.ndarray = None) -> dict:
+    """
+    X: (n_rows, len(PERSONAL_FEATURES)) raw deviation features
+    user_idx: (n_rows,) index into user_ids for every row
+    prior: global coefficients, intercept first (see global_coefficients)
+    user_prior: optional (n_users, 1 + n_features) coefficients to shrink each
+        user toward instead of the global prior (incremental updates start from
+        the user's current model and only see the new rows)
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    user_idx = np.asarray(user_idx)
+    n_users = len(user_ids)
+
+    # Solve in standardized units so one penalty fits all features
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = np.column_stack([np.ones(len(X)), X / scale])
+    d = Z.shape[1]
+
+    prior = np.asarray(prior, dtype=float).copy()
+    prior[1:] *= scale
+    if user_prior is None:
+        center = np.tile(prior, (n_users, 1))
+    else:
+        center = np.array(user_prior, dtype=float)
+        center[:, 1:] *= scale
+    W = center.copy()
+
+    pairs = [(i, j) for i in range(d) for j in range(i, d)]
+    ridge = l2 * np.eye(d)
+
+    for it in range(NEWTON_ITERATIONS):
+        p = _sigmoid(np.einsum("nd,nd->n", Z, W[user_idx]))
+        resid = p - y
+        weight = p * (1 - p)
+
+        G = np.column_stack([
+            np.bincount(user_idx, weights=resid * Z[:, j], minlength=n_users)
+            for j in range(d)
+        ]) + l2 * (W - center)
+
+        H = np.empty((n_users, d, d))
+        for i, j in pairs:
+            H[:, i, j] = H[:, j, i] = np.bincount(user_idx, weights=weight * Z[:, i] * Z[:, j], minlength=n_users)
+        H += ridge
+
+        step = np.linalg.solve(H, G[..., None])[..., 0]
+        W -= step
+
+        if np.abs(step).max() < NEWTON_TOL:
+            break
+
+    print(f"Personal models converged after {it + 1} Newton iterations ({n_users} users)")
+
+    # Back to raw feature units
+    W[:, 1:] /= scale
+    prior[1:] /= scale
+
+    # Sorted by user id so serving can look users up with searchsorted
+    user_ids = np.asarray(user_ids).astype(str)
+    order = np.argsort(user_ids, kind="stable")
+
+    return {
+        "user_ids": user_ids[order],
+        "deltas": (W - prior)[order].astype(np.float32),
+        "global": prior,
+    }
+
+
+def personal_coefficients(personal: dict, user_ids: np.ndarray) -> np.ndarray:
+    """Current coefficients (intercept first) of user_ids; the global prior for unknown users."""
+    W = np.tile(personal["global"], (len(user_ids), 1))
+    if len(personal["user_ids"]):
+        pos = np.clip(np.searchsorted(personal["user_ids"], user_ids), 0, len(personal["user_ids"]) - 1)
+        known = personal["user_ids"][pos] == user_ids
+        W[known] += personal["deltas"][pos[known]]
+    return W
+
+
+def merge_personal_models(personal: dict, update: dict) -> dict:
+    """`personal` with the users in `update` replaced (or added); same global prior."""
+    keep = ~np.isin(personal["user_ids"], update["user_ids"])
+    user_ids = np.concatenate([personal["user_ids"][keep], update["user_ids"]])
+    deltas = np.concatenate([personal["deltas"][keep], update["deltas"]])
+    order = np.argsort(user_ids, kind="stable")
+    return {"user_ids": user_ids[order], "deltas": deltas[order], "global": personal["global"]}
+
+
+def save_personal_models(personal: dict, model_dir: str) -> None:
+    os.makedirs(model_dir, exist_ok=True)
+    np.savez(os.path.join(model_dir, PERSONAL_MODELS_FILE), **personal)
+
+
+def load_personal_models(model_dir: str = "models"):
+    """Returns the personal model arrays, or None when the file is not there."""
+    path = os.path.join(model_dir, PERSONAL_MODELS_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+# ----------------------------
+# 2. SCORING
+# ----------------------------
+
+def personal_probabilities(personal: dict, X: np.ndarray, user_idx: np.ndarray) -> np.ndarray:
+    """Per-user model probabilities for a batch of rows (for evaluation)."""
+    Z = np.column_stack([np.ones(len(X)), np.asarray(X, dtype=float)])
+    W = personal["global"] + personal["deltas"][np.asarray(user_idx)]
+    return _sigmoid(np.einsum("nd,nd->n", Z, W))
+
+
+def evaluate_personal_models(personal: dict, global_model, X: np.ndarray, y: np.ndarray,
+                             user_idx: np.ndarray) -> None:
+    from sklearn.metrics import roc_auc_score
+
+    p_global = global_model.predict_proba(X)[:, 1]
+    p_personal = personal_probabilities(personal, X, user_idx)
+
+    print("\n=========== Per-user Personalized Models ===========")
+    print("Users:", len(personal["user_ids"]))
+    print("ROC-AUC (global):", round(roc_auc_score(y, p_global), 4))
+    print("ROC-AUC (per-user):", round(roc_auc_score(y, p_personal), 4))
+    print(f"Size: {personal['deltas'].nbytes / 1e3:.1f} KB")
+
+
+def user_row(personal: dict, user_id: str):
+    """Row of `deltas` for user_id, or None for users without a personal model."""
+    if personal is None or user_id is None:
+        return None
+    user_ids = personal["user_ids"]
+    i = int(np.searchsorted(user_ids, user_id))
+    if i < len(user_ids) and user_ids[i] == user_id:
+        return i
+    return None
+
+
+def adjust_scores(personal: dict, user_ids, X_personal: np.ndarray, scores: np.ndarray):
+    """
+    Batch version of adjust_score: X_personal holds PERSONAL_FEATURES columns.
+    Returns (scores, personalized mask); users without a model keep their score.
+    """
+    scores = np.asarray(scores, dtype=float)
+    if personal is None or user_ids is None or len(personal["user_ids"]) == 0:
+        return scores, np.zeros(len(scores), dtype=bool)
+
+    known = personal["user_ids"]
+    user_ids = np.asarray(user_ids).astype(str)
+    rows = np.minimum(np.searchsorted(known, user_ids), len(known) - 1)
+    found = known[rows] == user_ids
+
+    Z = np.column_stack([np.ones(len(scores)), np.asarray(X_personal, dtype=float)])
+    delta = np.einsum("nd,nd->n", Z, personal["deltas"][rows].astype(float))
+    adjusted = np.where(found, _sigmoid(_logit(scores) + delta), scores)
+    return adjusted, found
+
+
+def adjust_score(personal: dict, user_id: str, feature_dict: dict, score: float):
+    """
+    Personalize an ensemble score: add the user's (personal - global) logit
+    difference for these deviations. Returns (score, personalized flag).
+    """
+    i = user_row(personal, user_id)
+    if i is None:
+        return score, False
+
+    x = np.array([1.0] + [feature_dict[f] for f in PERSONAL_FEATURES])
+    delta = float(personal["deltas"][i] @ x)
+    return float(_sigmoid(_logit(score) + delta)), True
@@ -0,0 +1,221 @@
+"""
+Multi-worker server with models shared between workers.
+
+`uvicorn app:app --workers N` starts every worker with a fresh interpreter, so
+each one imports inference.py and loads its own copy of every model. This
+launcher instead imports the app (and the models) once in a parent process,
+freezes the GC so collections do not dirty the shared pages, and forks N
+workers that all accept on one listening socket. Model memory is shared
+copy-on-write. MODEL_MMAP=1 additionally memory-maps the compact RandomForest
+arrays from disk, so those pages stay shared even when touched; the pickled
+LightGBM / XGBoost boosters are not numpy arrays and rely on copy-on-write only.
+
+Worker count defaults to the CPUs this container may actually use (affinity
+mask, capped by the cgroup CPU quota), not the host's core count. Each worker
+runs its models on MODEL_THREADS threads (BLAS / OpenMP / sklearn n_jobs), so N
+workers do not each start a thread per host core.
+
+The parent restarts workers that die and logs per-worker memory (RSS, PSS,
+shared / private) every MEMORY_REPORT_SECONDS; each worker also reports its own
+numbers on GET /health/memory.
+
+Run:
+  python serve.py                          # one worker per available CPU
+  python serve.py --workers 4 --port 8080
+"""
+
+import os
+import gc
+import math
+import time
+import signal
+import socket
+import argparse
+
+import uvicorn
+
+from memory import process_memory
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+HOST = "0.0.0.0"
+PORT = int(os.getenv("PORT", "8080"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "0"))        # 0: one per available CPU
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "1"))   # BLAS / OpenMP / n_jobs threads per worker
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"              # cgroup v2: "<quota> <period>" or "max <period>"
+CGROUP_V1_CPU_DIR = "/sys/fs/cgroup/cpu"               # cgroup v1: cpu.cfs_quota_us / cpu.cfs_period_us
+MEMORY_REPORT_SECONDS = float(os.getenv("MEMORY_REPORT_SECONDS", "300"))   # 0 disables
+FIRST_REPORT_SECONDS = 5.0
+RESTART_BACKOFF_SECONDS = 1.0
+
+# BLAS and OpenMP (LightGBM / XGBoost) size their pools from these once, when
+# loaded, so they must be set before the app import pulls in numpy and the models
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, str(MODEL_THREADS))
+
+
+# ----------------------------
+# 1. MEMORY ACCOUNTING
+# ----------------------------
+
+def print_memory_report(pids) -> None:
+    print(f"{'worker':>8} {'pid':>8} {'rss MB':>8} {'pss MB':>8} {'shared MB':>10} {'private MB':>11}")
+    totals = {"rss": 0, "pss": 0}
+    for name, pid in [("parent", os.getpid())] + [(str(i), pid) for i, pid in enumerate(pids)]:
+        m = process_memory(pid)
+        if not m:
+            continue
+        totals["rss"] += m["rss"]
+        totals["pss"] += m["pss"]
+        print(f"{name:>8} {pid:>8} {m['rss'] / 1e6:>8.1f} {m['pss'] / 1e6:>8.1f} "
+              f"{m['shared'] / 1e6:>10.1f} {m['private'] / 1e6:>11.1f}")
+    print(f"{'total':>8} {'':>8} {totals['rss'] / 1e6:>8.1f} {totals['pss'] / 1e6:>8.1f}"
+          "   (pss total = actual memory used)", flush=True)
+
+
+# ----------------------------
+# 2. CPU + THREAD SIZING
+# ----------------------------
+
+def _cgroup_cpu_quota(cpu_max: str = CGROUP_CPU_MAX, v1_dir: str = CGROUP_V1_CPU_DIR):
+    """CPU quota in cores (e.g. 1.5), or None when unlimited / not in a cgroup."""
+    try:
+        with open(cpu_max) as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(v1_dir, "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(v1_dir, "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus(cpu_max: str = CGROUP_CPU_MAX, v1_dir: str = CGROUP_V1_CPU_DIR) -> int:
+    """CPUs this process may use: affinity mask, capped by the cgroup quota (rounded up)."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        n = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota(cpu_max, v1_dir)
+    if quota:
+        n = min(n, math.ceil(quota))
+    return max(1, n)
+
+
+def pin_model_threads(models: dict, n_threads: int = MODEL_THREADS) -> None:
+    """sklearn / XGBoost estimators predict with n_threads jobs (RF is trained with n_jobs=-1)."""
+    for model in models.values():
+        if hasattr(model, "get_params") and "n_jobs" in model.get_params():
+            model.set_params(n_jobs=n_threads)
+
+
+# ----------------------------
+# 3. PRELOAD + FORK
+# ----------------------------
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Accepted connections inherit this: small responses go out immediately
+    # instead of waiting ~40 ms on Nagle + the client's delayed ACK
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(asgi_app, sock: socket.socket) -> None:
+    """Child process: serve on the inherited socket until SIGINT / SIGTERM."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    config = uvicorn.Config(asgi_app, log_level="warning", access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(asgi_app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(asgi_app, sock)
+        except BaseException:
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main(host: str = HOST, port: int = PORT, workers: int = WORKERS,
+         report_every: float = MEMORY_REPORT_SECONDS) -> None:
+    workers = workers or available_cpus()
+
+    # Preload: models are loaded here, once, before any fork
+    from app import app as asgi_app
+    from inference import models
+    pin_model_threads(models)
+
+    # Objects alive now are never collected, so GC passes in the workers
+    # do not write to (and un-share) the preloaded model pages
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(host, port)
+    pids = [_spawn(asgi_app, sock) for _ in range(workers)]
+    print(f"Serving on http://{host}:{port} with {workers} worker(s) x {MODEL_THREADS} model thread(s), models preloaded in pid {os.getpid()}", flush=True)
+
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    next_report = time.monotonic() + (FIRST_REPORT_SECONDS if report_every > 0 else float("inf"))
+    while not stopping:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid and pid in pids:
+            i = pids.index(pid)
+            print(f"Worker {i} (pid {pid}) exited with status {status}; restarting", flush=True)
+            time.sleep(RESTART_BACKOFF_SECONDS)
+            pids[i] = _spawn(asgi_app, sock)
+
+        if time.monotonic() >= next_report:
+            print_memory_report(pids)
+            next_report = time.monotonic() + report_every
+
+        time.sleep(0.5)
+
+    print("Shutting down workers...", flush=True)
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve app.py with N forked workers sharing preloaded models.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="default: WEB_CONCURRENCY or one per available CPU (affinity / cgroup quota)")
+    parser.add_argument("--memory-report", type=float, default=MEMORY_REPORT_SECONDS,
+                        help="seconds between per-worker memory reports (0 disables)")
+    args = parser.parse_args()
+
+    main(args.host, args.port, args.workers, args.memory_report)
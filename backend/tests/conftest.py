@@ -0,0 +1,82 @@
+"""
+Shared fixtures: small synthetic datasets, a tiny trained model set and a
+local Firebase stand-in, so the regression tests need neither the real data,
+nor models/ from train_models.py, nor the network.
+"""
+
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import local_firebase
+from features import FEATURES
+from generate_synthetic_data import generate_users, generate_daily_data, load_weather
+
+
+@pytest.fixture(scope="session")
+def synthetic_data():
+    """(users, daily rows) for 30 users x 60 days, offline weather."""
+    users = generate_users(30, seed=7)
+    weather = load_weather(datetime(2024, 1, 1), datetime(2024, 2, 29), mode="offline")
+    daily = generate_daily_data(users, weather, seed=11)
+    return users, daily
+
+
+@pytest.fixture(scope="session")
+def served_model_dir(tmp_path_factory):
+    """
+    Working directory with a models/ folder holding a tiny ensemble, as
+    inference.py loads it at import. Tests that import inference / app depend
+    on this fixture so the import happens inside it.
+    """
+    import lightgbm as lgb
+    import xgboost as xgb
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.ensemble import RandomForestClassifier
+    from ensemble import save_models
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, len(FEATURES)))
+    y = (X[:, 0] - X[:, 5] + rng.normal(size=600) > 0).astype(int)
+
+    scaler = StandardScaler().fit(X)
+    Xs = scaler.transform(X)
+    models = {
+        "scaler": scaler,
+        "logreg": LogisticRegression(max_iter=200).fit(Xs, y),
+        "rf": RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(X, y),
+        "xgb": xgb.XGBClassifier(n_estimators=10, max_depth=3).fit(Xs, y),
+        "lgb": lgb.train({"objective": "binary", "verbose": -1}, lgb.Dataset(Xs, y), num_boost_round=10),
+    }
+
+    root = tmp_path_factory.mktemp("served")
+    save_models(models, str(root / "models"))
+
+    cwd = os.getcwd()
+    os.chdir(root)
+    yield root
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def firebase(monkeypatch):
+    """start(data): serve `data` from local_firebase.py on a free port and point firebase_client at it."""
+    import firebase_client
+
+    def start(data: dict):
+        server = local_firebase.serve(0, data)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(firebase_client, "FIREBASE_DB_URL", f"http://127.0.0.1:{server.server_address[1]}")
+        return server
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
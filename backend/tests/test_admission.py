@@ -0,0 +1,102 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def _blocker():
+    """A job that holds its inference slot until released."""
+    release = threading.Event()
+    return release, (lambda: release.wait(5) and "done")
+
+
+def test_queue_full_is_429_and_deadline_is_503():
+    async def scenario():
+        ac = AdmissionController(max_in_flight=1, queue_size=1, queue_timeout=0.2)
+        release, job = _blocker()
+
+        running = asyncio.create_task(ac.run(job))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(ac.run(job))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(Rejected) as full:
+            await ac.run(job)
+        assert full.value.status_code == 429
+        assert full.value.retry_after >= 1
+
+        with pytest.raises(Rejected) as late:
+            await queued
+        assert late.value.status_code == 503
+
+        release.set()
+        assert await running == "done"
+        return ac.metrics()
+
+    m = asyncio.run(scenario())
+    assert m["rejected_queue_full"] == 1
+    assert m["rejected_deadline"] == 1
+    assert m["completed"] == 1
+    assert m["in_flight"] == 0 and m["queue_depth"] == 0
+
+
+def test_queued_request_runs_when_a_slot_frees():
+    async def scenario():
+        ac = AdmissionController(max_in_flight=1, queue_size=4, queue_timeout=2.0)
+        release, job = _blocker()
+        running = asyncio.create_task(ac.run(job))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(ac.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        assert ac.metrics()["queue_depth"] == 1
+
+        release.set()
+        return await running, await queued, ac.metrics()
+
+    first, second, m = asyncio.run(scenario())
+    assert (first, second) == ("done", "queued")
+    assert m["admitted"] == 2 and m["max_queue_depth"] == 1
+
+
+def test_cancelled_waiter_does_not_lose_its_slot():
+    async def scenario():
+        ac = AdmissionController(max_in_flight=1, queue_size=4, queue_timeout=2.0)
+        ac._free = 0                # the only slot is taken
+        waiter = asyncio.create_task(ac.run(lambda: "never"))
+        await asyncio.sleep(0.05)
+        assert ac.metrics()["queue_depth"] == 1
+
+        # The slot is handed to the waiter, which is cancelled before it resumes
+        ac._release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        # The slot passed back: a new request is admitted straight away
+        return await asyncio.wait_for(ac.run(lambda: "after"), timeout=1.0), ac
+
+    result, ac = asyncio.run(scenario())
+    assert result == "after"
+    assert ac._free == 1 and not ac._waiters and ac.queued == 0
+
+
+def test_disconnect_keeps_slot_until_inference_finishes():
+    async def scenario():
+        ac = AdmissionController(max_in_flight=1, queue_size=4, queue_timeout=2.0)
+        release, job = _blocker()
+        running = asyncio.create_task(ac.run(job))
+        await asyncio.sleep(0.05)
+
+        running.cancel()            # client went away; the thread is still busy
+        await asyncio.sleep(0.05)
+        busy = ac.metrics()["in_flight"]
+
+        release.set()
+        await asyncio.sleep(0.1)
+        return busy, ac.metrics()
+
+    busy, m = asyncio.run(scenario())
+    assert busy == 1
+    assert m["in_flight"] == 0 and m["completed"] == 1
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+import requests
+
+from load_test import build_event_store
+
+
+@pytest.fixture
+def batch_score(served_model_dir, tmp_path, monkeypatch):
+    import batch_score
+    monkeypatch.setattr(batch_score, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(batch_score, "RETRY_BACKOFF_SECONDS", 0.0)
+    return batch_score
+
+
+@pytest.fixture
+def reads(batch_score, monkeypatch):
+    """User ids whose events were read, and the most reads seen in flight at once."""
+    log = {"users": [], "max_in_flight": 0}
+    in_flight, lock = [0], threading.Lock()
+    get_events = batch_score.get_recent_user_events
+
+    def logged(user_id, limit):
+        with lock:
+            in_flight[0] += 1
+            log["max_in_flight"] = max(log["max_in_flight"], in_flight[0])
+        try:
+            return get_events(user_id, limit)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+                log["users"].append(user_id)
+
+    monkeypatch.setattr(batch_score, "get_recent_user_events", logged)
+    return log
+
+
+def _predictions(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/users/predictions.json"
+    return requests.get(url).json() or {}
+
+
+def test_interrupted_run_resumes_after_checkpoint(batch_score, firebase, reads, monkeypatch):
+    tree = build_event_store(n_users=50, n_events=8, seed=3)
+    tree["events"]["old_user"] = {"2020-01-01T00_00_00Z": {"timestamp": "2020-01-01T00:00:00Z", "sleep_hours": 7}}
+    server = firebase(tree)
+
+    # Firebase writes fail from the third page on: the run stops after two pages
+    write_bulk, writes = batch_score.write_bulk, []
+
+    def flaky_write(updates):
+        writes.append(len(updates))
+        if len(writes) > 2:
+            raise requests.ConnectionError("write failed")
+        write_bulk(updates)
+
+    monkeypatch.setattr(batch_score, "write_bulk", flaky_write)
+    with pytest.raises(requests.ConnectionError):
+        batch_score.run("resume-test", batch_users=10, concurrency=3)
+
+    state = batch_score.load_checkpoint("resume-test")
+    assert state["completed_at"] is None
+    assert state["users_done"] == 20
+    checkpointed = state["last_user_id"]
+    assert 0 < reads["max_in_flight"] <= 3
+
+    # Resume: paging starts after the checkpointed user, nothing earlier is read again
+    reads["users"].clear()
+    monkeypatch.setattr(batch_score, "write_bulk", write_bulk)
+    state = batch_score.run("resume-test", batch_users=10, concurrency=3)
+
+    assert all(u > checkpointed for u in reads["users"]) and len(reads["users"]) == 31
+
+    assert state["completed_at"] is not None
+    assert state["users_done"] == 51
+    assert state["counts"] == {"scored": 50, "inactive": 1, "incomplete": 0}
+
+    predictions = _predictions(server)
+    assert sorted(predictions) == sorted(u for u in tree["events"] if u != "old_user")
+    assert all(len(by_run) == 1 for by_run in predictions.values())     # re-scored page overwritten
+
+    # A completed run is not scored again
+    reads["users"].clear()
+    batch_score.run("resume-test", batch_users=10)
+    assert reads["users"] == []
+
+
+def test_recent_events_follow_timestamps_not_keys(served_model_dir, firebase):
+    from firebase_client import get_recent_user_events
+
+    # Push-id style keys, written out of order (a late sync of older events)
+    events = {
+        "-b": {"timestamp": "2025-11-03T08:00:00Z", "sleep_hours": 3},
+        "-a": {"timestamp": "2025-11-05T08:00:00.500Z", "sleep_hours": 5},
+        "-c": {"timestamp": "2025-11-01T08:00:00Z", "sleep_hours": 1},
+        "-d": {"timestamp": "2025-11-04T09:00:00+01:00", "sleep_hours": 4},
+    }
+    firebase({"events": {"u1": events}})
+
+    recent = get_recent_user_events("u1", 3)
+    assert [e["sleep_hours"] for e in recent] == [3, 4, 5]
+    assert [e["id"] for e in recent] == ["-b", "-d", "-a"]
+
+
+def test_limit_and_dry_run(batch_score, firebase):
+    server = firebase(build_event_store(n_users=30, n_events=5, seed=4))
+
+    state = batch_score.run("dry", batch_users=8, limit=20, dry_run=True)
+
+    assert state["users_done"] == 20
+    assert state["counts"]["scored"] == 20
+    assert _predictions(server) == {}
+    assert batch_score.load_checkpoint("dry") is None
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from compact_forest import QUANTIZATION_TOLERANCE, export_compact_forest, load_compact_forest
+
+
+@pytest.fixture(scope="module")
+def forest_data():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(3_000, 8))
+    y = (X[:, 0] + 0.5 * X[:, 3] ** 2 + rng.normal(scale=0.5, size=len(X)) > 0.5).astype(int)
+    rf = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+    return rf, X, rng.normal(size=(2_000, 8))
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_compact_forest_matches_sklearn(forest_data, tmp_path, mmap):
+    rf, X_train, X_new = forest_data
+    export_compact_forest(rf, str(tmp_path / "rf"), X_check=X_train[:500])
+    compact = load_compact_forest(str(tmp_path / "rf"), mmap=mmap)
+
+    for X in (X_train, X_new):
+        expected = rf.predict_proba(X)
+        got = compact.predict_proba(X)
+        assert got.shape == expected.shape
+        np.testing.assert_allclose(got, expected, rtol=0, atol=QUANTIZATION_TOLERANCE)
+        np.testing.assert_allclose(got.sum(axis=1), 1.0)
+
+
+def test_compact_forest_thresholds_are_exact_for_float32_inputs(forest_data, tmp_path):
+    rf, _, _ = forest_data
+    # Inputs sitting exactly on the split thresholds must go the same way as in sklearn
+    thresholds = np.concatenate([t.tree_.threshold[t.tree_.feature >= 0] for t in rf.estimators_])
+    X = np.tile(thresholds[:400, None], (1, 8)).astype(np.float32).astype(float)
+
+    export_compact_forest(rf, str(tmp_path / "rf"), X_check=X)
+    compact = load_compact_forest(str(tmp_path / "rf"))
+    np.testing.assert_allclose(compact.predict_proba(X), rf.predict_proba(X), rtol=0, atol=QUANTIZATION_TOLERANCE)
+
+
+def test_reexport_does_not_disturb_a_mapped_forest(forest_data, tmp_path):
+    rf, X_train, X_new = forest_data
+    path = str(tmp_path / "rf")
+    export_compact_forest(rf, path)
+    live = load_compact_forest(path, mmap=True)
+    expected = live.predict_proba(X_new)
+
+    # Retrain + re-export while a worker still has the old arrays mapped
+    other = RandomForestClassifier(n_estimators=5, max_depth=3, random_state=1).fit(X_train, 1 - rf.predict(X_train))
+    export_compact_forest(other, path)
+
+    np.testing.assert_array_equal(live.predict_proba(X_new), expected)
+    np.testing.assert_allclose(load_compact_forest(path).predict_proba(X_new), other.predict_proba(X_new),
+                               rtol=0, atol=QUANTIZATION_TOLERANCE)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["rf"]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from feature_store import load_feature_matrix, build_feature_matrix
+
+
+def _write(path, users, daily):
+    path.mkdir(exist_ok=True)
+    users.to_csv(path / "users.csv", index=False)
+    daily.to_csv(path / "data.csv", index=False)
+    return str(path / "data.csv"), str(path / "users.csv")
+
+
+def test_incremental_build_matches_full_rebuild(synthetic_data, tmp_path, capsys):
+    users, daily = synthetic_data
+    cache_dir = str(tmp_path / "cache")
+
+    # Cache an older snapshot: the last 10 days missing
+    last_days = daily["date"] >= daily["date"].max() - np.timedelta64(9, "D")
+    data_path, users_path = _write(tmp_path / "old", users, daily[~last_days])
+    load_feature_matrix(data_path, users_path, cache_dir)
+
+    # New days appended, one mid-history row corrected, one user's history rewritten
+    current = daily.copy()
+    current.loc[current.index[100], "sleep_hours"] += 1.5
+    current.loc[current["user_id"] == current["user_id"].iloc[-1], "hrv"] *= 0.9
+    data_path, users_path = _write(tmp_path / "new", users, current)
+
+    capsys.readouterr()
+    X_inc, y_inc, keys_inc = load_feature_matrix(data_path, users_path, cache_dir, mmap=False, return_keys=True)
+    assert "incremental" in capsys.readouterr().out
+
+    X_full, y_full, keys_full = build_feature_matrix(data_path, users_path, str(tmp_path / "fresh"),
+                                                     return_keys=True)
+
+    np.testing.assert_array_equal(keys_inc, keys_full)
+    np.testing.assert_array_equal(y_inc, y_full)
+    np.testing.assert_allclose(X_inc, X_full, rtol=0, atol=1e-9)
+
+
+def test_unchanged_source_is_a_cache_hit(synthetic_data, tmp_path, capsys):
+    users, daily = synthetic_data
+    data_path, users_path = _write(tmp_path, users, daily)
+    cache_dir = str(tmp_path / "cache")
+
+    X_first, _ = load_feature_matrix(data_path, users_path, cache_dir, mmap=False)
+    capsys.readouterr()
+    X_again, _ = load_feature_matrix(data_path, users_path, cache_dir)
+
+    assert "cache hit" in capsys.readouterr().out
+    np.testing.assert_array_equal(X_first, X_again)
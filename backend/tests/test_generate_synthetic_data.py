@@ -0,0 +1,104 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from generate_synthetic_data import generate_users, generate_daily_data, load_weather
+
+
+@pytest.fixture(scope="module")
+def weather():
+    return load_weather(datetime(2024, 1, 1), datetime(2024, 3, 31), mode="offline")
+
+
+def test_same_seed_same_data(weather):
+    users = generate_users(25, seed=3)
+    pd.testing.assert_frame_equal(users, generate_users(25, seed=3))
+
+    first = generate_daily_data(users, weather, seed=5)
+    pd.testing.assert_frame_equal(first, generate_daily_data(users, weather, seed=5))
+    assert not first["sleep_hours"].equals(generate_daily_data(users, weather, seed=6)["sleep_hours"])
+
+
+def test_rows_are_user_major_and_sliced_to_target(weather):
+    users = generate_users(25, seed=3)
+    daily = generate_daily_data(users, weather, seed=5)
+
+    assert len(daily) == 25 * weather["date"].nunique()
+    ordered = daily.sort_values(["user_id", "date"], kind="stable")
+    np.testing.assert_array_equal(daily.index, ordered.index)
+    assert not daily[["user_id", "date"]].duplicated().any()
+
+    sliced = generate_daily_data(users, weather, target_rows=1_000, seed=5)
+    assert len(sliced) == 1_000
+
+
+def test_targets_are_binary_and_features_in_range(weather):
+    daily = generate_daily_data(generate_users(25, seed=3), weather, seed=5)
+
+    assert set(daily["migraine_next_24h"].unique()) <= {0, 1}
+    assert daily["sleep_hours"].between(0, 24).all()
+    assert (daily["screen_time_total_hours"] >= 0).all()
+
+
+# ----------------------------
+# Sharded generation (manifest)
+# ----------------------------
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    from generate_synthetic_data import generate_sharded
+    monkeypatch.chdir(tmp_path)
+
+    def generate(out: str, workers: int = 1):
+        return generate_sharded(4_000, n_shards=3, workers=workers, out_dir=str(tmp_path / out),
+                                chunk_users=2, weather_mode="offline")
+    return generate
+
+
+def test_shards_do_not_depend_on_worker_count(shards):
+    one = shards("a", workers=1)
+    two = shards("b", workers=2)
+
+    assert [s["sha1"] for s in one["shards"]] == [s["sha1"] for s in two["shards"]]
+    assert one["n_rows"] == sum(s["n_rows"] for s in one["shards"]) >= 4_000
+    assert isinstance(one["shards"][0]["first_id"], int)
+
+
+def test_manifest_check_rejects_changed_shards(shards, tmp_path):
+    from feature_store import read_manifest, load_feature_matrix
+
+    manifest_path = str(tmp_path / "a" / "manifest.json")
+    shards("a")
+    X, y = load_feature_matrix(manifest_path, cache_dir=str(tmp_path / "cache"), mmap=False)
+    assert len(X) == len(y) > 0
+
+    # Same content, new mtime (e.g. a copy): accepted after re-hashing
+    part = str(tmp_path / "a" / "part-00001.csv")
+    os.utime(part, ns=(0, 0))
+    read_manifest(manifest_path)
+
+    # Same size, different content: caught by the sha1
+    with open(part, "rb") as f:
+        data = bytearray(f.read())
+    data[-2] = ord("7") if data[-2] != ord("7") else ord("8")
+    with open(part, "wb") as f:
+        f.write(bytes(data))
+    with pytest.raises(ValueError, match="sha1"):
+        read_manifest(manifest_path)
+
+    with open(part, "a") as f:
+        f.write("\n")
+    with pytest.raises(ValueError, match="bytes"):
+        read_manifest(manifest_path)
+
+    os.remove(part)
+    with pytest.raises(ValueError, match="missing"):
+        read_manifest(manifest_path)
+
+
+def test_no_partial_files_left_behind(shards, tmp_path):
+    shards("a")
+    assert not [p for p in (tmp_path / "a").iterdir() if p.name.endswith(".tmp")]
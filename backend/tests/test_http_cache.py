@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+from http_cache import key_timestamp, version_headers
+from load_test import build_event_store
+
+
+@pytest.fixture
+def client(served_model_dir):
+    from app import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def store(firebase):
+    tree = build_event_store(n_users=2, n_events=20, seed=5)
+    server = firebase(tree)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def add_event(user_id: str, key: str, event: dict):
+        requests.patch(f"{base}/events/{user_id}.json", json={key: event}).raise_for_status()
+
+    return tree, add_event
+
+
+@pytest.mark.parametrize("resource", ["events", "summary"])
+def test_if_none_match_revalidates_with_304(client, store, resource):
+    url = f"/users/loadtest_user_0/{resource}"
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+    # A new event changes the version: full response with a new ETag
+    _, add_event = store
+    add_event("loadtest_user_0", "2099-01-01T00_00_00Z", {"timestamp": "2099-01-01T00:00:00Z", "sleep_hours": 6.0})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_if_modified_since_revalidates_with_304(client, store):
+    first = client.get("/users/loadtest_user_1/events")
+    last_modified = first.headers["last-modified"]
+
+    assert client.get("/users/loadtest_user_1/events",
+                      headers={"If-Modified-Since": last_modified}).status_code == 304
+    # If-None-Match wins over If-Modified-Since
+    assert client.get("/users/loadtest_user_1/events",
+                      headers={"If-Modified-Since": last_modified, "If-None-Match": 'W/"0-x"'}).status_code == 200
+
+
+def test_etags_differ_per_resource_and_user(client, store):
+    tags = {client.get(f"/users/{u}/{r}").headers["etag"]
+            for u in ("loadtest_user_0", "loadtest_user_1") for r in ("events", "summary")}
+    assert len(tags) == 4
+
+
+def test_large_history_is_gzipped(client, store):
+    response = client.get("/users/loadtest_user_0/events", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx decodes transparently; the body is the same JSON
+    assert response.json()["events_count"] == 20
+
+
+@pytest.mark.parametrize("key", [
+    "2025-11-16T02:48:23.811Z",          # raw toISOString(), as n8n keys events
+    "2025-11-16T02_48_23_811Z",          # [:.] -> _ form
+    "2025-11-16T04:48:23.811+02:00",
+    "2025-11-16T04_48_23_811+02_00",
+])
+def test_key_timestamp_formats(key):
+    assert key_timestamp(key) == datetime(2025, 11, 16, 2, 48, 23, 811000, tzinfo=timezone.utc)
+
+
+def test_non_timestamp_keys_have_no_last_modified():
+    assert key_timestamp("-NxYz12abcDEF") is None
+    assert key_timestamp(None) is None
+    headers = version_headers("events", "u1", 3, "-NxYz12abcDEF")
+    assert "Last-Modified" not in headers and headers["ETag"].startswith('W/"3-')
+
+
+def test_last_modified_from_raw_iso_event_key(client, store):
+    _, add_event = store
+    add_event("loadtest_user_1", "2099-01-01T00:00:00.000Z", {"timestamp": "2099-01-01T00:00:00.000Z",
+                                                              "sleep_hours": 6.0})
+    response = client.get("/users/loadtest_user_1/events")
+    assert response.headers["last-modified"] == "Thu, 01 Jan 2099 00:00:00 GMT"
+    assert client.get("/users/loadtest_user_1/events",
+                      headers={"If-Modified-Since": response.headers["last-modified"]}).status_code == 304
@@ -0,0 +1,120 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ensemble import MODEL_FILES, META_FILE, TRAINED_KEYS_FILE
+from compact_forest import COMPACT_RF_DIR
+from incremental_train import AUC_TOLERANCE, auc_change, auc_regressions, promote
+from personal_models import fit_personal_models, merge_personal_models, personal_coefficients
+
+
+def _result(before: float, after: float, change: dict = None) -> dict:
+    result = {"before": {"ensemble": {"roc_auc": before}}, "after": {"ensemble": {"roc_auc": after}}}
+    if change is not None:
+        result["auc_change"] = change
+    return result
+
+
+def _version(path, tag: str, evaluation: dict = None) -> str:
+    """A model version directory whose files just contain `tag`."""
+    os.makedirs(os.path.join(path, COMPACT_RF_DIR), exist_ok=True)
+    for fname in list(MODEL_FILES.values()) + [TRAINED_KEYS_FILE]:
+        with open(os.path.join(path, fname), "w") as f:
+            f.write(tag)
+    with open(os.path.join(path, COMPACT_RF_DIR, "value.npy"), "w") as f:
+        f.write(tag)
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump({"version": tag, "evaluation": evaluation or {}}, f)
+    return str(path)
+
+
+def _served(model_dir) -> str:
+    with open(os.path.join(model_dir, MODEL_FILES["lgb"])) as f:
+        return f.read()
+
+
+def test_small_or_noisy_auc_drops_do_not_block_promotion():
+    # Within the tolerance, even if significant
+    assert auc_regressions({"old_rows": _result(0.7549, 0.7511, {"delta": -0.0038, "ci_low": -0.005,
+                                                                  "ci_high": -0.002})}) == []
+    # Beyond the tolerance, but inside the holdout's noise
+    assert auc_regressions({"new_rows": _result(0.75, 0.73, {"delta": -0.02, "ci_low": -0.06,
+                                                              "ci_high": 0.01})}) == []
+    # Beyond the tolerance and clearly below zero
+    problems = auc_regressions({"new_rows": _result(0.75, 0.73, {"delta": -0.02, "ci_low": -0.03,
+                                                                  "ci_high": -0.01})})
+    assert len(problems) == 1 and problems[0].startswith("new_rows")
+    # Evaluations without a bootstrap interval fall back to the tolerance alone
+    assert auc_regressions({"old_rows": _result(0.75, 0.75 - 2 * AUC_TOLERANCE)})
+    assert auc_regressions({"old_rows": _result(0.75, None)}) == []
+
+
+def test_auc_change_interval():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 2_000)
+    good = y + rng.normal(scale=0.8, size=len(y))
+
+    same = auc_change(y, good, good)
+    assert same["delta"] == 0 and same["ci_low"] == 0 and same["ci_high"] == 0
+
+    worse = auc_change(y, good, rng.normal(size=len(y)))
+    assert worse["delta"] < -0.2 and worse["ci_high"] < 0
+
+    assert auc_change(np.zeros(10), good[:10], good[:10]) is None
+
+
+def test_promote_refuses_regression_unless_forced(tmp_path):
+    model_dir = _version(tmp_path / "models", "v1.0")
+    regression = {"old_rows": _result(0.75, 0.70, {"delta": -0.05, "ci_low": -0.06, "ci_high": -0.04})}
+    version_dir = _version(tmp_path / "versions" / "v1.1", "v1.1", regression)
+
+    assert promote(version_dir, model_dir) is False
+    assert _served(model_dir) == "v1.0"
+
+    assert promote(version_dir, model_dir, force=True) is True
+    assert _served(model_dir) == "v1.1"
+
+
+def test_promote_swaps_in_every_file(tmp_path):
+    model_dir = _version(tmp_path / "models", "v1.0")
+    improved = {"new_rows": _result(0.70, 0.72, {"delta": 0.02, "ci_low": 0.01, "ci_high": 0.03})}
+    version_dir = _version(tmp_path / "versions" / "v1.1", "v1.1", improved)
+
+    assert promote(version_dir, model_dir) is True
+    for fname in list(MODEL_FILES.values()) + [TRAINED_KEYS_FILE]:
+        with open(os.path.join(model_dir, fname)) as f:
+            assert f.read() == "v1.1"
+    with open(os.path.join(model_dir, COMPACT_RF_DIR, "value.npy")) as f:
+        assert f.read() == "v1.1"
+    assert not [n for n in os.listdir(model_dir) if n.endswith(".tmp")]
+
+
+def test_personal_update_touches_only_users_with_new_rows():
+    rng = np.random.default_rng(1)
+    user_ids = np.array(["u0", "u1", "u2"])
+    X = rng.normal(size=(600, 4))
+    user_idx = rng.integers(0, 3, len(X))
+    y = (X[:, 0] * (user_idx + 1) + rng.normal(size=len(X)) > 0).astype(int)
+    prior = np.array([0.0, 0.5, 0.0, 0.0, 0.0])
+    personal = fit_personal_models(X, y, user_idx, user_ids, prior)
+
+    # New rows for u1 only: an update from u1's current model, merged back
+    X_new = rng.normal(size=(50, 4))
+    y_new = (X_new[:, 0] > 0).astype(int)
+    start = personal_coefficients(personal, np.array(["u1"]))
+    update = fit_personal_models(X_new, y_new, np.zeros(50, dtype=int), np.array(["u1"]), personal["global"],
+                                 user_prior=start)
+    merged = merge_personal_models(personal, update)
+
+    np.testing.assert_array_equal(merged["user_ids"], user_ids)
+    np.testing.assert_array_equal(merged["deltas"][[0, 2]], personal["deltas"][[0, 2]])
+    assert not np.allclose(merged["deltas"][1], personal["deltas"][1])
+    # Shrunk toward u1's own model, so it moves less than a fresh fit from the global prior would
+    fresh = fit_personal_models(X_new, y_new, np.zeros(50, dtype=int), np.array(["u1"]), personal["global"])
+    moved = np.abs(merged["deltas"][1] - personal["deltas"][1]).sum()
+    assert moved < np.abs(fresh["deltas"][0] - personal["deltas"][1]).sum()
+
+    # Unknown users start from the global prior
+    np.testing.assert_allclose(personal_coefficients(personal, np.array(["new"]))[0], personal["global"])
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import requests
+
+import local_firebase
+from load_test import build_event_store, summarize
+
+
+def test_failed_requests_are_reported_separately():
+    samples = [("predict", 200, 0.010)] * 90 + [("predict", 503, 0.001)] * 5 + [("events", 0, 0.500)] * 5
+    s = summarize(samples, duration=1.0, concurrency=4)
+
+    assert s["goodput_rps"] == 90 and s["throughput_rps"] == 100
+    assert s["error_rate"] == 0.1 and s["shed_rate"] == 0.05
+    assert s["p99_ms"] == 10.0                    # successes only
+    assert s["failed"]["p50_ms"] is not None and s["failed"]["max_ms"] == 500.0
+    assert s["endpoints"]["predict"]["failed"]["p99_ms"] == 1.0
+    assert summarize([("predict", 200, 0.01)], 1.0, 1)["failed"]["p50_ms"] is None
+
+
+def test_stand_in_answers_kept_alive_requests_without_delay():
+    server = local_firebase.serve(0, build_event_store(n_users=2, n_events=30))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/events/loadtest_user_0.json"
+    try:
+        with requests.Session() as session:
+            session.get(url).raise_for_status()
+            t0 = time.perf_counter()
+            for _ in range(10):
+                assert len(session.get(url).json()) == 30
+            # A response split over two writes waits ~40 ms per request on Nagle + delayed ACK
+            assert (time.perf_counter() - t0) / 10 < 0.02
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,52 @@
+import os
+import socket
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from serve import _bind, available_cpus, pin_model_threads
+
+
+def test_workers_follow_the_cgroup_quota(tmp_path):
+    affinity = len(os.sched_getaffinity(0))
+    cpu_max = tmp_path / "cpu.max"
+    v1_dir = tmp_path / "v1"
+    v1_dir.mkdir()
+
+    assert available_cpus(str(cpu_max), str(v1_dir)) == affinity   # no cgroup files
+
+    cpu_max.write_text("max 100000\n")
+    assert available_cpus(str(cpu_max), str(v1_dir)) == affinity
+
+    cpu_max.write_text("50000 100000\n")      # half a core still gets one worker
+    assert available_cpus(str(cpu_max), str(v1_dir)) == 1
+
+    cpu_max.unlink()
+    (v1_dir / "cpu.cfs_quota_us").write_text("100000\n")
+    (v1_dir / "cpu.cfs_period_us").write_text("100000\n")
+    assert available_cpus(str(cpu_max), str(v1_dir)) == 1
+    (v1_dir / "cpu.cfs_quota_us").write_text("-1\n")
+    assert available_cpus(str(cpu_max), str(v1_dir)) == affinity
+
+
+def test_models_predict_single_threaded():
+    X = np.random.default_rng(0).normal(size=(50, 3))
+    rf = RandomForestClassifier(n_estimators=3, n_jobs=-1).fit(X, X[:, 0] > 0)
+    models = {"scaler": StandardScaler().fit(X), "rf": rf, "lgb": object()}
+
+    pin_model_threads(models, 1)
+    assert rf.n_jobs == 1
+
+
+def test_listening_socket_disables_nagle():
+    sock = _bind("127.0.0.1", 0)
+    try:
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        client = socket.create_connection(sock.getsockname())
+        conn, _ = sock.accept()
+        assert conn.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        conn.close()
+        client.close()
+    finally:
+        sock.close()
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import weather
+from weather import WEATHER_COLS, get_daily_weather, missing_ranges
+
+
+def _days(start: str, end: str, value: float) -> pd.DataFrame:
+    df = pd.DataFrame({"date": pd.date_range(start, end, freq="D")})
+    for col in WEATHER_COLS:
+        df[col] = value
+    return df
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("network used")
+    monkeypatch.setattr(weather, "fetch_fmi_weather_daily", fail)
+
+
+def test_offline_uses_cache_then_fixture_then_synthetic(tmp_path, monkeypatch, no_network):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "fixtures" / "weather").mkdir(parents=True)
+    _days("2024-01-01", "2024-01-20", 2.0).to_csv(tmp_path / "fixtures" / "weather" / "espoo.csv", index=False)
+    cache_dir = str(tmp_path / "cache")
+    weather._write_cache(_days("2024-01-01", "2024-01-10", 1.0), "Espoo", cache_dir)
+
+    df = get_daily_weather("Espoo", datetime(2024, 1, 1), datetime(2024, 1, 31), mode="offline",
+                           cache_dir=cache_dir)
+
+    assert len(df) == 31 and not df[WEATHER_COLS].isna().any().any()
+    assert (df["temperature"][:10] == 1.0).all()
+    assert (df["temperature"][10:20] == 2.0).all()
+    synthetic = weather.synthetic_weather_daily(datetime(2024, 1, 21), datetime(2024, 1, 31), "Espoo")
+    np.testing.assert_allclose(df["temperature"][20:], synthetic["temperature"])
+    # Offline never writes to the cache
+    assert len(weather._read_cache("Espoo", cache_dir)) == 10
+
+
+def test_synthetic_weather_does_not_depend_on_range():
+    long = weather.synthetic_weather_daily(datetime(2024, 1, 1), datetime(2024, 3, 31), "Oulu")
+    short = weather.synthetic_weather_daily(datetime(2024, 2, 1), datetime(2024, 2, 10), "Oulu")
+    pd.testing.assert_frame_equal(short, long[long["date"].between("2024-02-01", "2024-02-10")]
+                                  .reset_index(drop=True))
+
+
+def test_empty_fmi_days_are_not_cached(tmp_path, monkeypatch):
+    calls = []
+
+    def fetch(start, end, place):
+        calls.append((start, end))
+        df = _days(start, end, 3.0)
+        df.loc[df["date"] >= "2024-01-06", WEATHER_COLS] = np.nan   # FMI answered, but without values
+        return df
+
+    monkeypatch.setattr(weather, "fetch_fmi_weather_daily", fetch)
+    cache_dir = str(tmp_path / "cache")
+
+    df = get_daily_weather("Turku", datetime(2024, 1, 1), datetime(2024, 1, 10), mode="online",
+                           cache_dir=cache_dir)
+    assert df["temperature"][:5].eq(3.0).all() and df["temperature"][5:].isna().all()
+    cached = weather._read_cache("Turku", cache_dir)
+    assert list(cached["date"]) == list(pd.date_range("2024-01-01", "2024-01-05"))
+
+    # The empty days are asked for again; auto fills them offline without caching them
+    df = get_daily_weather("Turku", datetime(2024, 1, 1), datetime(2024, 1, 10), mode="auto",
+                           cache_dir=cache_dir)
+    assert calls[-1] == (pd.Timestamp("2024-01-06"), pd.Timestamp("2024-01-10"))
+    assert not df[WEATHER_COLS].isna().any().any()
+    assert len(weather._read_cache("Turku", cache_dir)) == 5
+
+
+def test_missing_ranges():
+    dates = pd.date_range("2024-01-01", "2024-01-10")
+    have = pd.DatetimeIndex(["2024-01-03", "2024-01-04", "2024-01-08"])
+    assert missing_ranges(dates, have) == [
+        (pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-02")),
+        (pd.Timestamp("2024-01-05"), pd.Timestamp("2024-01-07")),
+        (pd.Timestamp("2024-01-09"), pd.Timestamp("2024-01-10")),
+    ]
+    assert missing_ranges(dates, dates) == []
@@ -1,6 +1,7 @@
 import os
+from datetime import datetime, timezone
+
 import numpy as np
-import pandas as pd
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
@@ -13,7 +14,18 @@ import joblib
 
 from imblearn.over_sampling import SMOTE
 
-from features import FEATURES 
+from features import FEATURES
+from feature_store import DATA_PATH, USERS_PATH, load_feature_matrix, load_user_index
+from personal_models import (
+    PERSONAL_FEATURES, global_coefficients, fit_personal_models, save_personal_models, evaluate_personal_models,
+)
+from ensemble import (
+    DEFAULT_MODEL_VERSION, DISTILLED_FILE, TRAINED_KEYS_FILE, RISK_LEVELS,
+    save_model_meta, serving_scores, scores_to_risk_levels,
+)
+from drift import reference_rows, build_reference, save_drift_reference
+from distill import distill_ensemble, print_report
+from compact_forest import COMPACT_RF_DIR, export_compact_forest
 
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score
 
@@ -43,50 +55,16 @@ def evaluate_model(name, model, X_valid, y_valid, scaled=False, scaler=None):
     print("ROC-AUC:", round(roc_auc_score(y_valid, probs), 4))
 
 # CONFIG
-DATA_PATH = "data/synthetic_migraine_data.csv"
-USERS_PATH = "data/users.csv"
 MODEL_DIR = "models"
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
-# LOAD DATA
-print("Loading data...")
-df = pd.read_csv(DATA_PATH)
-users_df = pd.read_csv(USERS_PATH)
-
-# Fix date format
-df["date"] = pd.to_datetime(df["date"])
-
-# Merge personalization baselines
-df = df.merge(users_df, on="user_id", how="left")
-
-# FEATURE ENGINEERING
-print("Feature engineering...")
-
-df["sleep_deviation"] = df["sleep_hours"] - df["baseline_sleep"]
-df["hrv_deviation"] = df["hrv"] - df["baseline_hrv"]
-df["screen_deviation"] = df["screen_time_total_hours"] - df["baseline_screen"]
-df["meeting_deviation"] = df["meeting_hours"] - df["baseline_meeting_hours"]
-
-df["pressure_change_abs"] = df["pressure_change"].abs()
-
-df = df.sort_values(["user_id", "date"])
-
-for col in ["sleep_hours", "hrv", "screen_time_total_hours", "meeting_hours"]:
-    df[f"{col}_3d_avg"] = (
-        df.groupby("user_id")[col]
-        .rolling(3)
-        .mean()
-        .reset_index(level=0, drop=True)
-    )
+# LOAD DATA + FEATURE ENGINEERING
+# Served from data/feature_cache/ when the source data is unchanged;
+# only new/changed rows are re-engineered otherwise (see feature_store.py).
+X_all, y_all, row_keys = load_feature_matrix(DATA_PATH, USERS_PATH, return_keys=True)
 
-
-TARGET = "migraine_next_24h"
-
-df = df.dropna(subset=FEATURES + [TARGET])
-
-X = df[FEATURES].values
-y = df[TARGET].values
+X, y = X_all, y_all
 
 print("Balancing dataset with SMOTE...")
 sm = SMOTE(random_state=42)
@@ -94,10 +72,15 @@ X, y = sm.fit_resample(X, y)
 
 # TRAIN/VALIDATION SPLIT
 print("Splitting train/valid...")
-X_train, X_valid, y_train, y_valid = train_test_split(
-    X, y, test_size=0.2, random_state=42, stratify=y
+X_train, X_valid, y_train, y_valid, idx_train, idx_valid = train_test_split(
+    X, y, np.arange(len(y)), test_size=0.2, random_state=42, stratify=y
 )
 
+# SMOTE returns the original rows first, synthetic ones after them: validation
+# rows with an index below len(X_all) are real rows no model was trained on
+real_valid = idx_valid < len(X_all)
+X_holdout, y_holdout = X_valid[real_valid], y_valid[real_valid]
+
 # SCALING
 print("Scaling features...")
 scaler = StandardScaler()
@@ -121,6 +104,7 @@ rf = RandomForestClassifier(
 )
 rf.fit(X_train, y_train)
 joblib.dump(rf, f"{MODEL_DIR}/random_forest.pkl")
+export_compact_forest(rf, f"{MODEL_DIR}/{COMPACT_RF_DIR}", X_check=X_valid[:20_000])
 
 # MODEL 3 — XGBoost
 print("Training XGBoost...")
@@ -162,24 +146,49 @@ joblib.dump(lgb_model, f"{MODEL_DIR}/lightgbm.pkl")
 # MODEL 5 — Personalized baseline
 print("Training personalized baseline deviation model...")
 
-personal_features = [
-    "sleep_deviation",
-    "hrv_deviation",
-    "screen_deviation",
-    "meeting_deviation",
-]
-
-X_personal = df[personal_features].values
-y_personal = df[TARGET].values
+X_personal = X_all[:, [FEATURES.index(f) for f in PERSONAL_FEATURES]]
+y_personal = y_all
+user_idx, user_ids = load_user_index(DATA_PATH, USERS_PATH)
 
-Xp_train, Xp_valid, yp_train, yp_valid = train_test_split(
-    X_personal, y_personal, test_size=0.2, random_state=42, stratify=y_personal
+Xp_train, Xp_valid, yp_train, yp_valid, up_train, up_valid = train_test_split(
+    X_personal, y_personal, user_idx, test_size=0.2, random_state=42, stratify=y_personal
 )
 
+# Global model = the prior every per-user model is shrunk toward
 personal_model = LogisticRegression(max_iter=300)
 personal_model.fit(Xp_train, yp_train)
 joblib.dump(personal_model, f"{MODEL_DIR}/personalized_model.pkl")
 
+# Per-user models for all users in one batched solve
+print("Training per-user personalized models...")
+personal = fit_personal_models(Xp_train, yp_train, up_train, user_ids, global_coefficients(personal_model))
+save_personal_models(personal, MODEL_DIR)
+
+# DISTILLED SERVING MODEL — one small LightGBM fit to the blended ensemble score
+print("Distilling ensemble into a single serving model...")
+ensemble_models = {"scaler": scaler, "logreg": logreg, "rf": rf, "xgb": xgb_model, "lgb": lgb_model}
+distilled_model, distill_report = distill_ensemble(ensemble_models, X_train, X_holdout, y_holdout)
+joblib.dump(distilled_model, f"{MODEL_DIR}/{DISTILLED_FILE}")
+
+# DRIFT REFERENCE — raw (pre-SMOTE) feature distribution + risk mix, for drift.py
+print("Saving drift reference snapshot...")
+X_ref = np.asarray(X_all[reference_rows(len(X_all))])
+ref_levels = {
+    "ensemble": scores_to_risk_levels(serving_scores(ensemble_models, X_ref)),
+    "distilled": scores_to_risk_levels(serving_scores({"distilled": distilled_model}, X_ref)),
+}
+save_drift_reference(build_reference(X_ref, ref_levels, FEATURES, RISK_LEVELS), MODEL_DIR)
+
+# MODEL VERSION — rows trained on, so incremental_train.py can pick up only new ones
+np.save(f"{MODEL_DIR}/{TRAINED_KEYS_FILE}", np.asarray(row_keys))
+save_model_meta({
+    "version": DEFAULT_MODEL_VERSION,
+    "mode": "full",
+    "trained_at": datetime.now(timezone.utc).isoformat(),
+    "n_rows": int(len(X_all)),
+    "distillation": distill_report,
+}, MODEL_DIR)
+
 print("All models trained & saved successfully!")
 
 evaluate_model(
@@ -223,4 +232,8 @@ evaluate_model(
     Xp_valid,
     yp_valid,
     scaled=False
-)
\ No newline at end of file
+)
+
+evaluate_personal_models(personal, personal_model, Xp_valid, yp_valid, up_valid)
+
+print_report(distill_report)
@@ -0,0 +1,335 @@
+"""
+Daily weather provider for the synthetic data generator.
+
+Wraps FMI Open Data (Finland) with an on-disk cache so generator runs are fast
+and reproducible:
+
+  data/weather_cache/<place>.csv   - one row per (place, date) fetched from FMI
+
+Only dates missing from the cache are fetched, in contiguous ranges (gaps).
+Each gap is split into FMI-sized chunks: one daily request per 365 days plus
+one hourly request (pressure / humidity) per 7 days, so a year-long gap costs
+about 54 requests and a cache hit costs none. Days FMI answers with no values
+are not cached.
+
+Modes (WEATHER_MODE env var or the `mode` argument):
+  auto    - cache + fetch missing ranges; ranges that cannot be fetched are
+            filled from the offline source (default, keeps working without network)
+  online  - cache + fetch missing ranges; fetch errors are raised
+  offline - never touch the network: cached dates first, the rest from the
+            offline source
+
+Offline source: the fixture file <place>.csv in WEATHER_FIXTURE_DIR (shipped in
+fixtures/weather/, same columns as the cache) for the dates it covers,
+deterministic synthetic weather seeded by the place name for anything else.
+Refresh a fixture from the cache with `python weather.py --export-fixture PLACE`.
+
+Output columns: date, temperature, pressure, humidity, precipitation, snow_depth,
+pressure_change (and place for multi-place requests).
+"""
+
+import argparse
+import os
+import zlib
+from datetime import datetime
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+import requests
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+
+FMI_URL = "https://opendata.fmi.fi/wfs"
+WEATHER_CACHE_DIR = os.path.join("data", "weather_cache")
+WEATHER_FIXTURE_DIR = os.getenv("WEATHER_FIXTURE_DIR", os.path.join("fixtures", "weather"))
+WEATHER_MODE = os.getenv("WEATHER_MODE", "auto")
+WEATHER_MODES = ("auto", "online", "offline")
+REQUEST_TIMEOUT = 30
+OFFLINE_EPOCH = "2000-01-01"     # synthetic offline weather is drawn day by day from here
+
+WEATHER_COLS = ["temperature", "pressure", "humidity", "precipitation", "snow_depth"]
+
+# (stored query, parameters, max days per request). Daily observations carry
+# temperature / precipitation / snow; pressure and humidity only exist hourly.
+FMI_QUERIES = [
+    ("fmi::observations::weather::daily::multipointcoverage", "tday,tmin,tmax,rrday,snow", 365),
+    ("fmi::observations::weather::hourly::multipointcoverage", "PA_PT1H_AVG,RH_PT1H_AVG", 7),
+]
+
+# FMI parameter name -> our column
+FMI_COLUMNS = {
+    "tday": "temperature",
+    "tmin": "tmin",
+    "tmax": "tmax",
+    "rrday": "precipitation",
+    "snow": "snow_depth",
+    "PA_PT1H_AVG": "pressure",
+    "RH_PT1H_AVG": "humidity",
+}
+
+_NS = {
+    "gml": "http://www.opengis.net/gml/3.2",
+    "gmlcov": "http://www.opengis.net/gmlcov/1.0",
+    "swe": "http://www.opengis.net/swe/2.0",
+}
+
+
+# ----------------------------
+# 1. FMI FETCH + PARSE
+# ----------------------------
+
+def parse_fmi_multipointcoverage(xml: bytes) -> pd.DataFrame:
+    """
+    Parse an FMI *::multipointcoverage response into one row per observation
+    time, with columns named after the FMI parameters (swe:field names).
+    Uses the first station (wfs:member) that returned data.
+    """
+    root = ElementTree.fromstring(xml)
+
+    for coverage in root.iter(f"{{{_NS['gmlcov']}}}MultiPointCoverage"):
+        positions = coverage.find(".//gmlcov:positions", _NS)
+        values = coverage.find(".//gml:doubleOrNilReasonTupleList", _NS)
+        fields = [f.get("name") for f in coverage.findall(".//swe:field", _NS)]
+        if positions is None or values is None or not fields or not (values.text or "").strip():
+            continue
+
+        # positions: "lat lon epoch" triples; values: one tuple of len(fields) per position
+        epochs = np.array(positions.text.split(), dtype=float).reshape(-1, 3)[:, 2]
+        data = np.array(values.text.split(), dtype=float).reshape(-1, len(fields))
+
+        df = pd.DataFrame(data, columns=fields)
+        df["time"] = pd.to_datetime(epochs, unit="s", utc=True).tz_localize(None)
+        return df
+
+    return pd.DataFrame(columns=["time"])
+
+
+def _fmi_request(query: str, parameters: str, place: str, start: datetime, end: datetime) -> pd.DataFrame:
+    params = {
+        "service": "WFS",
+        "version": "2.0.0",
+        "request": "getFeature",
+        "storedquery_id": query,
+        "place": place,
+        "parameters": parameters,
+        "starttime": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "endtime": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    resp = requests.get(FMI_URL, params=params, timeout=REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return parse_fmi_multipointcoverage(resp.content)
+
+
+def fetch_fmi_weather_daily(start_date: datetime, end_date: datetime, place: str) -> pd.DataFrame:
+    """
+    Fetch daily weather for [start_date, end_date] from FMI Open Data.
+    Hourly pressure / humidity are averaged per day.
+    """
+    print(f"Fetching FMI weather data for {place} from {start_date.date()} to {end_date.date()}...")
+    dates = pd.date_range(start_date, end_date, freq="D")
+    daily = pd.DataFrame({"date": dates})
+
+    for query, parameters, max_days in FMI_QUERIES:
+        frames = []
+        for chunk_start in dates[::max_days]:
+            chunk_end = min(chunk_start + pd.Timedelta(days=max_days) - pd.Timedelta(seconds=1),
+                            dates[-1] + pd.Timedelta(days=1) - pd.Timedelta(seconds=1))
+            frames.append(_fmi_request(query, parameters, place, chunk_start, chunk_end))
+
+        obs = pd.concat(frames, ignore_index=True).rename(columns=FMI_COLUMNS)
+        if obs.empty:
+            continue
+        obs["date"] = obs["time"].dt.normalize()
+        obs = obs.drop(columns="time").groupby("date", as_index=False).mean()
+        daily = daily.merge(obs, on="date", how="left")
+
+    # FMI reports "no precipitation / no snow" as -1
+    for col in ["precipitation", "snow_depth"]:
+        if col in daily:
+            daily[col] = daily[col].clip(lower=0)
+
+    if "temperature" not in daily and {"tmin", "tmax"} <= set(daily.columns):
+        daily["temperature"] = (daily["tmin"] + daily["tmax"]) / 2.0
+
+    for col in WEATHER_COLS:
+        if col not in daily:
+            daily[col] = np.nan
+
+    return daily[["date"] + WEATHER_COLS]
+
+
+# ----------------------------
+# 2. OFFLINE SOURCE
+# ----------------------------
+
+def synthetic_weather_daily(start_date: datetime, end_date: datetime, place: str) -> pd.DataFrame:
+    """Simple Finland-like synthetic weather, deterministic per place and date."""
+    dates = pd.date_range(start_date, end_date, freq="D")
+
+    # Drawn from a fixed epoch, so a date gets the same weather whatever range it is requested in
+    epoch = min(pd.Timestamp(OFFLINE_EPOCH), dates[0])
+    all_dates = pd.date_range(epoch, dates[-1], freq="D")
+    n_days = len(all_dates)
+    rng = np.random.default_rng([42, zlib.crc32(place.encode())])
+    noise = rng.standard_normal((n_days, len(WEATHER_COLS)))   # row i depends on day i only
+
+    # Very simple synthetic weather for Finland-like conditions (seasonal sinus)
+    base_temp = 5 + 15 * np.sin(2 * np.pi * (all_dates.dayofyear.to_numpy() - 105) / 365.0)
+
+    synthetic = pd.DataFrame({
+        "date": all_dates,
+        "temperature": base_temp + 3 * noise[:, 0],
+        "pressure": 1013 + 8 * noise[:, 1],
+        "humidity": np.clip(70 + 10 * noise[:, 2], 0, 100),
+        "precipitation": np.maximum(0, 1 + 3 * noise[:, 3]),
+        "snow_depth": np.maximum(0, 2 * noise[:, 4]),
+    })
+    return synthetic[synthetic["date"] >= dates[0]].reset_index(drop=True)
+
+
+def offline_weather_daily(start_date: datetime, end_date: datetime, place: str,
+                          fixture_dir: str = WEATHER_FIXTURE_DIR) -> pd.DataFrame:
+    """
+    Rows from the fixture file <fixture_dir>/<place>.csv (same columns as the
+    cache) where it covers the date; synthetic weather only for the dates it doesn't.
+    """
+    dates = pd.date_range(start_date, end_date, freq="D")
+
+    fixture = _read_cache(place, fixture_dir)
+    fixture = fixture[fixture["date"].isin(dates)]
+    rest = dates[~dates.isin(fixture["date"])]
+    if rest.empty:
+        return fixture.reset_index(drop=True)
+
+    synthetic = synthetic_weather_daily(rest[0], rest[-1], place)
+    synthetic = synthetic[synthetic["date"].isin(rest)]
+    return pd.concat([fixture, synthetic], ignore_index=True).sort_values("date").reset_index(drop=True)
+
+
+# ----------------------------
+# 3. CACHE
+# ----------------------------
+
+def _slug(place: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in place.strip().lower())
+
+
+def _cache_path(place: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{_slug(place)}.csv")
+
+
+def _read_cache(place: str, cache_dir: str) -> pd.DataFrame:
+    path = _cache_path(place, cache_dir)
+    if not os.path.exists(path):
+        return pd.DataFrame({"date": pd.DatetimeIndex([])}).reindex(columns=["date"] + WEATHER_COLS)
+    return pd.read_csv(path, parse_dates=["date"])
+
+
+def _write_cache(df: pd.DataFrame, place: str, cache_dir: str) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(place, cache_dir)
+    df.sort_values("date").to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+
+
+def missing_ranges(dates: pd.DatetimeIndex, have: pd.DatetimeIndex):
+    """Contiguous (start, end) runs of `dates` that are not in `have`."""
+    missing = dates[~dates.isin(have)]
+    if missing.empty:
+        return []
+    breaks = np.flatnonzero(np.diff(missing.to_numpy()) != np.timedelta64(1, "D")) + 1
+    return [(run[0], run[-1]) for run in np.split(missing, breaks)]
+
+
+def get_daily_weather(place: str, start_date: datetime, end_date: datetime,
+                      mode: str = WEATHER_MODE, cache_dir: str = WEATHER_CACHE_DIR) -> pd.DataFrame:
+    """Daily weather for one place over [start_date, end_date], with pressure_change."""
+    if mode not in WEATHER_MODES:
+        raise ValueError(f"Unknown weather mode {mode!r}, expected one of {WEATHER_MODES}")
+
+    dates = pd.date_range(start_date, end_date, freq="D")
+    cache = _read_cache(place, cache_dir)
+    gaps = missing_ranges(dates, pd.DatetimeIndex(cache["date"]))
+    fetched, filled = [], []
+
+    for gap_start, gap_end in gaps:
+        if mode == "offline":
+            filled.append(offline_weather_daily(gap_start, gap_end, place))
+            continue
+        try:
+            obs = fetch_fmi_weather_daily(gap_start, gap_end, place)
+        except Exception as e:
+            if mode == "online":
+                raise
+            print(f"Failed to fetch FMI data for {place} {gap_start.date()}..{gap_end.date()}: {e}")
+            print("Filling this range with offline weather (not cached).")
+            filled.append(offline_weather_daily(gap_start, gap_end, place))
+            continue
+
+        # Days FMI answered with no values at all are not cached, so a later run asks again
+        empty = obs[WEATHER_COLS].isna().all(axis=1)
+        fetched.append(obs[~empty])
+        if empty.any():
+            print(f"FMI returned no data for {int(empty.sum())} day(s) of {place} in "
+                  f"{gap_start.date()}..{gap_end.date()} (not cached)")
+            if mode == "auto":
+                offline = offline_weather_daily(gap_start, gap_end, place)
+                filled.append(offline[offline["date"].isin(obs.loc[empty, "date"])])
+
+    fetched = [f for f in fetched if not f.empty]
+    if fetched:
+        cache = pd.concat([cache] + fetched, ignore_index=True).drop_duplicates("date", keep="last")
+        _write_cache(cache, place, cache_dir)
+    elif not gaps:
+        print(f"Weather cache hit for {place} ({len(dates)} days)")
+    elif mode == "offline":
+        print(f"Weather for {place}: {len(dates) - sum(len(f) for f in filled)} day(s) from cache, "
+              f"{len(gaps)} range(s) from the offline source")
+    else:
+        print(f"Weather cache for {place} unchanged ({len(gaps)} range(s) unavailable)")
+
+    df = pd.concat([cache] + filled, ignore_index=True)
+    df = pd.DataFrame({"date": dates}).merge(df.drop_duplicates("date"), on="date", how="left")
+
+    df = df.sort_values("date").reset_index(drop=True)
+    df["pressure_change"] = df["pressure"].diff().fillna(0.0)
+    return df[["date"] + WEATHER_COLS + ["pressure_change"]]
+
+
+def get_daily_weather_many(places, start_date: datetime, end_date: datetime,
+                           mode: str = WEATHER_MODE, cache_dir: str = WEATHER_CACHE_DIR) -> pd.DataFrame:
+    """Long-format daily weather for several places (adds a `place` column)."""
+    frames = []
+    for place in places:
+        df = get_daily_weather(place, start_date, end_date, mode=mode, cache_dir=cache_dir)
+        df.insert(0, "place", place)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def export_fixture(place: str, start_date: datetime, end_date: datetime, mode: str = "online",
+                   cache_dir: str = WEATHER_CACHE_DIR, fixture_dir: str = WEATHER_FIXTURE_DIR) -> str:
+    """Write <fixture_dir>/<place>.csv from the cache (fetching gaps per `mode`)."""
+    df = get_daily_weather(place, start_date, end_date, mode=mode, cache_dir=cache_dir)
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = _cache_path(place, fixture_dir)
+    df = df[["date"] + WEATHER_COLS]
+    df.round({col: 2 for col in WEATHER_COLS}).to_csv(path, index=False)
+    print(f"Saved {len(df)} days of weather for {place} to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weather cache / fixture tools.")
+    parser.add_argument("--export-fixture", metavar="PLACE", required=True,
+                        help="write the offline fixture for PLACE from the cache + FMI")
+    parser.add_argument("--start", default="2023-01-01")
+    parser.add_argument("--end", default="2024-12-31")
+    parser.add_argument("--mode", choices=WEATHER_MODES, default="online",
+                        help="online (default) refuses to export anything not fetched from FMI")
+    args = parser.parse_args()
+    export_fixture(args.export_fixture, datetime.fromisoformat(args.start), datetime.fromisoformat(args.end),
+                   mode=args.mode)